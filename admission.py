@@ -0,0 +1,139 @@
+import collections
+import math
+import os
+import threading
+import time
+
+
+class TokenBuckets:
+    """One token bucket per key: `rate` tokens a second, holding at most `burst`.
+
+    take() spends a token when there is one and never waits. Buckets live
+    in an LRU of `max_keys`; an evicted key comes back with a full bucket,
+    which errs towards admitting. A rate of 0 turns the limit off.
+    """
+
+    def __init__(self, rate, burst, max_keys=100_000):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.max_keys = max_keys
+        self._buckets = collections.OrderedDict()   # key -> (tokens, monotonic time)
+        self._lock = threading.Lock()
+
+    def take(self, key, now=None):
+        """0.0 if a token was spent, else seconds until the next one."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is None:
+                tokens = self.burst
+            else:
+                tokens = min(self.burst, entry[0] + (now - entry[1]) * self.rate)
+                self._buckets.move_to_end(key)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class InflightLimit:
+    """At most `limit` requests at once; try_enter() answers at once instead of queueing.
+
+    A limit of 0 turns the cap off.
+    """
+
+    def __init__(self, limit):
+        self.limit = int(limit)
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    def try_enter(self):
+        with self._lock:
+            if 0 < self.limit <= self.inflight:
+                return False
+            self.inflight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.inflight -= 1
+
+
+class Admission:
+    """Admission control for the bid routes: per-user and per-IP token
+    buckets and a cap on bids in flight.
+
+    Each check returns None to admit, or a Shed to answer with right away;
+    none of them touch the auction or turn locks. Sheds are counted in
+    `requests_shed_total` by route and reason.
+    """
+
+    def __init__(self, metrics, user_rate=0.0, user_burst=10, ip_rate=0.0, ip_burst=50,
+                 max_inflight=0, busy_retry_after=1):
+        self.metrics = metrics
+        self.users = TokenBuckets(user_rate, user_burst)
+        self.ips = TokenBuckets(ip_rate, ip_burst)
+        self.inflight = InflightLimit(max_inflight)
+        self.busy_retry_after = busy_retry_after
+        metrics.counter("requests_shed_total", "Requests refused by admission control, by route and reason.")
+        metrics.gauge("bids_in_flight", "Bid requests admitted and not yet answered.",
+                      lambda: self.inflight.inflight)
+
+    @classmethod
+    def from_env(cls, metrics):
+        """Limits from BID_RATE_PER_USER, BID_BURST_PER_USER, BID_RATE_PER_IP,
+        BID_BURST_PER_IP and MAX_INFLIGHT_BIDS; the rates and the cap are off unless set."""
+        env = os.environ.get
+        return cls(metrics,
+                   user_rate=float(env("BID_RATE_PER_USER", "0")), user_burst=float(env("BID_BURST_PER_USER", "10")),
+                   ip_rate=float(env("BID_RATE_PER_IP", "0")), ip_burst=float(env("BID_BURST_PER_IP", "50")),
+                   max_inflight=int(env("MAX_INFLIGHT_BIDS", "0")))
+
+    def check_user(self, route, user):
+        return self._shed(route, "user_rate", 429, self.users.take(user))
+
+    def check_ip(self, route, ip):
+        return self._shed(route, "ip_rate", 429, self.ips.take(ip))
+
+    def enter(self, route):
+        """Claim an in-flight slot; on None the caller must leave() when done."""
+        if self.inflight.try_enter():
+            return None
+        return self._shed(route, "overload", 503, self.busy_retry_after)
+
+    def leave(self):
+        self.inflight.leave()
+
+    def _shed(self, route, reason, status, wait):
+        if not wait:
+            return None
+        self.metrics.inc("requests_shed_total", (("route", route), ("reason", reason)))
+        return Shed(status, reason, max(1, math.ceil(wait)))
+
+
+class Shed:
+    __slots__ = ("status", "reason", "retry_after")
+
+    MESSAGES = {"user_rate": "Too many bids from this user.",
+                "ip_rate": "Too many bids from this address.",
+                "overload": "Server busy, try again shortly."}
+
+    def __init__(self, status, reason, retry_after):
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def message(self):
+        return self.MESSAGES[self.reason]
+
+    @property
+    def headers(self):
+        return {"Retry-After": str(self.retry_after)}
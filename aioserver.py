@@ -0,0 +1,189 @@
+import asyncio
+import http.client
+import io
+import time
+
+
+class AsyncHTTPServer:
+    """Serve a BaseHTTPRequestHandler subclass from a single asyncio event loop.
+
+    Each request is parsed here and handed to the handler's do_* method,
+    which runs inline on the loop against in-memory rfile/wfile, so routes
+    and response bodies are exactly those of the threaded server while
+    requests are handled one at a time. Connections are HTTP/1.1 keep-alive
+    and cost a coroutine, not a thread, while idle.
+
+    /api/events (server-sent events) is the one route served natively: a
+    stream waits on TurnController change notifications instead of
+    blocking a thread in wait_for_change().
+    """
+
+    def __init__(self, handler_cls, turn, keepalive_seconds=15, idle_timeout=75.0,
+                 max_header_bytes=65536, max_body_bytes=1 << 20):
+        self.handler_cls = handler_cls
+        self.turn = turn
+        self.keepalive_seconds = keepalive_seconds
+        self.idle_timeout = idle_timeout
+        self.max_header_bytes = max_header_bytes
+        self.max_body_bytes = max_body_bytes
+        self._changed = None      # asyncio.Event replaced on every TURN change
+        self._loop = None
+        self.connections = 0
+
+    async def start(self, host, port):
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self.turn.listeners.append(self._on_turn_change)
+        return await asyncio.start_server(self._serve_connection, host, port,
+                                          limit=self.max_header_bytes, backlog=1024)
+
+    async def serve_forever(self, host, port):
+        server = await self.start(host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop listening for TURN changes; start() registered the listener."""
+        if self._on_turn_change in self.turn.listeners:
+            self.turn.listeners.remove(self._on_turn_change)
+
+    def _on_turn_change(self):
+        # runs under TURN's lock, possibly on another thread (timers, checkpoints)
+        self._loop.call_soon_threadsafe(self._wake_streams)
+
+    def _wake_streams(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    # ---- connections ----
+    async def _serve_connection(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.idle_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    writer.write(_plain_response(431, "Request Header Fields Too Large"))
+                    await writer.drain()
+                    return
+                request = self._parse_head(head)
+                if request is None:
+                    writer.write(_plain_response(400, "Bad Request"))
+                    await writer.drain()
+                    return
+                method, target, version, headers = request
+
+                length = headers.get("Content-Length", "0") or "0"
+                if not length.isdigit() or int(length) > self.max_body_bytes:
+                    writer.write(_plain_response(413, "Payload Too Large"))
+                    await writer.drain()
+                    return
+                body = await reader.readexactly(int(length)) if int(length) else b""
+
+                if method == "GET" and target.split("?", 1)[0] == "/api/events":
+                    await self._stream_events(writer, headers)
+                    return
+                response, close = self._dispatch(method, target, version, headers, body,
+                                                 writer.get_extra_info("peername"))
+                writer.write(response)
+                await writer.drain()
+                if close:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def _parse_head(self, head):
+        lines = head.split(b"\r\n", 1)
+        try:
+            method, target, version = lines[0].decode("latin-1").split()
+        except ValueError:
+            return None
+        if not version.startswith("HTTP/1."):
+            return None
+        headers = http.client.parse_headers(io.BytesIO(lines[1] if len(lines) > 1 else b""))
+        return method, target, version, headers
+
+    def _dispatch(self, method, target, version, headers, body, peer):
+        """Run the handler's do_<method>; returns (response bytes, close after it)."""
+        h = self.handler_cls.__new__(self.handler_cls)
+        h.server = None
+        h.client_address = peer or ("", 0)
+        h.rfile = io.BytesIO(body)
+        h.wfile = io.BytesIO()
+        h.command, h.path, h.request_version = method, target, version
+        h.requestline = f"{method} {target} {version}"
+        h.headers = headers
+        h.protocol_version = "HTTP/1.1"
+        conn = (headers.get("Connection") or "").lower()
+        h.close_connection = version == "HTTP/1.0" or conn == "close"
+        do = getattr(h, "do_" + method, None)
+        try:
+            if do is None:
+                h.send_error(501, f"Unsupported method ({method!r})")
+            else:
+                do()
+        except Exception as e:
+            # the threaded server would log and drop the connection; do the same
+            print(f"Handler {method} {target} failed: {e!r}")
+            return _plain_response(500, "Internal Server Error"), True
+        response = h.wfile.getvalue()
+        close = h.close_connection or not _has_framing(response)
+        if close and b"\r\nconnection:" not in response.split(b"\r\n\r\n", 1)[0].lower():
+            head, sep, rest = response.partition(b"\r\n\r\n")
+            response = head + b"\r\nConnection: close" + sep + rest
+        return response, close
+
+    # ---- server-sent events ----
+    async def _stream_events(self, writer, headers):
+        seen = self.handler_cls.event_version(headers.get("Last-Event-ID"))
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nAccess-Control-Allow-Origin: *\r\n"
+                     b"Connection: close\r\n\r\n")
+        await writer.drain()
+        last_write = time.monotonic()
+        while True:
+            changed = self._changed
+            if self.turn.current_version() != seen:
+                entry = self.turn.encoded_state()
+                seen = entry.version
+                writer.write(b"id: %s\nevent: state\ndata: %s\n\n"
+                             % (self.handler_cls.event_id(seen), entry.state_bytes(time.time())))
+                await writer.drain()
+                last_write = time.monotonic()
+                continue
+            if time.monotonic() - last_write >= self.keepalive_seconds:
+                writer.write(b": keepalive\n\n")
+                await writer.drain()
+                last_write = time.monotonic()
+            try:
+                await asyncio.wait_for(changed.wait(), self._stream_timeout(last_write))
+            except asyncio.TimeoutError:
+                pass
+
+    def _stream_timeout(self, last_write):
+        """Wake for the next keepalive or the next phase deadline, whichever is first."""
+        timeout = max(0.0, self.keepalive_seconds - (time.monotonic() - last_write))
+        ends = self.turn.phase_ends_at
+        if self.turn.phase in ("handover", "bid") and ends:
+            timeout = min(timeout, max(0.01, ends - time.time()))
+        return timeout
+
+
+def _has_framing(response):
+    head = response.split(b"\r\n\r\n", 1)[0].lower()
+    status = head[9:12]
+    return b"\r\ncontent-length:" in head or status in (b"204", b"304") or status.startswith(b"1")
+
+
+def _plain_response(status, reason):
+    body = reason.encode("utf-8")
+    return (f"HTTP/1.1 {status} {reason}\r\nContent-Type: text/plain\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode("latin-1") + body
@@ -19,6 +19,11 @@ function requestJson(method, path, body) {
 var users = [];
 var tasks = [];
 var poll_interval_id = null;
+var state_stream = null;
+var polled_state = null;
+var countdown_interval_id = null;
+var clock_offset_ms = 0;
+var lastState = null;
 var lastPhase = null;
 var lastActiveUser = null;
 
@@ -304,7 +309,7 @@ function startRoundOnServer() {
       if (res.state) {
         processStateTransition(res.state, true);
       }
-      beginPollingServerState();
+      beginServerStateUpdates();
     })
     .catch(function () {
       tasks.unshift(task);
@@ -313,20 +318,79 @@ function startRoundOnServer() {
   renderHome();
 }
 
+function handleServerState(s) {
+  var phaseChanged = (s.phase !== lastPhase);
+  var activeChanged = (s.active_user !== lastActiveUser);
+  if (phaseChanged || activeChanged) {
+    processStateTransition(s, false);
+  } else {
+    if (s.phase === "handover" || s.phase === "bid") startCountdown(s);
+    updateTimerDisplays(s);
+  }
+}
+
+function serverStateUpdatesActive() {
+  return !!(state_stream || poll_interval_id);
+}
+
+function stopServerStateUpdates() {
+  if (state_stream) {
+    state_stream.close();
+    state_stream = null;
+  }
+  if (poll_interval_id) {
+    clearInterval(poll_interval_id);
+    poll_interval_id = null;
+  }
+}
+
+// Prefer the pushed /api/events stream; fall back to polling /api/state.
+function beginServerStateUpdates() {
+  stopServerStateUpdates();
+  if (!window.EventSource) {
+    beginPollingServerState();
+    return;
+  }
+  var opened = false;
+  state_stream = new EventSource(API_URL + "/api/events");
+  state_stream.onopen = function () {
+    opened = true;
+  };
+  state_stream.addEventListener("state", function (e) {
+    var s;
+    try {
+      s = JSON.parse(e.data);
+    } catch (_) {
+      return;
+    }
+    handleServerState(s);
+  });
+  state_stream.onerror = function () {
+    if (opened) return; // EventSource reconnects by itself with Last-Event-ID
+    stopServerStateUpdates();
+    beginPollingServerState();
+  };
+}
+
+// Polls send the last version seen; the server answers with a delta against
+// it, or with the full state once that version is too old to diff against.
 function beginPollingServerState() {
   if (poll_interval_id) clearInterval(poll_interval_id);
+  polled_state = null;
   poll_interval_id = setInterval(function () {
-    requestJson("GET", "/api/state")
+    var since = polled_state ? "?since=" + polled_state.version : "";
+    requestJson("GET", "/api/state" + since)
       .then(function (res) {
         if (!res || !res.ok) return;
-        var s = res.state || {};
-        var phaseChanged = (s.phase !== lastPhase);
-        var activeChanged = (s.active_user !== lastActiveUser);
-        if (phaseChanged || activeChanged) {
-          processStateTransition(s, false);
+        if (res.delta && polled_state && res.delta.since === polled_state.version) {
+          polled_state = applyStateDelta(polled_state, res.delta);
+        } else if (res.state) {
+          polled_state = res.state;
         } else {
-          updateTimerDisplays(s);
+          polled_state = null; // a delta against a state we no longer have
+          return;
         }
+        handleServerState(polled_state);
       })
       .catch(function () {
         stopTicking();
@@ -336,17 +400,74 @@ function beginPollingServerState() {
   }, 400);
 }
 
+// Mirrors merge_state_delta() in app.py.
+function applyStateDelta(state, delta) {
+  var merged = {}, key;
+  for (key in state) merged[key] = state[key];
+  for (key in delta) {
+    if (key !== "since" && key !== "bids_added" && key !== "users_changed" && key !== "users_removed") {
+      merged[key] = delta[key];
+    }
+  }
+  if (delta.bids_added) merged.bids = (state.bids || []).concat(delta.bids_added);
+  if (delta.users_changed) {
+    var removed = delta.users_removed || [];
+    var people = (state.users || []).filter(function (u) {
+      return removed.indexOf(u.name) < 0;
+    });
+    delta.users_changed.forEach(function (u) {
+      for (var j = 0; j < people.length; j++) {
+        if (people[j].name === u.name) {
+          people[j] = u;
+          return;
+        }
+      }
+      people.push(u);
+    });
+    merged.users = people;
+  }
+  return merged;
+}
+
+// Countdown is derived locally from phase_ends_at, corrected for clock skew.
+function secondsLeft(s) {
+  if (!s || !s.phase_ends_at) return s ? (s.seconds_left || 0) : 0;
+  var now = Date.now() + clock_offset_ms;
+  return Math.max(0, Math.floor(s.phase_ends_at - now / 1000));
+}
+
+function startCountdown(s) {
+  // a revalidated (304) poll hands back the cached body, so only a new
+  // version carries a fresh server_time to correct the clock offset with
+  var fresh = !lastState || lastState.version !== s.version;
+  lastState = s;
+  if (fresh && s.server_time) clock_offset_ms = s.server_time * 1000 - Date.now();
+  if (countdown_interval_id) return;
+  countdown_interval_id = setInterval(function () {
+    if (lastState) updateTimerDisplays(lastState);
+  }, 250);
+}
+
+function stopCountdown() {
+  if (countdown_interval_id) {
+    clearInterval(countdown_interval_id);
+    countdown_interval_id = null;
+  }
+  lastState = null;
+}
+
 function updateTimerDisplays(s) {
+  var left = secondsLeft(s);
   if (s.phase === "handover") {
     var ht = $("handoverTimer");
-    if (ht) ht.textContent = String(s.seconds_left || 0);
+    if (ht) ht.textContent = String(left);
     var hr = $("handoverRing");
-    updateTimerRing(hr, s.seconds_left || 0, 6);
+    updateTimerRing(hr, left, 6);
   } else if (s.phase === "bid") {
     var btime = $("bidTimer");
-    if (btime) btime.textContent = String(s.seconds_left || 0);
+    if (btime) btime.textContent = String(left);
     var br = $("bidRing");
-    updateTimerRing(br, s.seconds_left || 0, 11);
+    updateTimerRing(br, left, 11);
   }
 }
 
@@ -499,9 +620,9 @@ function processStateTransition(state, fromBidResponse = false) {
     var hn = $("handoverName");
     if (hn) hn.textContent = state.active_user || "";
     var ht = $("handoverTimer");
-    if (ht) ht.textContent = String(state.seconds_left || 0);
+    if (ht) ht.textContent = String(secondsLeft(state));
     var hr = $("handoverRing");
-    updateTimerRing(hr, state.seconds_left || 0, 6);
+    updateTimerRing(hr, secondsLeft(state), 6);
     showPage("handoverPage");
     startTicking(ht, hr);
   } else if (state.phase === "bid") {
@@ -511,9 +632,9 @@ function processStateTransition(state, fromBidResponse = false) {
     var bs = $("bidSubtitle");
     if (bs) bs.textContent = (state.active_user || "Player") + ", place your bid";
     var btime = $("bidTimer");
-    if (btime) btime.textContent = String(state.seconds_left || 0);
+    if (btime) btime.textContent = String(secondsLeft(state));
     var br = $("bidRing");
-    updateTimerRing(br, state.seconds_left || 0, 11);
+    updateTimerRing(br, secondsLeft(state), 11);
     var be = $("bidError");
     if (be) be.style.display = "none";
     var bidInput = $("bidAmount");
@@ -528,22 +649,21 @@ function processStateTransition(state, fromBidResponse = false) {
     showGavelAnimation();
     renderResultsFromState(state);
     showPage("resultsPage");
-    if (poll_interval_id) {
-      clearInterval(poll_interval_id);
-      poll_interval_id = null;
-    }
+    stopCountdown();
+    stopServerStateUpdates();
   } else if (state.phase === "idle") {
     console.log("-> Transitioning to idle/home");
     stopTicking();
     showPage("homePage");
-    if (poll_interval_id) {
-      clearInterval(poll_interval_id);
-      poll_interval_id = null;
-    }
+    stopCountdown();
+    stopServerStateUpdates();
+  }
+  if (state.phase === "handover" || state.phase === "bid") {
+    startCountdown(state);
   }
   if (state.phase !== "results" && state.phase !== "idle" && !fromBidResponse) {
-    if (!poll_interval_id) {
-      beginPollingServerState();
+    if (!serverStateUpdatesActive()) {
+      beginServerStateUpdates();
     }
   }
 }
@@ -1,18 +1,52 @@
+import os
+import re
+import sys
+import tempfile
 import time
 import json
+import struct
+import zlib
+import contextlib
+import functools
+import gzip
+import hmac
 import random
 import heapq
+import array
+import bisect
+import collections.abc
+import itertools
+import threading
 from enum import Enum, auto
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
+
+from admission import Admission
+from journal import Journal
+import jsoncodec
+import metrics
+import profiler
+
+
+# Users share a fixed pool of locks rather than owning one each. A thread
+# never holds two user locks at once, so sharing a stripe cannot deadlock.
+_USER_LOCKS = [threading.Lock() for _ in range(1024)]
 
 
 class User:
+    __slots__ = ("name", "points", "assigned_tasks")
+
     def __init__(self, name, points):
-        self.name = (name or "").strip()
+        self.name = sys.intern((name or "").strip())
         self.points = int(points)
         self.assigned_tasks = []
 
+    @property
+    def lock(self):
+        """Guards points between the bid-time check and settlement debits."""
+        return _USER_LOCKS[hash(self.name) % len(_USER_LOCKS)]
+
     def tasks_assigned(self):
         return len(self.assigned_tasks)
 
@@ -24,16 +58,149 @@ class User:
         }
 
 
+class Leaderboard:
+    """Users kept sorted by (-points, tasks assigned, lowercase name).
+
+    Entries are the sort keys themselves, so paging and rank lookups never
+    touch User objects; rank() is a bisect over the sorted list.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._key_of = {}
+
+    @staticmethod
+    def key(user):
+        return (-user.points, user.tasks_assigned(), user.name.lower(), user.name)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, user):
+        old = self._key_of.get(user.name)
+        new = self.key(user)
+        if old == new:
+            return
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, old)]
+        bisect.insort(self._keys, new)
+        self._key_of[user.name] = new
+
+    def rebuild(self, users):
+        self._key_of = {u.name: self.key(u) for u in users}
+        self._keys = sorted(self._key_of.values())
+
+    def rank(self, name):
+        """1-based position of `name`, or None if unknown."""
+        key = self._key_of.get(name)
+        if key is None:
+            return None
+        return bisect.bisect_left(self._keys, key) + 1
+
+    def page(self, offset=0, limit=None):
+        end = None if limit is None else offset + limit
+        return [
+            {"name": k[3], "points": -k[0], "tasks_assigned": k[1]}
+            for k in self._keys[offset:end]
+        ]
+
+
 class UserRegistry:
     def __init__(self, starting_points):
         self.users = {}
         self.starting_points = int(starting_points)
+        self._leaderboard = Leaderboard()
+        self._ranking_deferred = False
+        # guards user creation and the leaderboard; never taken under a User.lock
+        self.lock = threading.RLock()
 
     def create_user(self, name):
         clean = (name or "").strip()
-        if clean not in self.users:
-            self.users[clean] = User(clean, self.starting_points)
-        return self.users[clean]
+        user = self.users.get(clean)
+        if user is None:
+            with self.lock:
+                user = self.users.get(clean)
+                if user is None:
+                    user = self.users[clean] = User(clean, self.starting_points)
+                    if not self._ranking_deferred:
+                        self._leaderboard.update(user)
+        return user
+
+    def create_users(self, names):
+        """Create any missing users in one pass; returns how many were new."""
+        with self.lock:
+            created = 0
+            for name in names:
+                clean = (name or "").strip()
+                if clean not in self.users:
+                    self.users[clean] = User(clean, self.starting_points)
+                    created += 1
+            if created and not self._ranking_deferred:
+                self._leaderboard.rebuild(self.users.values())
+            return created
+
+    @contextlib.contextmanager
+    def deferred_ranking(self):
+        """Skip per-change leaderboard updates inside the block, rebuild once after."""
+        with self.lock:
+            self._ranking_deferred = True
+            try:
+                yield
+            finally:
+                self._ranking_deferred = False
+                self._leaderboard.rebuild(self.users.values())
+
+    def to_snapshot(self):
+        with self.lock:
+            return [[u.name, u.points, list(u.assigned_tasks)] for u in self.users.values()]
+
+    def restore_snapshot(self, rows):
+        with self.lock:
+            self.users = {}
+            for name, points, tasks in rows:
+                user = self.users[name] = User(name, points)
+                user.assigned_tasks = list(tasks)
+            self._leaderboard.rebuild(self.users.values())
+
+    def user_changed(self, user):
+        """Re-rank `user` after its points or assigned tasks changed."""
+        with self.lock:
+            if not self._ranking_deferred:
+                self._leaderboard.update(user)
+
+    def settle(self, auctions):
+        """Apply just-closed auctions to their users: each task goes to its
+        assignee and every other bidder loses their bid, stopping at zero.
+
+        Debits are summed per user and applied once, which is equivalent
+        because clamping at zero commutes for non-negative bids.
+        """
+        debits = {}
+        winners = set()
+        for a in auctions:
+            if a.assigned_user is None:
+                continue
+            self.ensure_user(a.assigned_user).assigned_tasks.append(a.task)
+            winners.add(a.assigned_user)
+            for bid in a.bids.values():
+                if bid.user != a.assigned_user:
+                    debits[bid.user] = debits.get(bid.user, 0) + bid.bid_amount
+        for name, total in debits.items():
+            user = self.ensure_user(name)
+            with user.lock:
+                user.points = max(0, user.points - total)
+        for name in debits.keys() | winners:
+            self.user_changed(self.ensure_user(name))
+
+    def leaderboard(self):
+        """The live Leaderboard; hold `lock` while reading it."""
+        return self._leaderboard
+
+    def clear(self):
+        """Drop every user; go through this rather than editing `users`."""
+        with self.lock:
+            self.users.clear()
+            self._leaderboard.rebuild(())
 
     def ensure_user(self, name):
         return self.create_user(name)
@@ -46,10 +213,157 @@ class UserRegistry:
 
 
 class Bid:
-    def __init__(self, user, bid_amount):
+    __slots__ = ("user", "bid_amount", "timestamp_ms")
+
+    def __init__(self, user, bid_amount, timestamp_ms=None):
         self.user = user
         self.bid_amount = int(bid_amount)
-        self.timestamp_ms = int(time.time() * 1000)
+        self.timestamp_ms = int(time.time() * 1000) if timestamp_ms is None else int(timestamp_ms)
+
+
+class BidBook(dict):
+    """Name -> Bid, plus an order book of (amount, timestamp_ms, name) tuples.
+
+    This is what Auction.bids is by default. record() keeps both in step,
+    replacing a user's earlier bid, so the lowest bids and ordered pages are
+    read off the sorted list without re-sorting.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._book = []
+
+    def record(self, name, bid_amount, timestamp_ms=None):
+        old = self.get(name)
+        if old is not None:
+            del self._book[bisect.bisect_left(self._book, (old.bid_amount, old.timestamp_ms, old.user))]
+        bid = self[name] = Bid(name, bid_amount, timestamp_ms)
+        bisect.insort(self._book, (bid.bid_amount, bid.timestamp_ms, name))
+        return bid
+
+    def load_sorted(self, rows):
+        """Bulk load (name, amount, timestamp_ms) rows already in book order."""
+        for name, amount, ts in rows:
+            self[name] = Bid(name, amount, ts)
+        self._book = [(amount, ts, name) for name, amount, ts in rows]
+
+    def ordered(self, offset=0, limit=None, after=None):
+        if after is not None:
+            offset += bisect.bisect_right(self._book, tuple(after))
+        end = None if limit is None else offset + limit
+        return [self[name] for _, _, name in self._book[offset:end]]
+
+    def rank(self, name):
+        bid = self.get(name)
+        if bid is None:
+            return None
+        return bisect.bisect_left(self._book, (bid.bid_amount, bid.timestamp_ms, name)) + 1
+
+    def lowest(self):
+        if not self._book:
+            return []
+        end = bisect.bisect_left(self._book, (self._book[0][0] + 1,))
+        return [self[name] for _, _, name in self._book[:end]]
+
+
+class NameTable:
+    """Interned user names <-> small integer ids, shared by columnar stores."""
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        self._lock = threading.Lock()
+
+    def id_of(self, name):
+        uid = self.ids.get(name)
+        if uid is None:
+            with self._lock:
+                uid = self.ids.get(name)
+                if uid is None:
+                    uid = self.ids[name] = len(self.names)
+                    self.names.append(sys.intern(name))
+        return uid
+
+
+NAMES = NameTable()
+
+
+class ColumnarBidBook(collections.abc.Mapping):
+    """Drop-in for BidBook holding bids as parallel arrays.
+
+    One row per bidder: user id (see NAMES), amount and timestamp in typed
+    arrays, plus an array of row numbers kept in book order. Bid objects are
+    only built when a caller reads them, so a retained bid costs a few
+    machine words instead of an object.
+    """
+
+    def __init__(self, names=NAMES):
+        self._names = names
+        self._row_of = {}
+        self._uid = array.array("l")
+        self._amount = array.array("q")
+        self._ts = array.array("q")
+        self._order = array.array("l")
+
+    def _key(self, row):
+        return (self._amount[row], self._ts[row], self._names.names[self._uid[row]])
+
+    def _bid(self, row):
+        return Bid(self._names.names[self._uid[row]], self._amount[row], self._ts[row])
+
+    def __getitem__(self, name):
+        return self._bid(self._row_of[name])
+
+    def __contains__(self, name):
+        return name in self._row_of
+
+    def __iter__(self):
+        return iter(self._row_of)
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def record(self, name, bid_amount, timestamp_ms=None):
+        bid = Bid(name, bid_amount, timestamp_ms)
+        row = self._row_of.get(name)
+        if row is None:
+            row = self._row_of[sys.intern(name)] = len(self._uid)
+            self._uid.append(self._names.id_of(name))
+            self._amount.append(bid.bid_amount)
+            self._ts.append(bid.timestamp_ms)
+        else:
+            del self._order[bisect.bisect_left(self._order, self._key(row), key=self._key)]
+            self._amount[row] = bid.bid_amount
+            self._ts[row] = bid.timestamp_ms
+        bisect.insort(self._order, row, key=self._key)
+        return bid
+
+    def load_sorted(self, rows):
+        for name, amount, ts in rows:
+            self._row_of[sys.intern(name)] = len(self._uid)
+            self._order.append(len(self._uid))
+            self._uid.append(self._names.id_of(name))
+            self._amount.append(amount)
+            self._ts.append(ts)
+
+    def ordered(self, offset=0, limit=None, after=None):
+        if after is not None:
+            offset += bisect.bisect_right(self._order, tuple(after), key=self._key)
+        end = None if limit is None else offset + limit
+        return [self._bid(row) for row in self._order[offset:end]]
+
+    def rank(self, name):
+        row = self._row_of.get(name)
+        if row is None:
+            return None
+        return bisect.bisect_left(self._order, self._key(row), key=self._key) + 1
+
+    def lowest(self):
+        if not self._order:
+            return []
+        lowest_amount = self._amount[self._order[0]]
+        end = bisect.bisect_left(self._order, (lowest_amount + 1,), key=self._key)
+        return [self._bid(row) for row in self._order[:end]]
 
 
 class Auction_State(Enum):
@@ -60,12 +374,24 @@ class Auction_State(Enum):
 
 
 class Auction:
-    def __init__(self, task, duration_seconds):
+    def __init__(self, task, duration_seconds, starts_at_time=None, columnar=False):
+        now = time.time()
         self.task = task
-        self.status = Auction_State.OPEN
-        self.ends_at_time = time.time() + max(1, int(duration_seconds))
-        self.bids = {}
+        self.starts_at_time = now if starts_at_time is None else float(starts_at_time)
+        self.status = Auction_State.SCHEDULED if self.starts_at_time > now else Auction_State.OPEN
+        self.ends_at_time = self.starts_at_time + max(1, int(duration_seconds))
+        # name -> Bid mapping that also keeps the bids in (amount, timestamp) order
+        self.bids = ColumnarBidBook() if columnar else BidBook()
         self.assigned_user = None
+        self.version = 0
+
+    def open_now(self):
+        """Move a SCHEDULED auction to OPEN; no-op in any other state."""
+        if self.status != Auction_State.SCHEDULED:
+            return False
+        self.status = Auction_State.OPEN
+        self.version += 1
+        return True
 
     def is_open(self):
         return self.status == Auction_State.OPEN and time.time() < self.ends_at_time
@@ -83,14 +409,36 @@ class Auction:
         if bid_amount < 0:
             raise ValueError("Bid must be >= 0.")
         bidder = registry.ensure_user(name)
-        if bid_amount > bidder.points:
-            raise ValueError(f"Bid exceeds user's points ({bidder.points}).")
-        self.bids[bidder.name] = Bid(bidder.name, bid_amount)
+        with bidder.lock:
+            if bid_amount > bidder.points:
+                raise ValueError(f"Bid exceeds user's points ({bidder.points}).")
+            self.bids.record(bidder.name, bid_amount)
+        self.version += 1
+
+    def restore_bid(self, name, bid_amount, timestamp_ms, registry):
+        """Re-apply a logged bid verbatim, skipping the open/points checks."""
+        # record the registry's (interned) name, not the parsed copy
+        self.bids.record(registry.ensure_user(name).name, bid_amount, timestamp_ms)
+        self.version += 1
+
+    def sorted_bids(self, offset=0, limit=None, after=None):
+        """Bids lowest amount first, then earliest; sliced without a full sort.
+
+        `after` is an (amount, timestamp_ms, name) cursor; listing resumes
+        just past it.
+        """
+        return self.bids.ordered(offset, limit, after)
+
+    def bid_rank(self, name):
+        """1-based position of `name`'s bid in the book, or None."""
+        return self.bids.rank(name)
+
+    def lowest_bids(self):
+        """Every bid tied at the lowest amount, earliest first."""
+        return self.bids.lowest()
 
     def _pick_assignee_with_fair_tie(self, registry):
-        all_bids = list(self.bids.values())
-        lowest_amount = min(bid.bid_amount for bid in all_bids)
-        lowest_group = [bid for bid in all_bids if bid.bid_amount == lowest_amount]
+        lowest_group = self.lowest_bids()
         if len(lowest_group) == 1:
             return lowest_group[0].user
         tied_users = [registry.ensure_user(bid.user) for bid in lowest_group]
@@ -105,18 +453,85 @@ class Auction:
     def settle_now(self, registry):
         if self.status == Auction_State.CLOSED:
             return
-        self.status = Auction_State.CLOSED
-        if not self.bids:
-            self.assigned_user = None
+        assignee = self._pick_assignee_with_fair_tie(registry) if self.bids else None
+        self.apply_settlement(registry, assignee)
+
+    def apply_settlement(self, registry, assigned_user):
+        """Close with a known assignee: debit losers and hand over the task.
+
+        settle_now() picks the assignee; replaying a log passes it directly.
+        """
+        if self.status == Auction_State.CLOSED:
             return
-        self.assigned_user = self._pick_assignee_with_fair_tie(registry)
-        assignee_user = registry.ensure_user(self.assigned_user)
-        assignee_user.assigned_tasks.append(self.task)
-        for bid in self.bids.values():
-            if bid.user == self.assigned_user:
-                continue
-            bidder_user = registry.ensure_user(bid.user)
-            bidder_user.points = max(0, bidder_user.points - bid.bid_amount)
+        self.status = Auction_State.CLOSED
+        self.version += 1
+        self.assigned_user = assigned_user
+        registry.settle([self])
+
+    def to_snapshot(self):
+        return {
+            "task": self.task,
+            "status": self.status.name,
+            "starts_at_time": self.starts_at_time,
+            "ends_at_time": self.ends_at_time,
+            "bids": [[b.user, b.bid_amount, b.timestamp_ms] for b in self.sorted_bids()],
+            "assigned_user": self.assigned_user,
+            "version": self.version,
+            "columnar": isinstance(self.bids, ColumnarBidBook),
+        }
+
+    @classmethod
+    def from_snapshot(cls, data):
+        a = cls(data["task"], 1, starts_at_time=data["starts_at_time"], columnar=data.get("columnar", False))
+        a.status = Auction_State[data["status"]]
+        a.ends_at_time = data["ends_at_time"]
+        # snapshot bids are already in book order, so no re-sorting is needed
+        a.bids.load_sorted(data["bids"])
+        a.assigned_user = data["assigned_user"]
+        a.version = data["version"]
+        return a
+
+
+def settle_many(auctions, registry, rng=None):
+    """Settle a batch of auctions; same outcome as settle_now() on each in turn.
+
+    Winners come straight off each order book's lowest tie group. Tasks won
+    earlier in the batch count towards later fewest-tasks tie-breaks, and
+    random ties are drawn from `rng` (default: the `random` module) in the
+    same order the scalar path would draw them. The users are then updated
+    by one registry.settle() over the whole batch. Returns the assignee of
+    each auction.
+    """
+    rng = rng or random
+    won_now = {}
+    closed = []
+    assignees = []
+    for a in auctions:
+        if a.status == Auction_State.CLOSED:
+            assignees.append(a.assigned_user)
+            continue
+        group = a.lowest_bids()
+        if not group:
+            assignee = None
+        elif len(group) == 1:
+            assignee = group[0].user
+        else:
+            counts = [
+                (b.user, registry.ensure_user(b.user).tasks_assigned() + won_now.get(b.user, 0))
+                for b in group
+            ]
+            fewest = min(c for _, c in counts)
+            names = [n for n, c in counts if c == fewest]
+            assignee = names[0] if len(names) == 1 else rng.choice(names)
+        a.status = Auction_State.CLOSED
+        a.version += 1
+        a.assigned_user = assignee
+        assignees.append(assignee)
+        closed.append(a)
+        if assignee is not None:
+            won_now[assignee] = won_now.get(assignee, 0) + 1
+    registry.settle(closed)
+    return assignees
 
 
 class Task_State(Enum):
@@ -147,24 +562,220 @@ class Task:
 
 class TaskQueue:
     def __init__(self):
+        # (-priority, id, seq, task): seq breaks ties between equal ids so
+        # heapq never falls through to comparing Task objects
         self._heap = []
+        self._seq = itertools.count()
 
     def add_task(self, task):
-        heapq.heappush(self._heap, (-task.priority, task.id, task))
+        heapq.heappush(self._heap, (-task.priority, task.id, next(self._seq), task))
+
+    def add_tasks(self, tasks):
+        """Bulk load: one O(n) heapify instead of a heappush per task."""
+        self._heap.extend((-t.priority, t.id, next(self._seq), t) for t in tasks)
+        heapq.heapify(self._heap)
 
     def get_next_task(self):
         if not self._heap:
             return None
-        _, _, task = heapq.heappop(self._heap)
-        return task
+        return heapq.heappop(self._heap)[-1]
 
     def peek_next_task(self):
-        return None if not self._heap else self._heap[0][2]
+        return None if not self._heap else self._heap[0][-1]
+
+    def tasks(self):
+        """Queued tasks in heap (not pop) order."""
+        return [entry[-1] for entry in self._heap]
+
+    def clear(self):
+        self._heap.clear()
 
     def __len__(self):
         return len(self._heap)
 
 
+class TimerService:
+    """Runs callbacks at wall-clock times, earliest first, on one daemon thread.
+
+    Events sit in a min-heap keyed on their due time, so scheduling and firing
+    are O(log n) however many are pending. The thread starts on first use.
+    """
+
+    def __init__(self, max_sleep=1.0, autostart=True):
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self.max_sleep = max_sleep
+        self.autostart = autostart
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, when, fn, *args):
+        with self._cond:
+            heapq.heappush(self._heap, (when, next(self._seq), fn, args))
+            if self._thread is None and self.autostart:
+                self._thread = threading.Thread(target=self._run, name="timer-service", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def run_due(self, now=None):
+        """Run every callback due by `now`, including ones those schedule.
+
+        Returns how many ran.
+        """
+        ran = 0
+        while True:
+            due = []
+            with self._cond:
+                cutoff = time.time() if now is None else now
+                while self._heap and self._heap[0][0] <= cutoff:
+                    due.append(heapq.heappop(self._heap))
+            if not due:
+                return ran
+            for _, _, fn, args in due:
+                try:
+                    fn(*args)
+                except Exception as e:
+                    print(f"Timer callback {fn.__name__} failed: {e!r}")
+            ran += len(due)
+
+    def _run(self):
+        while True:
+            self.run_due()
+            with self._cond:
+                # re-check at least every max_sleep in case the wall clock jumps
+                delay = self.max_sleep
+                if self._heap:
+                    delay = min(delay, max(0.0, self._heap[0][0] - time.time()))
+                self._cond.wait(delay)
+
+
+def seconds_left(phase_ends_at, now):
+    return max(0, int(phase_ends_at - now)) if phase_ends_at else 0
+
+
+# gzip member header: deflate, no file name, mtime 0, unknown OS
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+
+def _deflate(data, final):
+    """Raw deflate blocks for `data`. Non-final output ends byte-aligned with no
+    back-references past it, so another stream's blocks can follow it."""
+    c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return c.compress(data) + c.flush(zlib.Z_FINISH if final else zlib.Z_FULL_FLUSH)
+
+
+class EncodedState:
+    """One state version, JSON-encoded once and shared by every reader.
+
+    server_time and seconds_left are the only fields that move while the
+    version stays put, so they are written per response in front of the
+    pre-encoded rest. Gzip bodies are spliced the same way: the rest is
+    deflated once, and each response deflates only its few head bytes.
+    """
+
+    __slots__ = ("version", "phase_ends_at", "state", "tail", "_gz_tail", "_deltas")
+
+    def __init__(self, static_state):
+        self.version = static_state["version"]
+        self.phase_ends_at = static_state["phase_ends_at"]
+        self.state = static_state                        # kept to diff newer versions against
+        self.tail = jsoncodec.dumps(static_state)[1:]   # every field after the opening brace
+        self._gz_tail = None
+        self._deltas = {}                                # base version -> encoded delta tail
+
+    def _head(self, now):
+        return ('{"server_time":%r,"seconds_left":%d,'
+                % (now, seconds_left(self.phase_ends_at, now))).encode("ascii")
+
+    def state_bytes(self, now):
+        """The state object alone, as pushed to /api/events."""
+        return self._head(now) + self.tail
+
+    def body(self, now):
+        """{"ok": true, "state": ...}, the /api/state response."""
+        return b'{"ok":true,"state":' + self._head(now) + self.tail + b"}"
+
+    def body_gzip(self, now):
+        """body(now), gzip-compressed."""
+        if self._gz_tail is None:
+            tail = self.tail + b"}"
+            self._gz_tail = (tail, _deflate(tail, final=True))
+        tail, deflated = self._gz_tail
+        head = b'{"ok":true,"state":' + self._head(now)
+        trailer = struct.pack("<II", zlib.crc32(tail, zlib.crc32(head)),
+                              (len(head) + len(tail)) & 0xFFFFFFFF)
+        return _GZIP_HEADER + _deflate(head, final=False) + deflated + trailer
+
+    def delta_body(self, base, now):
+        """{"ok": true, "delta": ...}, the /api/state?since=<base.version> response."""
+        tail = self._deltas.get(base.version)
+        if tail is None:
+            tail = jsoncodec.dumps(state_delta(base.state, self.state))[1:]
+            self._deltas[base.version] = tail
+        return b'{"ok":true,"delta":' + self._head(now) + tail + b"}"
+
+
+def state_delta(old, new):
+    """What changed between two static_state() dicts.
+
+    Scalar fields that differ are sent as-is. Bids and users go as
+    "bids_added" and "users_changed"/"users_removed" when merging those
+    into the old lists (merge_state_delta) rebuilds the new ones exactly,
+    and as full lists otherwise, e.g. when a new round starts.
+    """
+    delta = {"since": old["version"], "version": new["version"]}
+    for key, value in new.items():
+        if key not in ("version", "bids", "users") and old.get(key) != value:
+            delta[key] = value
+    if old["bids"] != new["bids"]:
+        seen = {(b["name"], b["amount"]) for b in old["bids"]}
+        added = [b for b in new["bids"] if (b["name"], b["amount"]) not in seen]
+        if _merge_bids(old["bids"], added) == new["bids"]:
+            delta["bids_added"] = added
+        else:
+            delta["bids"] = new["bids"]
+    if old["users"] != new["users"]:
+        before = {u["name"]: u for u in old["users"]}
+        changed = [u for u in new["users"] if before.get(u["name"]) != u]
+        removed = sorted(before.keys() - {u["name"] for u in new["users"]})
+        if _merge_users(old["users"], changed, removed) == new["users"]:
+            delta["users_changed"] = changed
+            if removed:
+                delta["users_removed"] = removed
+        else:
+            delta["users"] = new["users"]
+    return delta
+
+
+def merge_state_delta(state, delta):
+    """Apply a state_delta() to the state it was taken against (what app.js does)."""
+    merged = dict(state)
+    for key, value in delta.items():
+        if key not in ("since", "bids_added", "users_changed", "users_removed"):
+            merged[key] = value
+    if "bids_added" in delta:
+        merged["bids"] = _merge_bids(state["bids"], delta["bids_added"])
+    if "users_changed" in delta:
+        merged["users"] = _merge_users(state["users"], delta["users_changed"],
+                                       delta.get("users_removed", ()))
+    return merged
+
+
+def _merge_bids(bids, added):
+    # state() lists bids in the order they were placed
+    return list(bids) + list(added)
+
+
+def _merge_users(users, changed, removed):
+    removed = set(removed)
+    by_name = {u["name"]: u for u in users if u["name"] not in removed}
+    by_name.update((u["name"], u) for u in changed)
+    return list(by_name.values())
+
+
 class TurnController:
     def __init__(self, registry):
         self.registry = registry
@@ -177,14 +788,35 @@ class TurnController:
         self.bid_window_seconds = 11
         self.one_bid_per_user = True
         self.manual_transition = False
+        # bumped on every phase, active-user or bid change; waiters block on _cond
+        self.version = 0
+        self._cond = threading.Condition(threading.RLock())
+        self.journal = None
+        self.listeners = []    # called with no arguments, under _cond, on every change
+        self._encoded = None   # EncodedState of the current version, built on first read
+        self._history = collections.deque(maxlen=32)  # recent EncodedStates, for ?since= deltas
+
+    def _changed(self):
+        self.version += 1
+        self._encoded = None
+        self._cond.notify_all()
+        for listener in self.listeners:
+            listener()
+
+    def _log(self, event):
+        if self.journal is not None:
+            self.journal.append(event)
 
     def start_round(self, task, order):
-        self.auction = Auction(task=task, duration_seconds=3600)
-        self.turn_order = [self.registry.ensure_user(n).name for n in order]
-        self.current_index = 0 if self.turn_order else -1
-        self.phase = "handover" if self.turn_order else "results"
-        self.phase_ends_at = time.time() + (self.handover_seconds if self.turn_order else 0)
-        self.manual_transition = False
+        with self._cond:
+            self.auction = Auction(task=task, duration_seconds=3600)
+            self.turn_order = [self.registry.ensure_user(n).name for n in order]
+            self.current_index = 0 if self.turn_order else -1
+            self.phase = "handover" if self.turn_order else "results"
+            self.phase_ends_at = time.time() + (self.handover_seconds if self.turn_order else 0)
+            self.manual_transition = False
+            self._log({"type": "round_start", "task": task, "order": self.turn_order})
+            self._changed()
 
     def _active_user(self):
         return (
@@ -198,6 +830,7 @@ class TurnController:
         self.current_index += 1
         now = time.time()
         print(f"Advancing: current_index={self.current_index}, total_users={len(self.turn_order)}")
+        self._log({"type": "turn_index", "index": self.current_index})
         if self.current_index < len(self.turn_order):
             self.phase = "handover"
             self.phase_ends_at = now + self.handover_seconds
@@ -205,10 +838,13 @@ class TurnController:
         else:
             print("-> All users finished, going to results")
             if self.auction:
-                self.auction.settle_now(self.registry)
+                with METRICS.timer("settle_duration_seconds"):
+                    self.auction.settle_now(self.registry)
+                self._log({"type": "settle", "assigned": self.auction.assigned_user})
             self.phase = "results"
             self.phase_ends_at = None
         self.manual_transition = True
+        self._changed()
 
     def _advance(self):
         if self.manual_transition:
@@ -222,71 +858,617 @@ class TurnController:
         if self.phase == "handover":
             self.phase = "bid"
             self.phase_ends_at = now + self.bid_window_seconds
+            self._changed()
             return
         if self.phase == "bid":
             self._advance_to_next_user()
 
+    def current_version(self):
+        with self._cond:
+            self._advance()
+            return self.version
+
     def state(self):
-        self._advance()
-        left = int(self.phase_ends_at - time.time()) if self.phase_ends_at else 0
-        left = max(0, left)
-        return {
-            "task": self.auction.task if self.auction else None,
-            "phase": self.phase,
-            "active_user": self._active_user(),
-            "seconds_left": left,
-            "bids": [
-                {"name": b.user, "amount": b.bid_amount}
-                for b in (self.auction.bids.values() if self.auction else [])
-            ],
-            "assigned": self.auction.assigned_user if self.auction else None,
-            "users": [u.to_dict() for u in self.registry.list_users()],
-            "order": list(self.turn_order),
-            "index": self.current_index,
-        }
+        with self._cond:
+            state = self.static_state()
+            now = time.time()
+            state["server_time"] = now
+            state["seconds_left"] = seconds_left(state["phase_ends_at"], now)
+            return state
+
+    def encoded_state(self):
+        """EncodedState of the current version: one encode per change, however many readers."""
+        with self._cond:
+            self._advance()
+            if self._encoded is None:
+                # under the lock, so the readers woken by a change wait for one encode
+                # instead of each running their own
+                with METRICS.timer("state_encode_seconds"):
+                    self._encoded = EncodedState(self.static_state())
+                self._history.append(self._encoded)
+            return self._encoded
+
+    def encoded_since(self, since):
+        """(current EncodedState, the one of version `since` or None once it has aged out)."""
+        with self._cond:
+            entry = self.encoded_state()
+            base = next((e for e in self._history if e.version == since), None)
+            return entry, base
+
+    def static_state(self):
+        """state() without server_time and seconds_left, so it only changes with version."""
+        with self._cond:
+            self._advance()
+            return {
+                "version": self.version,
+                "task": self.auction.task if self.auction else None,
+                "phase": self.phase,
+                "phase_ends_at": self.phase_ends_at,
+                "active_user": self._active_user(),
+                "bids": [
+                    {"name": b.user, "amount": b.bid_amount}
+                    for b in (self.auction.bids.values() if self.auction else [])
+                ],
+                "assigned": self.auction.assigned_user if self.auction else None,
+                "users": [u.to_dict() for u in self.registry.list_users()],
+                "order": list(self.turn_order),
+                "index": self.current_index,
+            }
+
+    def wait_for_change(self, since, timeout):
+        """Block until version differs from `since` or `timeout` seconds pass.
+
+        Phase deadlines are applied while waiting, so a handover or bid window
+        running out wakes the waiter without anyone polling state().
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._advance()
+                if self.version != since:
+                    return self.version
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return self.version
+                if self.phase in ("handover", "bid") and self.phase_ends_at:
+                    remaining = min(remaining, max(0.01, self.phase_ends_at - time.time()))
+                self._cond.wait(remaining)
 
     def bid_active(self, amount):
-        self._advance()
-        if self.phase != "bid":
-            raise ValueError("Not in bid phase.")
-        active = self._active_user()
-        if not active:
-            raise ValueError("No active user.")
-        if self.one_bid_per_user and active in self.auction.bids:
-            raise ValueError("Already bid.")
-        print(f"Placing bid: {active} bids {amount}")
-        self.auction.place_bid(active, int(amount), self.registry)
-        self._advance_to_next_user()
+        with self._cond:
+            self._advance()
+            if self.phase != "bid":
+                raise ValueError("Not in bid phase.")
+            active = self._active_user()
+            if not active:
+                raise ValueError("No active user.")
+            if self.one_bid_per_user and active in self.auction.bids:
+                raise ValueError("Already bid.")
+            print(f"Placing bid: {active} bids {amount}")
+            self.auction.place_bid(active, int(amount), self.registry)
+            placed = self.auction.bids[active]
+            self._log({"type": "turn_bid", "user": active, "amount": placed.bid_amount,
+                       "ts": placed.timestamp_ms})
+            self._advance_to_next_user()
+
+    # ---- persistence ----
+    def to_snapshot(self):
+        with self._cond:
+            return {
+                "users": self.registry.to_snapshot(),
+                "auction": self.auction.to_snapshot() if self.auction else None,
+                "order": list(self.turn_order),
+                "index": self.current_index,
+                "phase": self.phase,
+                "phase_ends_at": self.phase_ends_at,
+                "version": self.version,
+            }
+
+    def _load_snapshot(self, snapshot):
+        self.registry.restore_snapshot(snapshot["users"])
+        self.auction = Auction.from_snapshot(snapshot["auction"]) if snapshot["auction"] else None
+        self.turn_order = snapshot["order"]
+        self.current_index = snapshot["index"]
+
+    def restore(self, snapshot):
+        """Load a to_snapshot() as it was taken, phase deadline and version included.
+
+        Deadlines that passed meanwhile are applied on the next read, as if
+        nobody had polled in between.
+        """
+        with self._cond:
+            self._load_snapshot(snapshot)
+            self.phase = snapshot["phase"]
+            self.phase_ends_at = snapshot["phase_ends_at"]
+            self.manual_transition = False
+            self.version = snapshot["version"]
+            self._encoded = None
+            self._history.clear()
+
+    def checkpoint(self):
+        """Write a snapshot consistent with the journal position."""
+        with self._cond:
+            seq = self.journal.last_seq
+            snapshot = self.to_snapshot()
+        self.journal.write_snapshot(seq, snapshot)
+
+    def replay(self, event):
+        kind = event["type"]
+        if kind == "round_start":
+            self.auction = Auction(task=event["task"], duration_seconds=3600)
+            self.turn_order = [self.registry.ensure_user(n).name for n in event["order"]]
+            self.current_index = 0 if self.turn_order else -1
+        elif kind == "turn_bid":
+            self.auction.restore_bid(event["user"], event["amount"], event["ts"], self.registry)
+        elif kind == "turn_index":
+            self.current_index = event["index"]
+        elif kind == "settle":
+            self.auction.apply_settlement(self.registry, event["assigned"])
+
+    def recover(self, journal):
+        """Load the latest snapshot and replay the log tail, then attach `journal`.
+
+        An unfinished round resumes at the handover of the user whose turn it was.
+        The version carries on from the snapshot's, one step per replayed event.
+        """
+        snapshot, events = journal.recover()
+        with self._cond:
+            if snapshot:
+                self._load_snapshot(snapshot)
+                self.version = snapshot["version"]
+            for event in events:
+                self.replay(event)
+                self.version += 1
+            self.manual_transition = False
+            if self.auction is None:
+                self.phase, self.phase_ends_at = "idle", None
+            elif self.auction.status != Auction_State.CLOSED and 0 <= self.current_index < len(self.turn_order):
+                self.phase, self.phase_ends_at = "handover", time.time() + self.handover_seconds
+            else:
+                self.phase, self.phase_ends_at = "results", None
+            self.journal = journal
+            self._changed()
+
+
+ROOM_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+class _Room:
+    __slots__ = ("turn", "in_use", "last_used", "saved_version", "loaded")
+
+    def __init__(self):
+        self.turn = None             # set once loaded; None after a failed load
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.saved_version = 0       # turn.version as last written to (or read from) disk
+        self.loaded = threading.Event()
+
+
+class RoomManager:
+    """Independent turn-based games ("rooms") by id, each with its own UserRegistry.
+
+    Rooms are created on first use by a writer. hibernate_idle() writes
+    rooms nobody has used for `idle_seconds` to `directory`, one JSON
+    snapshot each, and drops them from memory; the next use() loads the
+    room back as it was, so memory is bounded by the rooms in recent use
+    rather than all of them. A snapshot stays on disk until the room is
+    written out again, and rooms whose state has not changed since are not
+    rewritten, so a room that never started is never written at all.
+    Without a directory, a temporary one is made on first hibernation.
+    """
+
+    def __init__(self, directory=None, idle_seconds=300, starting_points=100):
+        self.directory = directory
+        self.idle_seconds = idle_seconds
+        self.starting_points = starting_points
+        self._rooms = {}                 # room id -> _Room, the rooms in memory or being loaded
+        self._saving = {}                # room id -> _Room being written out by hibernate_idle()
+        self._lock = threading.Lock()    # _rooms, _saving and the _Room counters; no file I/O under it
+        self._blank = TurnController(UserRegistry(starting_points=starting_points))
+
+    def __len__(self):
+        return len(self._rooms)
+
+    @contextlib.contextmanager
+    def use(self, room_id, create=True):
+        """The room's TurnController, which is not hibernated until the block exits.
+
+        With create=False a room that does not exist is not made: the block
+        gets a shared, never-started TurnController that must only be read.
+        """
+        if not ROOM_ID.fullmatch(room_id):
+            raise ValueError(f"Invalid room id {room_id!r}.")
+        room = self._acquire(room_id, create)
+        if room is None:
+            yield self._blank
+            return
+        try:
+            yield room.turn
+        finally:
+            with self._lock:
+                room.in_use -= 1
+                room.last_used = time.monotonic()
+
+    def _acquire(self, room_id, create):
+        if not create:
+            with self._lock:
+                known = room_id in self._rooms or room_id in self._saving
+            if not known and not self._saved(room_id):
+                return None
+        while True:
+            with self._lock:
+                # a room still being written out is in memory as it was: take it back
+                room = self._rooms.get(room_id) or self._saving.get(room_id)
+                loader = room is None
+                if loader:
+                    room = _Room()
+                self._rooms[room_id] = room
+                room.in_use += 1
+            if loader:
+                try:
+                    room.turn, room.saved_version = self._load(room_id)
+                finally:
+                    if room.turn is None:
+                        with self._lock:
+                            if self._rooms.get(room_id) is room:
+                                del self._rooms[room_id]
+                    room.loaded.set()
+                return room
+            room.loaded.wait()
+            if room.turn is not None:
+                return room
+            # the load failed in another thread; try it here
+
+    def hibernate_idle(self, now=None):
+        """Write out and unload rooms idle for idle_seconds; returns how many."""
+        cutoff = (time.monotonic() if now is None else now) - self.idle_seconds
+        with self._lock:
+            idle = [(rid, room) for rid, room in self._rooms.items()
+                    if not room.in_use and room.last_used <= cutoff and rid not in self._saving]
+            for rid, room in idle:
+                del self._rooms[rid]
+                self._saving[rid] = room
+            if idle and self.directory is None:
+                self.directory = tempfile.mkdtemp(prefix="rooms-")
+        done = 0
+        try:
+            for rid, room in idle:
+                version = room.turn.version
+                if version != room.saved_version:
+                    self._save(rid, room.turn)
+                    room.saved_version = version
+                done += 1
+        finally:
+            with self._lock:
+                for i, (rid, room) in enumerate(idle):
+                    if self._saving.get(rid) is room:
+                        del self._saving[rid]
+                    if i >= done:
+                        # not written: keep it in memory
+                        self._rooms.setdefault(rid, room)
+        METRICS.inc("room_hibernations_total", amount=done)
+        return done
+
+    def hibernate_all(self):
+        return self.hibernate_idle(now=float("inf"))
+
+    def _path(self, room_id):
+        return os.path.join(self.directory, f"room-{room_id}.json")
+
+    def _saved(self, room_id):
+        return self.directory is not None and os.path.exists(self._path(room_id))
+
+    def _save(self, room_id, turn):
+        path = self._path(room_id)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(jsoncodec.dumps(turn.to_snapshot()))
+        os.replace(path + ".tmp", path)
+
+    def _load(self, room_id):
+        """(TurnController, version on disk) for a room: its snapshot, or a new game."""
+        turn = TurnController(UserRegistry(starting_points=self.starting_points))
+        if self.directory is None:
+            return turn, 0
+        try:
+            with open(self._path(room_id), encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return turn, 0
+        turn.restore(snapshot)
+        METRICS.inc("room_loads_total")
+        return turn, turn.version
 
 
 REGISTRY = UserRegistry(starting_points=100)
 TURN = TurnController(REGISTRY)
+STREAM_KEEPALIVE_SECONDS = 15
+SNAPSHOT_INTERVAL_SECONDS = 60
+ROOM_SWEEP_SECONDS = 30       # how often rooms idle past ROOM_IDLE_SECONDS are hibernated
+IDLE_CONNECTION_SECONDS = 15  # keep-alive connections idle this long are closed
+GZIP_MIN_BYTES = 1024         # smaller JSON bodies are not worth compressing
+GZIP_LEVEL = 5
+# per process: ETags and event ids carry it, so ones from an earlier run never match
+EPOCH = os.urandom(4).hex()
+
+METRICS = metrics.Metrics()
+METRICS.counter("http_requests_total", "Requests handled, by route and status.")
+METRICS.histogram("http_request_duration_seconds", "Time spent handling a request, by route.")
+METRICS.histogram("serialize_seconds", "Time spent encoding JSON responses, by route.")
+METRICS.histogram("state_encode_seconds", "Time spent encoding a new state version, once for all readers.")
+METRICS.histogram("settle_duration_seconds", "Time spent settling the round's auction.")
+METRICS.counter("http_response_bytes_total", "JSON body bytes sent, by content encoding.")
+METRICS.gauge("auctions_open", "Auctions accepting bids.",
+              lambda: int(TURN.auction is not None and TURN.auction.status == Auction_State.OPEN))
+METRICS.gauge("bids", "Bids in the current round.",
+              lambda: len(TURN.auction.bids) if TURN.auction is not None else 0)
+METRICS.gauge("users", "Registered users.", lambda: len(REGISTRY.users))
+METRICS.gauge("turn_version", "Current TurnController state version.", lambda: TURN.version)
+METRICS.counter("room_hibernations_total", "Idle rooms written to disk and unloaded.")
+METRICS.counter("room_loads_total", "Hibernated rooms loaded back on use.")
+METRICS.gauge("rooms_loaded", "Rooms held in memory.", lambda: len(ROOMS))
+
+ROOMS = RoomManager(os.environ.get("ROOMS_DIR"), float(os.environ.get("ROOM_IDLE_SECONDS", "300")))
+# bids carry no user name here (the active player bids), so only the per-IP and in-flight limits apply
+ADMISSION = Admission.from_env(METRICS)
+
+PROFILER = profiler.SamplingProfiler()
+
+_ROUTES = {"/api/state", "/api/events", "/api/start_round", "/api/bid", "/metrics", "/api/admin/profile"}
+
+
+_ROOM_ACTIONS = ("state", "start_round", "bid")
+
+
+def room_path(path):
+    """(room id, action) for /api/rooms/<id>/<action>, else None."""
+    parts = path.split("/")
+    if (len(parts) == 5 and parts[:3] == ["", "api", "rooms"]
+            and ROOM_ID.fullmatch(parts[3]) and parts[4] in _ROOM_ACTIONS):
+        return parts[3], parts[4]
+    return None
+
+
+def _route_label(method, path):
+    path = urlsplit(path).path
+    room = room_path(path)
+    if room is not None:
+        return f"{method} /api/rooms/{{id}}/{room[1]}"
+    return f"{method} {path if path in _ROUTES else 'other'}"
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def accepts_gzip(accept_encoding):
+    """True when an Accept-Encoding header allows gzip (q > 0)."""
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            q = params.strip()
+            try:
+                return not q.startswith("q=") or float(q[2:]) > 0
+            except ValueError:
+                return False
+    return False
+
+
+def send_json(h, obj, status=200, etag=None):
+    t0 = time.perf_counter()
+    data = jsoncodec.dumps(obj)
+    METRICS.observe("serialize_seconds", time.perf_counter() - t0,
+                    (("route", _route_label(h.command, h.path)),))
+    send_encoded(h, data, status, etag)
+
+
+def send_state(h, entry, etag=None, base=None):
+    """Send a turn's state from its shared EncodedState `entry`,
+    as a delta against the older EncodedState `base` when given."""
+    t0 = time.perf_counter()
+    now = time.time()
+    data = entry.body(now) if base is None else entry.delta_body(base, now)
+    METRICS.observe("serialize_seconds", time.perf_counter() - t0,
+                    (("route", _route_label(h.command, h.path)),))
+    if base is None:
+        send_encoded(h, data, etag=etag, gzipped=lambda: entry.body_gzip(now))
+    else:
+        send_encoded(h, data, etag=etag)
 
 
-def send_json(h, obj, status=200):
-    data = json.dumps(obj).encode("utf-8")
+def send_encoded(h, data, status=200, etag=None, gzipped=None):
+    """Send JSON bytes, gzipped when large enough and accepted by the client.
+
+    `gzipped()` returns the compressed body; by default `data` is compressed.
+    """
+    encoding = "identity"
+    compressible = len(data) >= GZIP_MIN_BYTES
+    if compressible and accepts_gzip(h.headers.get("Accept-Encoding")):
+        data = gzipped() if gzipped else gzip.compress(data, GZIP_LEVEL, mtime=0)
+        encoding = "gzip"
+        if etag and not etag.startswith("W/"):
+            etag = "W/" + etag  # the bytes differ from the identity body, the content doesn't
+    METRICS.inc("http_response_bytes_total", (("encoding", encoding),), len(data))
     h.send_response(status)
     h.send_header("Content-Type", "application/json")
     h.send_header("Access-Control-Allow-Origin", "*")
+    if etag:
+        h.send_header("ETag", etag)
+        h.send_header("Cache-Control", "no-cache")
+    if encoding == "gzip":
+        h.send_header("Content-Encoding", "gzip")
+    if compressible:
+        h.send_header("Vary", "Accept-Encoding")
     h.send_header("Content-Length", str(len(data)))
     h.end_headers()
     h.wfile.write(data)
 
 
+def send_shed(h, shed):
+    """Refuse a request turned away by ADMISSION, with Retry-After."""
+    data = jsoncodec.dumps({"ok": False, "error": shed.message})
+    h.send_response(shed.status)
+    h.send_header("Content-Type", "application/json")
+    h.send_header("Access-Control-Allow-Origin", "*")
+    h.send_header("Retry-After", str(shed.retry_after))
+    h.send_header("Content-Length", str(len(data)))
+    h.end_headers()
+    h.wfile.write(data)
+
+
+def send_not_modified(h, etag):
+    h.send_response(304)
+    h.send_header("Access-Control-Allow-Origin", "*")
+    h.send_header("ETag", etag)
+    h.send_header("Cache-Control", "no-cache")
+    h.end_headers()
+
+
+def admin_allowed(token):
+    """True when ADMIN_TOKEN is set and `token` matches it."""
+    expected = os.environ.get("ADMIN_TOKEN")
+    return bool(expected) and hmac.compare_digest((token or "").encode(), expected.encode())
+
+
+def _instrumented(method):
+    """Count, time and maybe profile a do_* method by route.
+
+    The status comes from send_response. /api/events streams for as long as
+    the client stays, so it is never profiled.
+    """
+    @functools.wraps(method)
+    def wrapper(self):
+        t0 = time.perf_counter()
+        self.response_status = None
+        route = _route_label(self.command, self.path)
+        try:
+            if route == "GET /api/events":
+                method(self)
+            else:
+                PROFILER.call(route, method, self)
+        finally:
+            METRICS.inc("http_requests_total", (("route", route), ("status", str(self.response_status))))
+            METRICS.observe("http_request_duration_seconds", time.perf_counter() - t0, (("route", route),))
+    return wrapper
+
+
 class Handler(BaseHTTPRequestHandler):
+    # persistent connections: every response carries Content-Length, is a
+    # 204/304, or (send_error, /api/events) closes the connection itself
+    protocol_version = "HTTP/1.1"
+    timeout = IDLE_CONNECTION_SECONDS
+    # headers and body go out in separate writes; with Nagle on, the body
+    # waits for the client's delayed ACK on every kept-alive request
+    disable_nagle_algorithm = True
+
+    @staticmethod
+    def state_etag(version):
+        return f'"{EPOCH}.{version}"'
+
+    @staticmethod
+    def event_id(version):
+        return f"{EPOCH}.{version}".encode("ascii")
+
+    @staticmethod
+    def event_version(last_event_id):
+        """The version in a Last-Event-ID from this process, else -1."""
+        epoch, _, version = (last_event_id or "").partition(".")
+        try:
+            return int(version) if epoch == EPOCH else -1
+        except ValueError:
+            return -1
+
+    def send_response(self, code, message=None):
+        self.response_status = code
+        super().send_response(code, message)
+
+    @_instrumented
     def do_OPTIONS(self):
         self.send_response(204)
         self.send_header("Access-Control-Allow-Origin", "*")
         self.send_header("Access-Control-Allow-Methods", "GET,POST,OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type, If-None-Match")
+        self.send_header("Access-Control-Expose-Headers", "ETag")
         self.end_headers()
 
+    @_instrumented
     def do_GET(self):
-        if self.path == "/api/state":
-            send_json(self, {"ok": True, "state": TURN.state()})
+        url = urlsplit(self.path)
+        path = url.path
+        if path == "/metrics":
+            data = METRICS.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", metrics.CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if path == "/api/state":
+            self.get_state(TURN, url.query)
+            return
+        room = room_path(path)
+        if room is not None and room[1] == "state":
+            with ROOMS.use(room[0], create=False) as turn:
+                self.get_state(turn, url.query)
+            return
+        if path == "/api/events":
+            self.stream_state()
+            return
+        if path == "/api/admin/profile":
+            if not admin_allowed(self.headers.get("X-Admin-Token")):
+                send_json(self, {"ok": False, "error": "admin token required"}, 403)
+                return
+            data = PROFILER.collapsed().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
             return
         self.send_error(404, "Not Found")
 
+    def get_state(self, turn, query):
+        since = parse_qs(query).get("since")
+        try:
+            since = int(since[0]) if since else None
+        except ValueError:
+            send_json(self, {"ok": False, "error": "since must be an integer"}, 400)
+            return
+        # a version that has aged out of the history gets the full snapshot
+        entry, base = turn.encoded_since(since)
+        etag = self.state_etag(entry.version)
+        if etag_matches(self.headers.get("If-None-Match"), etag):
+            send_not_modified(self, etag)
+            return
+        send_state(self, entry, etag, base)
+
+    def stream_state(self):
+        """Server-Sent Events: push a state snapshot only when TURN.version moves."""
+        seen = self.event_version(self.headers.get("Last-Event-ID"))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while True:
+                version = TURN.wait_for_change(seen, STREAM_KEEPALIVE_SECONDS)
+                if version == seen:
+                    self.wfile.write(b": keepalive\n\n")
+                else:
+                    entry = TURN.encoded_state()
+                    seen = entry.version
+                    self.wfile.write(b"id: %s\nevent: state\ndata: %s\n\n"
+                                     % (self.event_id(seen), entry.state_bytes(time.time())))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    @_instrumented
     def do_POST(self):
         length = int(self.headers.get("Content-Length", "0") or "0")
         raw = self.rfile.read(length) if length > 0 else b"{}"
@@ -296,45 +1478,129 @@ class Handler(BaseHTTPRequestHandler):
             payload = {}
 
         if self.path == "/api/start_round":
-            task = (payload.get("task") or "").strip()
-            order = payload.get("order") or []
-            if not task:
-                send_json(self, {"ok": False, "error": "task required"}, 400)
-                return
-            if not isinstance(order, list) or not order:
-                send_json(self, {"ok": False, "error": "order (list) required"}, 400)
-                return
-            TURN.start_round(task, order)
-            send_json(self, {"ok": True, "state": TURN.state()})
+            self.post_start_round(TURN, payload)
             return
 
-        if self.path == "/api/bid":
+        room = room_path(self.path)
+        if self.path == "/api/bid" or (room is not None and room[1] == "bid"):
+            # shed before the room is loaded or the turn's lock is waited on
+            label = _route_label("POST", self.path)
+            shed = ADMISSION.check_ip(label, self.client_address[0])
+            if shed is None:
+                shed = ADMISSION.enter(label)
+            if shed is not None:
+                send_shed(self, shed)
+                return
             try:
-                amount = int(payload.get("amount"))
-            except Exception:
-                send_json(self, {"ok": False, "error": "amount must be integer"}, 400)
+                if room is None:
+                    self.post_bid(TURN, payload)
+                else:
+                    with ROOMS.use(room[0]) as turn:
+                        self.post_bid(turn, payload)
+            finally:
+                ADMISSION.leave()
+            return
+
+        if room is not None and room[1] == "start_round":
+            with ROOMS.use(room[0]) as turn:
+                self.post_start_round(turn, payload)
+            return
+
+        if self.path == "/api/admin/profile":
+            if not admin_allowed(self.headers.get("X-Admin-Token")):
+                send_json(self, {"ok": False, "error": "admin token required"}, 403)
                 return
             try:
-                TURN.bid_active(amount)
-                send_json(self, {"ok": True, "state": TURN.state()})
-            except Exception as e:
-                send_json(self, {"ok": False, "error": str(e), "state": TURN.state()}, 400)
+                send_json(self, {"ok": True, "profile": toggle_profiler(payload)})
+            except (TypeError, ValueError) as e:
+                send_json(self, {"ok": False, "error": str(e)}, 400)
             return
 
         self.send_error(404, "Not Found")
 
+    def post_start_round(self, turn, payload):
+        task = (payload.get("task") or "").strip()
+        order = payload.get("order") or []
+        if not task:
+            send_json(self, {"ok": False, "error": "task required"}, 400)
+            return
+        if not isinstance(order, list) or not order:
+            send_json(self, {"ok": False, "error": "order (list) required"}, 400)
+            return
+        turn.start_round(task, order)
+        send_state(self, turn.encoded_state())
+
+    def post_bid(self, turn, payload):
+        try:
+            amount = int(payload.get("amount"))
+        except Exception:
+            send_json(self, {"ok": False, "error": "amount must be integer"}, 400)
+            return
+        try:
+            turn.bid_active(amount)
+            send_state(self, turn.encoded_state())
+        except Exception as e:
+            send_json(self, {"ok": False, "error": str(e), "state": turn.state()}, 400)
+
+
+def toggle_profiler(payload):
+    """Apply {"enabled", "rate", "reset"} to PROFILER; stopping dumps the stacks."""
+    rate = float(payload.get("rate", 0.1))
+    if not 0 < rate <= 1:
+        raise ValueError("rate must be in (0, 1]")
+    if payload.get("reset"):
+        PROFILER.reset()
+    out = {}
+    if payload.get("enabled"):
+        PROFILER.start(rate)
+    elif "enabled" in payload and PROFILER.enabled:
+        PROFILER.stop()
+        out["output"] = PROFILER.dump(profiler.default_output())
+    return {**PROFILER.status(), **out}
+
 
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     daemon_threads = True
 
 
+def _checkpoint_periodically(timers):
+    TURN.checkpoint()
+    timers.schedule(time.time() + SNAPSHOT_INTERVAL_SECONDS, _checkpoint_periodically, timers)
+
+
+def _hibernate_rooms_periodically(timers):
+    ROOMS.hibernate_idle()
+    timers.schedule(time.time() + ROOM_SWEEP_SECONDS, _hibernate_rooms_periodically, timers)
+
+
 if __name__ == "__main__":
     random.seed()
-    srv = ThreadedHTTPServer(("127.0.0.1", 8080), Handler)
-    print("Server on http://127.0.0.1:8080")
+    profiler.toggle_on_signal(PROFILER)
+    timers = TimerService()
+    timers.schedule(time.time() + ROOM_SWEEP_SECONDS, _hibernate_rooms_periodically, timers)
+    data_dir = os.environ.get("TURN_DATA_DIR")
+    if data_dir:
+        TURN.recover(Journal(data_dir))
+        timers.schedule(time.time() + SNAPSHOT_INTERVAL_SECONDS, _checkpoint_periodically, timers)
+        print(f"Journal in {data_dir} (seq {TURN.journal.last_seq})")
+    # TURN_SERVER=async serves every connection from one event loop
+    mode = os.environ.get("TURN_SERVER", "threaded")
+    srv = None
+    print(f"Server ({mode}) on http://127.0.0.1:8080")
     try:
-        srv.serve_forever()
+        if mode == "async":
+            import asyncio
+            import aioserver
+            asyncio.run(aioserver.AsyncHTTPServer(Handler, TURN, STREAM_KEEPALIVE_SECONDS)
+                        .serve_forever("127.0.0.1", 8080))
+        else:
+            srv = ThreadedHTTPServer(("127.0.0.1", 8080), Handler)
+            srv.serve_forever()
     except KeyboardInterrupt:
         pass
     finally:
-        srv.server_close()
+        if srv is not None:
+            srv.server_close()
+        if TURN.journal is not None:
+            TURN.journal.close()
+        ROOMS.hibernate_all()
@@ -0,0 +1,103 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+
+import jsoncodec
+from app import Auction
+
+
+class AuctionArchive:
+    """Closed auctions moved out of memory, one immutable JSON summary each.
+
+    A summary is the auction's snapshot (task, times, winner, version and
+    its bids as sorted (user, amount, timestamp_ms) rows) plus the
+    allowlist and bid count. Files are spread over 256 subdirectories by a
+    hash of the auction id. get() rebuilds a read-only Auction with a
+    columnar bid book and keeps the last `cache_size` of them in an LRU, so
+    repeated /results for an old auction neither hit the disk nor grow
+    memory without bound. Membership is answered from the LRU or else by
+    a stat() of the summary's path, so nothing per archived id is held in
+    memory.
+    """
+
+    def __init__(self, directory, cache_size=1024, metrics=None):
+        self.directory = directory
+        self.cache_size = cache_size
+        self.metrics = metrics
+        self._cache = collections.OrderedDict()   # auction id -> (Auction, participants)
+        self._lock = threading.Lock()             # _cache
+
+    @staticmethod
+    def _digest(auction_id):
+        return hashlib.sha1(auction_id.encode("utf-8")).hexdigest()
+
+    def _path(self, auction_id):
+        digest = self._digest(auction_id)
+        return os.path.join(self.directory, digest[:2], digest + ".json")
+
+    def __contains__(self, auction_id):
+        with self._lock:
+            if auction_id in self._cache:
+                return True
+        return os.path.exists(self._path(auction_id))
+
+    def put(self, auction_id, auc, participants):
+        """Durably write the summary of a CLOSED auction; replaces any earlier one.
+
+        The file and its directory are fsynced before this returns, so the
+        caller may journal the auction as archived and drop it from memory.
+        """
+        snapshot = auc.to_snapshot()
+        snapshot["columnar"] = True
+        summary = {"auction_id": auction_id, "auction": snapshot,
+                   "participants": participants, "bid_count": len(auc.bids)}
+        path = self._path(auction_id)
+        shard = os.path.dirname(path)
+        new_shard = not os.path.isdir(shard)
+        os.makedirs(shard, exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(jsoncodec.dumps(summary))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        _fsync_dir(shard)
+        if new_shard:
+            _fsync_dir(self.directory)
+
+    def get(self, auction_id):
+        """(Auction, participants) for an archived id, or None. Do not modify the Auction."""
+        with self._lock:
+            entry = self._cache.get(auction_id)
+            if entry is not None:
+                self._cache.move_to_end(auction_id)
+                self._count("hit")
+                return entry
+        try:
+            with open(self._path(auction_id), encoding="utf-8") as f:
+                summary = json.load(f)
+        except FileNotFoundError:
+            return None
+        self._count("miss")
+        entry = (Auction.from_snapshot(summary["auction"]), summary["participants"])
+        with self._lock:
+            # two readers may load the same summary; keep the first so the
+            # Auction's identity (which keys CLOSED_BODIES) stays stable
+            entry = self._cache.setdefault(auction_id, entry)
+            self._cache.move_to_end(auction_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return entry
+
+    def _count(self, result):
+        if self.metrics is not None:
+            self.metrics.inc("archive_cache_total", (("result", result),))
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,160 @@
+"""Memory benchmark: bytes per retained user and per retained bid.
+
+    python bench_memory.py [--users 100000] [--bids 200000] [--steady-hours 6]
+
+"legacy" rebuilds the pre-__slots__ layout (Bid and User objects with a
+__dict__, bids in a plain dict beside a list of sorted tuples) so the
+saving from slotted classes and the columnar store can be read off one run.
+
+"steady" runs routes.py at a fixed auction rate for --steady-hours of
+simulated time and reports the memory it holds every hour, with and
+without archiving of closed auctions.
+"""
+import argparse
+import bisect
+import json
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import app
+import routes
+
+
+class _LegacyUser:
+    def __init__(self, name, points):
+        self.name = name.strip()
+        self.points = int(points)
+        self.assigned_tasks = []
+        self.lock = threading.Lock()
+
+
+class _LegacyBid:
+    def __init__(self, user, bid_amount, timestamp_ms):
+        self.user = user
+        self.bid_amount = int(bid_amount)
+        self.timestamp_ms = int(timestamp_ms)
+
+
+def _measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def _names(n):
+    return [f"user-{i:07d}" for i in range(n)]
+
+
+def per_user(n):
+    names = _names(n)
+
+    def legacy():
+        return {name: _LegacyUser(name, 100) for name in names}
+
+    def slotted():
+        return {name: app.User(name, 100) for name in names}
+
+    def registry():
+        reg = app.UserRegistry(100)
+        reg.create_users(names)
+        return reg
+
+    return {
+        "legacy": round(_measure(legacy) / n, 1),
+        "slotted": round(_measure(slotted) / n, 1),
+        # includes the Leaderboard's sort key per user
+        "registry_with_leaderboard": round(_measure(registry) / n, 1),
+    }
+
+
+def per_bid(n):
+    names = _names(n)
+    ts0 = int(time.time() * 1000)
+
+    def legacy():
+        bids, book = {}, []
+        for i, name in enumerate(names):
+            bids[name] = _LegacyBid(name, i % 50, ts0 + i)
+            bisect.insort(book, (i % 50, ts0 + i, name))
+        return bids, book
+
+    def auction(columnar):
+        def build():
+            a = app.Auction("bench", 3600, columnar=columnar)
+            for i, name in enumerate(names):
+                a.bids.record(name, i % 50, ts0 + i)
+            return a
+        return build
+
+    for name in names:  # user ids are shared across auctions; keep them out of the per-bid cost
+        app.NAMES.id_of(name)
+    return {
+        "legacy": round(_measure(legacy) / n, 1),
+        "slotted_bidbook": round(_measure(auction(False)) / n, 1),
+        "columnar": round(_measure(auction(True)) / n, 1),
+    }
+
+
+def steady(hours, auctions_per_hour=200, bids=20, archive=False):
+    """Held memory (MB) after each simulated hour of create, bid, settle and, optionally, archive."""
+    now = [1_700_000_000.0]
+    real_time, time.time = time.time, lambda: now[0]
+    saved_archive = routes.ARCHIVE
+    routes.AUCTIONS.clear()
+    routes.AUCTION_PARTICIPANTS.clear()
+    routes.REGISTRY.clear()
+    users = _names(200)
+    routes.REGISTRY.create_users(users)
+    held = []
+    with tempfile.TemporaryDirectory() as d:
+        routes.ARCHIVE = routes.AuctionArchive(d) if archive else None
+        tracemalloc.start()
+        try:
+            seq = 0
+            for _ in range(hours):
+                for _ in range(auctions_per_hour):
+                    aid = f"M{seq}"
+                    seq += 1
+                    routes.STORE.create([(aid, app.Auction("bench", 1), None)])
+                    with routes.STORE.write([aid]) as view:
+                        auc = view.auction(aid)
+                        for i in range(bids):
+                            auc.place_bid(users[(seq + i) % len(users)], 0, view.registry)
+                    now[0] += 3600 / auctions_per_hour
+                    routes.settle_expired([aid])
+                if archive:
+                    routes.archive_closed()
+                held.append(round(tracemalloc.get_traced_memory()[0] / 1e6, 2))
+        finally:
+            tracemalloc.stop()
+            time.time = real_time
+            routes.ARCHIVE = saved_archive
+            routes.AUCTIONS.clear()
+            routes.REGISTRY.clear()
+    return held
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--users", type=int, default=100_000)
+    ap.add_argument("--bids", type=int, default=200_000)
+    ap.add_argument("--steady-hours", type=int, default=6)
+    args = ap.parse_args()
+    print(json.dumps({
+        "bytes_per_user": per_user(args.users),
+        "bytes_per_bid": per_bid(args.bids),
+        "steady_mb_by_hour": {
+            "in_memory": steady(args.steady_hours),
+            "archived_after_1h": steady(args.steady_hours, archive=True),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Settlement throughput: auctions/sec settled one by one vs. in one batch.
+
+    python bench_settle.py [--auctions 20000] [--bids 20] [--users 2000]
+
+Both paths settle identical copies of the same auctions with the same seed,
+and the run fails loudly if their outcomes ever differ.
+"""
+import argparse
+import json
+import random
+import time
+
+import app
+
+
+def _build(n_auctions, bids_per_auction, n_users, columnar):
+    gen = random.Random(1)
+    names = [f"u{i}" for i in range(n_users)]
+    reg = app.UserRegistry(1000)
+    reg.create_users(names)
+    ts0 = int(time.time() * 1000)
+    auctions = []
+    for i in range(n_auctions):
+        a = app.Auction(f"task {i}", 3600, columnar=columnar)
+        for name in gen.sample(names, bids_per_auction):
+            a.bids.record(name, gen.randint(0, 9), ts0 + gen.randint(0, 999))
+        auctions.append(a)
+    return reg, auctions
+
+
+def bench(n_auctions, bids_per_auction, n_users, columnar=False):
+    reg, auctions = _build(n_auctions, bids_per_auction, n_users, columnar)
+    random.seed(5)
+    t0 = time.perf_counter()
+    for a in auctions:
+        a.settle_now(reg)
+    scalar_s = time.perf_counter() - t0
+    scalar = [a.assigned_user for a in auctions]
+
+    breg, bauctions = _build(n_auctions, bids_per_auction, n_users, columnar)
+    t0 = time.perf_counter()
+    batch = app.settle_many(bauctions, breg, rng=random.Random(5))
+    batch_s = time.perf_counter() - t0
+
+    points = lambda r: [(u.name, u.points) for u in r.list_users()]
+    if batch != scalar or points(breg) != points(reg):
+        raise SystemExit("batch settlement diverged from settle_now()")
+    return {
+        "auctions": n_auctions,
+        "bids_per_auction": bids_per_auction,
+        "scalar_auctions_per_s": round(n_auctions / scalar_s),
+        "batch_auctions_per_s": round(n_auctions / batch_s),
+        "speedup": round(scalar_s / batch_s, 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--auctions", type=int, default=20_000)
+    ap.add_argument("--bids", type=int, default=20)
+    ap.add_argument("--users", type=int, default=2000)
+    args = ap.parse_args()
+    print(json.dumps({
+        "bidbook": bench(args.auctions, args.bids, args.users),
+        "columnar": bench(args.auctions, args.bids, args.users, columnar=True),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
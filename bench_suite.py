@@ -0,0 +1,358 @@
+"""Benchmark suite for the auction core and both servers, with baseline checks.
+
+    python bench_suite.py [--quick] [--only PREFIX] [--out results.json]
+                          [--baseline bench_baseline.json] [--save-baseline]
+                          [--tolerance 0.15]
+
+Every benchmark reports operations per second (the median of several
+repeats, with the garbage collector paused while timing) and uses fixed
+seeds and sizes, so two runs on the same machine compare like for like.
+With --baseline, each result is compared to the stored one and anything
+slower by more than --tolerance is listed under "regressions" and makes
+the exit status 1. --save-baseline writes this run as the new baseline.
+Baselines are per machine; record one before a change and compare after.
+"""
+import argparse
+import gc
+import http.client
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import app
+import routes
+
+REPEATS = 5
+
+
+def _measure(run, ops, repeats=REPEATS):
+    """Time `timed(setup())` `repeats` times; report the median per op."""
+    setup, timed = run
+    samples = []
+    for _ in range(repeats):
+        state = setup()
+        gc.collect()
+        gc.disable()
+        try:
+            t0 = time.perf_counter()
+            timed(state)
+            elapsed = time.perf_counter() - t0
+        finally:
+            gc.enable()
+        samples.append(elapsed)
+    per_op = statistics.median(samples) / ops
+    return {"ops_per_s": round(1 / per_op, 1), "us_per_op": round(per_op * 1e6, 3)}
+
+
+# ---- core ----
+def bench_place_bid(n):
+    names = [f"u{i}" for i in range(n)]
+    reg = app.UserRegistry(10**9)
+    reg.create_users(names)
+    gen = random.Random(n)
+    amounts = [gen.randint(0, 1000) for _ in names]
+
+    def timed(a):
+        for name, amount in zip(names, amounts):
+            a.place_bid(name, amount, reg)
+    return _measure((lambda: app.Auction("bench", 3600), timed), n)
+
+
+def bench_settle_now(n, auctions=None):
+    auctions = auctions or max(1, 20_000 // n)
+    names = [f"u{i}" for i in range(n)]
+    reg = app.UserRegistry(10**9)
+    reg.create_users(names)
+    ts0 = 1_700_000_000_000
+
+    def setup():
+        gen = random.Random(n)
+        random.seed(n)
+        built = []
+        for _ in range(auctions):
+            a = app.Auction("bench", 3600)
+            for name in names:
+                a.bids.record(name, gen.randint(0, 50), ts0 + gen.randint(0, 999))
+            built.append(a)
+        return built
+
+    def timed(built):
+        for a in built:
+            a.settle_now(reg)
+    return _measure((setup, timed), auctions)
+
+
+def bench_task_queue(n):
+    gen = random.Random(n)
+    tasks = [app.Task(i, f"t{i}", "", None, gen.randint(0, 9), None) for i in range(n)]
+
+    def timed(q):
+        for t in tasks:
+            q.add_task(t)
+        while q.get_next_task() is not None:
+            pass
+    return _measure((app.TaskQueue, timed), 2 * n)
+
+
+def bench_turn_state(n, calls=50):
+    reg = app.UserRegistry(100)
+    names = [f"u{i}" for i in range(n)]
+    reg.create_users(names)
+    turn = app.TurnController(reg)
+    turn.start_round("bench", names)
+
+    def timed(_):
+        for _ in range(calls):
+            turn.state()
+    return _measure((lambda: None, timed), calls)
+
+
+def bench_state_body(n, gzipped=False, calls=200):
+    """A /api/state response body for an unchanged version, served from encoded_state()."""
+    reg = app.UserRegistry(100)
+    names = [f"u{i}" for i in range(n)]
+    reg.create_users(names)
+    turn = app.TurnController(reg)
+    turn.start_round("bench", names)
+
+    def timed(_):
+        for _ in range(calls):
+            entry = turn.encoded_state()
+            entry.body_gzip(time.time()) if gzipped else entry.body(time.time())
+    return _measure((lambda: None, timed), calls)
+
+
+# ---- routes serialization ----
+def _reset_routes():
+    routes.AUCTIONS.clear()
+    routes.AUCTION_PARTICIPANTS.clear()
+    routes.REGISTRY.clear()
+
+
+def bench_auction_to_out(n, bids_limit=None, calls=20):
+    _reset_routes()
+    a = app.Auction("bench", 3600)
+    gen = random.Random(n)
+    for i in range(n):
+        a.bids.record(f"u{i}", gen.randint(0, 50), 1_700_000_000_000 + i)
+
+    def timed(_):
+        for _ in range(calls):
+            routes._auction_to_out("A", a, bids_limit=bids_limit).model_dump_json()
+    return _measure((lambda: None, timed), calls)
+
+
+def bench_leaderboard(n, limit=50, calls=200):
+    _reset_routes()
+    routes.REGISTRY.create_users(f"u{i}" for i in range(n))
+    gen = random.Random(n)
+    for u in routes.REGISTRY.list_users():
+        u.points = gen.randint(0, 100)
+    routes.REGISTRY.leaderboard().rebuild(routes.REGISTRY.users.values())
+
+    def timed(_):
+        for _ in range(calls):
+            routes.leaderboard(limit=limit, offset=0).model_dump_json()
+    return _measure((lambda: None, timed), calls)
+
+
+# ---- SQLite store ----
+def _sqlite_store():
+    return routes.SQLiteStore(os.path.join(tempfile.mkdtemp(), "bench.db"), 10**9)
+
+
+def _fill_sqlite(store, auctions, bids, ends_at):
+    store.create([(f"S{a}", app.Auction("bench", 3600), None) for a in range(auctions)])
+    store.ensure_users(f"u{i}" for i in range(bids))
+    gen = random.Random(bids)
+    with store._transaction(immediate=True) as conn:
+        conn.execute("UPDATE auctions SET ends_at = ?", (ends_at,))
+        conn.executemany("INSERT INTO bids VALUES (?, ?, ?, ?)",
+                         [(f"S{a}", f"u{i}", gen.randint(0, 50), 1_700_000_000_000 + i)
+                          for a in range(auctions) for i in range(bids)])
+
+
+def bench_sqlite_results(n, calls=50):
+    """/results?bids_limit=20 of an open auction with n bids, read from the database."""
+    store, saved = _sqlite_store(), routes.STORE
+    _fill_sqlite(store, 1, n, time.time() + 3600)
+
+    def timed(_):
+        for _ in range(calls):
+            with routes._current("S0") as (view, a):
+                routes._auction_to_out("S0", a, 20, None, view.participants("S0")).model_dump_json()
+    routes.STORE = store
+    try:
+        return _measure((lambda: None, timed), calls)
+    finally:
+        routes.STORE = saved
+
+
+def bench_sqlite_settle(n, auctions=None):
+    """settle_expired() over auctions of n bids each: debits and task updates in SQL."""
+    auctions = auctions or max(1, 20_000 // n)
+    saved = routes.STORE
+
+    def setup():
+        routes.STORE = _sqlite_store()
+        _fill_sqlite(routes.STORE, auctions, n, time.time() - 1)
+
+    def timed(_):
+        routes.settle_expired([f"S{a}" for a in range(auctions)])
+    try:
+        return _measure((setup, timed), auctions, repeats=3)
+    finally:
+        routes.STORE = saved
+
+
+# ---- end to end ----
+class _QuietHandler(app.Handler):
+    def log_message(self, format, *args):
+        pass
+
+
+def bench_threaded_http(users, clients=8, requests_per_client=250):
+    """GET /api/state over real sockets against ThreadedHTTPServer."""
+    app.REGISTRY.clear()
+    app.REGISTRY.create_users(f"u{i}" for i in range(users))
+    app.TURN.start_round("bench", [f"u{i}" for i in range(users)])
+    srv = app.ThreadedHTTPServer(("127.0.0.1", 0), _QuietHandler)
+    port = srv.server_address[1]
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    errors = []
+
+    def client():
+        for _ in range(requests_per_client):
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            try:
+                conn.request("GET", "/api/state")
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status != 200:
+                    errors.append(resp.status)
+            except OSError as e:
+                errors.append(repr(e))
+            finally:
+                conn.close()
+
+    def timed(_):
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    try:
+        out = _measure((lambda: None, timed), clients * requests_per_client, repeats=3)
+    finally:
+        srv.shutdown()
+        srv.server_close()
+    out["errors"] = len(errors)
+    return out
+
+
+def bench_fastapi(n):
+    """POST /bid then GET /results?bids_limit=20, n times, through TestClient."""
+    from fastapi.testclient import TestClient
+    _reset_routes()
+    client = TestClient(routes.app)
+    counter = iter(range(10**9))
+
+    def setup():
+        aid = f"E{next(counter)}"
+        r = client.post("/new_task", json={"auction_id": aid, "task": "bench", "duration_seconds": 3600})
+        assert r.status_code == 201, r.text
+        return aid
+
+    def timed(aid):
+        for i in range(n):
+            client.post("/bid", params={"compact": "true"},
+                        json={"auction_id": aid, "user": f"u{i}", "bid_amount": i % 7})
+            client.get("/results", params={"auction_id": aid, "bids_limit": 20})
+    return _measure((setup, timed), 2 * n, repeats=3)
+
+
+def suite(quick):
+    sizes = [100, 1000] if quick else [100, 1000, 10_000]
+    users = [10, 100] if quick else [10, 100, 1000]
+    benches = {}
+    for n in sizes:
+        benches[f"auction.place_bid[n={n}]"] = lambda n=n: bench_place_bid(n)
+        benches[f"auction.settle_now[bids={n}]"] = lambda n=n: bench_settle_now(n)
+        benches[f"task_queue.add_pop[n={n}]"] = lambda n=n: bench_task_queue(n)
+        benches[f"routes.auction_to_out[bids={n}]"] = lambda n=n: bench_auction_to_out(n)
+        benches[f"routes.auction_to_out[bids={n},limit=50]"] = lambda n=n: bench_auction_to_out(n, 50)
+        benches[f"routes.leaderboard[users={n},limit=50]"] = lambda n=n: bench_leaderboard(n)
+        benches[f"sqlite.results[bids={n},limit=20]"] = lambda n=n: bench_sqlite_results(n)
+        benches[f"sqlite.settle[bids={n}]"] = lambda n=n: bench_sqlite_settle(n)
+    for n in users:
+        benches[f"turn.state[users={n}]"] = lambda n=n: bench_turn_state(n)
+        benches[f"turn.state_body[users={n}]"] = lambda n=n: bench_state_body(n)
+        benches[f"turn.state_body_gzip[users={n}]"] = lambda n=n: bench_state_body(n, gzipped=True)
+    benches["e2e.threaded_http.get_state[users=100]"] = lambda: bench_threaded_http(
+        100, requests_per_client=50 if quick else 250)
+    benches["e2e.fastapi.bid_and_results"] = lambda: bench_fastapi(100 if quick else 500)
+    return benches
+
+
+def compare(results, baseline, tolerance):
+    """Per-benchmark change against `baseline`; regressions are slower than tolerance allows."""
+    report, regressions = {}, []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = cur["ops_per_s"] / base["ops_per_s"] - 1
+        regressed = change < -tolerance
+        report[name] = {"baseline_ops_per_s": base["ops_per_s"], "ops_per_s": cur["ops_per_s"],
+                        "change_pct": round(change * 100, 1), "regression": regressed}
+        if regressed:
+            regressions.append(name)
+    return report, regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--quick", action="store_true", help="smaller sizes, for a fast sanity run")
+    ap.add_argument("--only", default="", help="run benchmarks whose name starts with this")
+    ap.add_argument("--out", help="also write the JSON report to this file")
+    ap.add_argument("--baseline", default="bench_baseline.json")
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown, 0.15 = 15%%")
+    args = ap.parse_args()
+
+    results = {}
+    for name, run in suite(args.quick).items():
+        if name.startswith(args.only):
+            results[name] = run()
+            print(f"{name}: {results[name]['ops_per_s']} ops/s", file=sys.stderr)
+
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "quick": args.quick, "taken_at": time.time()},
+        "results": results,
+    }
+    regressions = []
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        report["comparison"], regressions = compare(results, baseline, args.tolerance)
+        report["regressions"] = regressions
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            f.write(text)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
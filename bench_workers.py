@@ -0,0 +1,118 @@
+"""Throughput of routes.py as worker processes sharing one SQLite store are added.
+
+    python bench_workers.py [--workers 1,2,4] [--seconds 5] [--read-ratio 0.5]
+
+Each worker is a separate process that sets STORE to a SQLiteStore on the
+same database file, as `AUCTION_DB=... uvicorn routes:app --workers N`
+would, and drives the app through the ASGI test client: bids from users
+unique to the worker, and /results reads, against a shared set of open
+auctions. The in-process store runs once as the single-worker baseline.
+Expect scaling up to the number of cores, with bids bounded by SQLite's
+one writer at a time.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+
+def _worker(db, index, auctions, seconds, read_ratio, start_at, out):
+    import routes
+    from fastapi.testclient import TestClient
+
+    if db is not None:
+        routes.STORE = routes.SQLiteStore(db, routes.REGISTRY.starting_points)
+    rng = random.Random(index)
+    reads = bids = errors = 0
+    seq = 0
+    # one portal thread for the whole run rather than one per request
+    with TestClient(routes.app) as client:
+        while time.time() < start_at:
+            time.sleep(0.001)
+        stop = start_at + seconds
+        while time.time() < stop:
+            aid = f"W{rng.randrange(auctions)}"
+            if rng.random() < read_ratio:
+                r = client.get("/results", params={"auction_id": aid, "bids_limit": 10})
+                reads += 1
+            else:
+                seq += 1
+                r = client.post("/bid", params={"compact": "true"},
+                                json={"auction_id": aid, "user": f"w{index}u{seq}", "bid_amount": rng.randrange(10)})
+                bids += 1
+            errors += r.status_code != 200
+    out.put({"reads": reads, "bids": bids, "errors": errors})
+
+
+def _create_auctions(db, auctions):
+    import routes
+    from fastapi.testclient import TestClient
+
+    if db is not None:
+        routes.STORE = routes.SQLiteStore(db, routes.REGISTRY.starting_points)
+    client = TestClient(routes.app)
+    for a in range(auctions):
+        client.post("/new_task", json={"auction_id": f"W{a}", "task": f"task {a}", "duration_seconds": 3600})
+
+
+def run(workers, seconds, read_ratio, auctions, db):
+    """Spawn `workers` processes against `db` (None: in-process store) for `seconds`."""
+    ctx = multiprocessing.get_context("spawn")
+    if db is not None:
+        _create_auctions(db, auctions)
+    out = ctx.Queue()
+    # every worker starts at the same moment, after its imports are done
+    start_at = time.time() + 2.0 + 1.0 * workers
+    target = _worker if db is not None else _local_worker
+    procs = [ctx.Process(target=target, args=(db, i, auctions, seconds, read_ratio, start_at, out))
+             for i in range(workers)]
+    for p in procs:
+        p.start()
+    counts = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    reads = sum(c["reads"] for c in counts)
+    bids = sum(c["bids"] for c in counts)
+    return {
+        "store": "sqlite" if db is not None else "local",
+        "workers": workers,
+        "requests_per_s": round((reads + bids) / seconds),
+        "bids_per_s": round(bids / seconds),
+        "reads_per_s": round(reads / seconds),
+        "errors": sum(c["errors"] for c in counts),
+    }
+
+
+def _local_worker(_db, index, auctions, seconds, read_ratio, start_at, out):
+    # the in-process store only exists inside one process, so it creates its own auctions
+    _create_auctions(None, auctions)
+    _worker(None, index, auctions, seconds, read_ratio, start_at, out)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--read-ratio", type=float, default=0.5, help="share of requests that are /results reads")
+    ap.add_argument("--auctions", type=int, default=200)
+    ap.add_argument("--out", help="also write the JSON report to this file")
+    args = ap.parse_args()
+
+    rows = [run(1, args.seconds, args.read_ratio, args.auctions, None)]
+    for n in (int(w) for w in args.workers.split(",")):
+        with tempfile.TemporaryDirectory() as d:
+            rows.append(run(n, args.seconds, args.read_ratio, args.auctions, os.path.join(d, "auctions.db")))
+    report = {"cpus": os.cpu_count(), "seconds": args.seconds, "read_ratio": args.read_ratio, "runs": rows}
+    for row in rows:
+        print(f"{row['store']:>6} x{row['workers']:<2} {row['requests_per_s']:>7} req/s"
+              f"  ({row['bids_per_s']} bids/s, {row['reads_per_s']} reads/s, {row['errors']} errors)")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import threading
+
+import jsoncodec
+
+
+class Journal:
+    """Append-only event log with group commit, plus compact snapshots.
+
+    Events are JSON lines in segment files named log-<first seq>.jsonl.
+    append() only queues the event; a writer thread encodes every queued
+    event, writes them in one go and fsyncs once per batch (group commit).
+    Callers that must not return before their event is on disk can use
+    wait_durable(seq). With the default flush_interval the window that can
+    be lost on a crash is a few milliseconds of events.
+
+    write_snapshot(seq, state) stores a full state image taken at `seq`,
+    starts a fresh segment and drops segments the snapshot fully covers, so
+    recovery reads the latest snapshot and replays only the log tail.
+    """
+
+    def __init__(self, directory, flush_interval=0.005, fsync=True):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()        # seq assignment and the pending queue
+        self._io_lock = threading.RLock()    # segment writes and rolls
+        self._durable = threading.Condition(threading.Lock())
+        self._pending = []
+        self._wake = threading.Event()
+        self._closed = False
+        self.last_seq = self._scan_last_seq()
+        self.durable_seq = self.last_seq
+        self._segment = None
+        self._open_segment(self.last_seq + 1)
+        self._writer = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._writer.start()
+
+    # ---- files ----
+    def _segments(self):
+        names = [n for n in os.listdir(self.directory) if n.startswith("log-") and n.endswith(".jsonl")]
+        return sorted((int(n[4:-6]), os.path.join(self.directory, n)) for n in names)
+
+    def _snapshots(self):
+        names = [n for n in os.listdir(self.directory) if n.startswith("snapshot-") and n.endswith(".json")]
+        return sorted((int(n[9:-5]), os.path.join(self.directory, n)) for n in names)
+
+    def _scan_last_seq(self):
+        snaps = self._snapshots()
+        last = snaps[-1][0] if snaps else 0
+        for _, path in reversed(self._segments()):
+            seq = _last_seq_in(path)
+            if seq is not None:
+                return max(last, seq)
+        return last
+
+    def _open_segment(self, first_seq):
+        if self._segment:
+            self._segment.close()
+        path = os.path.join(self.directory, f"log-{first_seq:012d}.jsonl")
+        self._segment = open(path, "ab")
+
+    # ---- writing ----
+    def append(self, event):
+        """Queue `event` (a JSON-able dict) and return its sequence number."""
+        with self._lock:
+            self.last_seq += 1
+            event["seq"] = self.last_seq
+            self._pending.append(event)
+            return self.last_seq
+
+    def wait_durable(self, seq, timeout=None):
+        """Block until `seq` has been fsynced; False on timeout."""
+        self._wake.set()
+        with self._durable:
+            return self._durable.wait_for(lambda: self.durable_seq >= seq, timeout)
+
+    def flush(self):
+        self.wait_durable(self.last_seq)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._commit()
+
+    def _commit(self):
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            data = b"".join([jsoncodec.dumps(e) + b"\n" for e in batch])
+            self._segment.write(data)
+            self._segment.flush()
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+        with self._durable:
+            self.durable_seq = batch[-1]["seq"]
+            self._durable.notify_all()
+
+    def close(self):
+        self.flush()
+        self._closed = True
+        self._wake.set()
+        self._writer.join()
+        self._segment.close()
+
+    # ---- snapshots ----
+    def write_snapshot(self, seq, state):
+        """Persist `state` as of `seq`, then drop log segments it covers.
+
+        The caller must hold whatever locks make `state` exactly the result
+        of events up to `seq` while capturing it; writing happens here,
+        outside those locks.
+        """
+        path = os.path.join(self.directory, f"snapshot-{seq:012d}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            # one-shot encode: json.dump() would fall back to the pure-Python encoder
+            f.write(jsoncodec.dumps({"seq": seq, "taken_at": time.time(), "state": state}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+        with self._io_lock:
+            # finish the current segment, then roll. Events queued in between
+            # land in the new segment; seqs within a segment never exceed the
+            # next segment's first seq - 1, which is what pruning relies on.
+            self._commit()
+            with self._lock:
+                next_seq = self.last_seq + 1
+            self._open_segment(next_seq)
+
+        segments = self._segments()
+        for (first, seg_path), (next_first, _) in zip(segments, segments[1:]):
+            if next_first - 1 <= seq:
+                os.remove(seg_path)
+        for old_seq, snap_path in self._snapshots():
+            if old_seq < seq:
+                os.remove(snap_path)
+
+    # ---- recovery ----
+    def recover(self):
+        """Return (snapshot state or None, iterator of events logged after it).
+
+        Segments are written in seq order, so the tail is streamed rather
+        than loaded and sorted.
+        """
+        state, since = None, 0
+        snaps = self._snapshots()
+        if snaps:
+            with open(snaps[-1][1], encoding="utf-8") as f:
+                doc = json.load(f)
+            state, since = doc["state"], doc["seq"]
+        return state, self._tail(since)
+
+    def _tail(self, since):
+        for _, path in self._segments():
+            for event in _read_events(path):
+                if event["seq"] > since:
+                    yield event
+
+
+def _read_events(path):
+    loads = json.loads
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield loads(line)
+            except ValueError:
+                # torn final write from a crash; everything after it is lost
+                return
+
+
+def _last_seq_in(path, tail_bytes=65536):
+    """Seq of the last complete event, reading only the end of the file."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - tail_bytes))
+        lines = f.read().split(b"\n")
+    if size > tail_bytes:
+        lines = lines[1:]  # first piece is probably a partial line
+    for line in reversed(lines):
+        try:
+            return json.loads(line)["seq"]
+        except ValueError:
+            continue
+    if size > tail_bytes:
+        seqs = [e["seq"] for e in _read_events(path)]
+        return seqs[-1] if seqs else None
+    return None
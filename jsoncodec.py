@@ -0,0 +1,31 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is the default
+    orjson = None
+
+# one shared encoder; json.dumps() with custom separators builds a new one per call
+_encode = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def _dumps_json(obj):
+    return _encode(obj).encode("utf-8")
+
+
+def _dumps_orjson(obj):
+    try:
+        return orjson.dumps(obj)
+    except TypeError:
+        # integers beyond 64 bits and non-str keys; the stdlib handles both
+        return _dumps_json(obj)
+
+
+# JSON_BACKEND=json keeps the stdlib encoder even where orjson is installed
+if orjson is not None and os.environ.get("JSON_BACKEND", "orjson") != "json":
+    BACKEND = "orjson"
+    dumps = _dumps_orjson
+else:
+    BACKEND = "json"
+    dumps = _dumps_json
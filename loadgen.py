@@ -0,0 +1,431 @@
+"""Load generator: simulated players against app.py or routes.py on localhost.
+
+    python loadgen.py --target app [--players 500] [--arrival-rate 50] [--duration 30]
+    python loadgen.py --target api [--players 2000] [--arrival-rate 200] [--duration 30]
+    python loadgen.py --target app --app-server async ...
+    python loadgen.py --target app --url http://127.0.0.1:8080 ...
+
+Players join as a Poisson process (--arrival-rate per second, 0 = all at
+once) and then follow the real flows with exponential think time:
+
+  app  a host starts rounds over the players that have joined; every
+       player polls GET /api/state?since=<version> and POSTs /api/bid on its turn.
+  api  players create auctions now and then (POST /new_task), bid on a
+       recent one (POST /bid) and read it back (GET /results).
+
+Without --url the server runs in this process on a free port. Its locks
+are wrapped with counters, so the report includes how often they were
+contended and how long threads waited, per interval. Against --url only
+client-side numbers are available. The api target needs uvicorn to spawn
+the server.
+
+The report is JSON: totals and p50/p95/p99 latency per route, plus a
+timeline with throughput, latency, errors and lock waits per interval.
+4xx answers that the flow can legitimately get (bid window closed, not
+enough points) count as "rejected"; 5xx and socket failures are errors.
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import app
+
+
+class CountingLock:
+    """Lock/RLock wrapper that counts contended acquisitions and wait time.
+
+    Counters are only written while the lock is held, so they need no lock
+    of their own. Also works as the lock of a threading.Condition.
+    """
+
+    def __init__(self, inner):
+        self._inner = inner
+        self.acquired = 0
+        self.contended = 0
+        self.wait_s = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._inner.acquire(False):
+            self.acquired += 1
+            return True
+        if not blocking:
+            return False
+        t0 = time.perf_counter()
+        ok = self._inner.acquire(True, timeout)
+        if ok:
+            self.acquired += 1
+            self.contended += 1
+            self.wait_s += time.perf_counter() - t0
+        return ok
+
+    def release(self):
+        self._inner.release()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+    # threading.Condition uses these when the lock provides them (RLock does)
+    def _is_owned(self):
+        return self._inner._is_owned()
+
+    def _release_save(self):
+        return self._inner._release_save()
+
+    def _acquire_restore(self, state):
+        self._inner._acquire_restore(state)
+        self.acquired += 1
+
+
+def _lock_totals(locks):
+    return {
+        "acquired": sum(l.acquired for l in locks),
+        "contended": sum(l.contended for l in locks),
+        "wait_s": sum(l.wait_s for l in locks),
+    }
+
+
+class _QuietHandler(app.Handler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_app(handover_s, bid_window_s, server="threaded"):
+    """Serve app.Handler in-process; returns (base url, lock groups, stop)."""
+    cond_lock = CountingLock(threading.RLock())
+    app.TURN._cond = threading.Condition(cond_lock)
+    app.TURN.handover_seconds = handover_s
+    app.TURN.bid_window_seconds = bid_window_s
+    groups = {"TURN": [cond_lock]}
+    if server == "async":
+        return spawn_app_async(groups)
+    srv = app.ThreadedHTTPServer(("127.0.0.1", 0), _QuietHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    def stop():
+        srv.shutdown()
+        srv.server_close()
+    return f"http://127.0.0.1:{srv.server_address[1]}", groups, stop
+
+
+def spawn_app_async(groups):
+    import asyncio
+    import aioserver
+    loop = asyncio.new_event_loop()
+    server = aioserver.AsyncHTTPServer(_QuietHandler, app.TURN, app.STREAM_KEEPALIVE_SECONDS)
+    started = threading.Event()
+    holder = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        holder["srv"] = loop.run_until_complete(server.start("127.0.0.1", 0))
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+
+    def stop():
+        loop.call_soon_threadsafe(holder["srv"].close)
+        server.close()
+    return f"http://127.0.0.1:{holder['srv'].sockets[0].getsockname()[1]}", groups, stop
+
+
+def spawn_api():
+    """Serve routes.app with uvicorn in-process; returns (base url, lock groups, stop)."""
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("--target api without --url needs uvicorn (pip install uvicorn)")
+    import routes
+    routes.LOCK = CountingLock(routes.LOCK)
+    routes.AUCTION_LOCK_STRIPES[:] = [CountingLock(l) for l in routes.AUCTION_LOCK_STRIPES]
+    routes.REGISTRY.lock = CountingLock(routes.REGISTRY.lock)
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(routes.app, host="127.0.0.1", port=port,
+                                           log_level="warning", backlog=2048))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+    groups = {"LOCK": [routes.LOCK], "stripes": routes.AUCTION_LOCK_STRIPES,
+              "REGISTRY.lock": [routes.REGISTRY.lock]}
+    return f"http://127.0.0.1:{port}", groups, stop
+
+
+class Recorder:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.samples = []   # (seconds since start, route, latency_s, outcome)
+
+    def call(self, conn, method, path, body=None, route=None, ok=(200, 201), rejected=(400, 403, 409)):
+        """Send one request on `conn`; returns (status, parsed JSON or None)."""
+        route = route or f"{method} {path.split('?', 1)[0]}"
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        data = json.dumps(body) if body is not None else None
+        t0 = time.perf_counter()
+        status, doc = None, None
+        try:
+            conn.request(method, path, body=data, headers=headers)
+            resp = conn.getresponse()
+            raw = resp.read()
+            status = resp.status
+            if raw:
+                doc = json.loads(raw)
+        except (OSError, http.client.HTTPException, ValueError):
+            conn.close()
+        end = time.perf_counter()
+        if status in ok:
+            outcome = "ok"
+        elif status in rejected:
+            outcome = "rejected"
+        else:
+            outcome = "error"
+        self.samples.append((end - self.t0, route, end - t0, outcome))
+        return status, doc
+
+
+# ---- player flows ----
+def _think(rng, mean_s, stop):
+    stop.wait(rng.expovariate(1 / mean_s) if mean_s > 0 else 0)
+
+
+def app_host(base, rec, joined, round_size, stop):
+    """Start a new round over joined players whenever the last one finished."""
+    u = urlsplit(base)
+    conn = http.client.HTTPConnection(u.hostname, u.port, timeout=30)
+    rng = random.Random(0)
+    rounds = 0
+    while not stop.is_set():
+        _, doc = rec.call(conn, "GET", "/api/state")
+        phase = (doc or {}).get("state", {}).get("phase")
+        players = list(joined)
+        if phase in ("idle", "results") and players:
+            order = rng.sample(players, min(round_size, len(players)))
+            rounds += 1
+            rec.call(conn, "POST", "/api/start_round", {"task": f"load round {rounds}", "order": order})
+        stop.wait(0.05)
+
+
+def app_player(base, rec, name, think_s, stop, seed):
+    u = urlsplit(base)
+    conn = http.client.HTTPConnection(u.hostname, u.port, timeout=30)
+    rng = random.Random(seed)
+    state = {}
+    while not stop.is_set():
+        # like app.js: ask for a delta against the last version seen
+        since = f"?since={state['version']}" if "version" in state else ""
+        _, doc = rec.call(conn, "GET", "/api/state" + since)
+        doc = doc or {}
+        if "delta" in doc and doc["delta"]["since"] == state.get("version"):
+            state = app.merge_state_delta(state, doc["delta"])
+        else:
+            state = doc.get("state") or {}
+        if state.get("active_user") == name and state.get("phase") == "bid":
+            rec.call(conn, "POST", "/api/bid", {"amount": rng.randint(0, 5)})
+        _think(rng, think_s, stop)
+
+
+def api_player(base, rec, name, think_s, stop, seed, auctions, auctions_lock, create_prob, auction_s):
+    u = urlsplit(base)
+    conn = http.client.HTTPConnection(u.hostname, u.port, timeout=30)
+    rng = random.Random(seed)
+    created = 0
+    while not stop.is_set():
+        with auctions_lock:
+            recent = auctions[-50:]
+        if not recent or rng.random() < create_prob:
+            created += 1
+            aid = f"lg-{name}-{created}"
+            status, _ = rec.call(conn, "POST", "/new_task",
+                                 {"auction_id": aid, "task": f"load {aid}", "duration_seconds": auction_s})
+            if status == 201:
+                with auctions_lock:
+                    auctions.append(aid)
+                    del auctions[:-1000]
+            recent = recent + [aid]
+        aid = rng.choice(recent)
+        rec.call(conn, "POST", "/bid?compact=true",
+                 {"auction_id": aid, "user": name, "bid_amount": rng.randint(0, 3)})
+        rec.call(conn, "GET", f"/results?auction_id={aid}&bids_limit=20")
+        _think(rng, think_s, stop)
+
+
+# ---- report ----
+def _percentiles(latencies):
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    if len(latencies) == 1:
+        v = round(latencies[0] * 1000, 2)
+        return {"p50_ms": v, "p95_ms": v, "p99_ms": v}
+    q = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50_ms": round(q[49] * 1000, 2), "p95_ms": round(q[94] * 1000, 2),
+            "p99_ms": round(q[98] * 1000, 2)}
+
+
+def _summary(samples, seconds):
+    n = len(samples)
+    errors = sum(1 for s in samples if s[3] == "error")
+    rejected = sum(1 for s in samples if s[3] == "rejected")
+    out = {"requests": n, "req_per_s": round(n / seconds, 1) if seconds else None,
+           "error_rate": round(errors / n, 4) if n else 0.0,
+           "rejected_rate": round(rejected / n, 4) if n else 0.0}
+    out.update(_percentiles([s[2] for s in samples]))
+    return out
+
+
+def report(rec, lock_ticks, interval, elapsed, players_joined):
+    samples = list(rec.samples)
+    routes = sorted({s[1] for s in samples})
+    timeline = []
+    for i in range(int(elapsed // interval) + 1):
+        lo, hi = i * interval, (i + 1) * interval
+        bucket = [s for s in samples if lo <= s[0] < hi]
+        if not bucket and i * interval >= elapsed:
+            break
+        row = {"t": round(lo, 2), **_summary(bucket, min(interval, elapsed - lo) or interval)}
+        row["players"] = sum(1 for t in players_joined if t < hi)
+        if lock_ticks:
+            row["locks"] = lock_ticks[i] if i < len(lock_ticks) else None
+        timeline.append(row)
+    return {
+        "seconds": round(elapsed, 2),
+        "players": len(players_joined),
+        "total": _summary(samples, elapsed),
+        "routes": {r: _summary([s for s in samples if s[1] == r], elapsed) for r in routes},
+        "timeline": timeline,
+    }
+
+
+def _sample_locks(groups, interval, stop, ticks):
+    """Every `interval`, record per-group lock activity since the last tick."""
+    last = {g: _lock_totals(locks) for g, locks in groups.items()}
+    while not stop.wait(interval):
+        tick = {}
+        for g, locks in groups.items():
+            now = _lock_totals(locks)
+            acquired = now["acquired"] - last[g]["acquired"]
+            contended = now["contended"] - last[g]["contended"]
+            tick[g] = {"acquired": acquired, "contended": contended,
+                       "contended_pct": round(100 * contended / acquired, 2) if acquired else 0.0,
+                       "wait_ms": round((now["wait_s"] - last[g]["wait_s"]) * 1000, 2)}
+            last[g] = now
+        ticks.append(tick)
+
+
+def run(args):
+    groups, stop_server = {}, None
+    if args.url:
+        base = args.url.rstrip("/")
+    elif args.target == "app":
+        base, groups, stop_server = spawn_app(args.handover, args.bid_window, args.app_server)
+    else:
+        base, groups, stop_server = spawn_api()
+
+    rec = Recorder()
+    stop = threading.Event()
+    lock_stop = threading.Event()
+    lock_ticks = []
+    if groups:
+        threading.Thread(target=_sample_locks, args=(groups, args.interval, lock_stop, lock_ticks),
+                         daemon=True).start()
+    threads = []
+    joined, joined_at = [], []
+    auctions, auctions_lock = [], threading.Lock()
+    if args.target == "app":
+        threads.append(threading.Thread(target=app_host, args=(base, rec, joined, args.round_size, stop),
+                                        daemon=True))
+    for t in threads:
+        t.start()
+
+    rng = random.Random(args.seed)
+    deadline = rec.t0 + args.duration
+    players = []
+    for i in range(args.players):
+        if args.arrival_rate > 0:
+            stop.wait(rng.expovariate(args.arrival_rate))
+        if time.perf_counter() >= deadline:
+            break
+        name = f"p{i}"
+        if args.target == "app":
+            target, extra = app_player, ()
+        else:
+            target, extra = api_player, (auctions, auctions_lock, args.create_prob, args.auction_seconds)
+        t = threading.Thread(target=target, args=(base, rec, name, args.think, stop, args.seed + i + 1) + extra,
+                             daemon=True)
+        t.start()
+        players.append(t)
+        joined.append(name)
+        joined_at.append(time.perf_counter() - rec.t0)
+        if args.progress:
+            print(f"{joined_at[-1]:7.2f}s  {len(joined)} players  {len(rec.samples)} requests", file=sys.stderr)
+    stop.wait(max(0.0, deadline - time.perf_counter()))
+    elapsed = time.perf_counter() - rec.t0
+    stop.set()
+    for t in threads + players:
+        t.join(timeout=30)
+    lock_stop.set()
+    if stop_server:
+        stop_server()
+    rec.samples = [s for s in rec.samples if s[0] <= elapsed]
+    out = report(rec, lock_ticks, args.interval, elapsed, joined_at)
+    out["target"] = args.target
+    out["url"] = args.url
+    if groups:
+        totals = {g: _lock_totals(locks) for g, locks in groups.items()}
+        out["locks"] = {g: {"acquired": t["acquired"], "contended": t["contended"],
+                            "wait_ms": round(t["wait_s"] * 1000, 2)} for g, t in totals.items()}
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--target", choices=("app", "api"), default="app")
+    ap.add_argument("--url", help="hit a running server instead of spawning one in-process")
+    ap.add_argument("--players", type=int, default=500)
+    ap.add_argument("--arrival-rate", type=float, default=50.0, help="players joining per second; 0 = all at once")
+    ap.add_argument("--think", type=float, default=0.5, help="mean seconds between a player's actions")
+    ap.add_argument("--duration", type=float, default=30.0)
+    ap.add_argument("--interval", type=float, default=1.0, help="timeline bucket in seconds")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--round-size", type=int, default=20, help="app: players per round")
+    ap.add_argument("--handover", type=float, default=0.2, help="app, spawned: handover seconds per turn")
+    ap.add_argument("--bid-window", type=float, default=1.0, help="app, spawned: bid window seconds per turn")
+    ap.add_argument("--app-server", choices=("threaded", "async"), default="threaded",
+                    help="app, spawned: ThreadedHTTPServer or the asyncio server (TURN_SERVER=async)")
+    ap.add_argument("--create-prob", type=float, default=0.05, help="api: chance an action creates an auction")
+    ap.add_argument("--auction-seconds", type=int, default=5, help="api: duration of created auctions")
+    ap.add_argument("--out", help="also write the JSON report to this file")
+    ap.add_argument("--progress", action="store_true", help="log each arrival to stderr")
+    args = ap.parse_args()
+
+    # app.py prints every turn change; keep that out of the JSON on stdout
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        out = run(args)
+    text = json.dumps(out, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import bisect
+import threading
+import time
+
+# seconds; tuned for in-process work (lock waits, settles) up to slow requests
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metrics:
+    """Counters, histograms and scrape-time gauges in Prometheus text format.
+
+    Recording takes no lock: every thread writes to its own shard, keyed by
+    thread ident, and only render() adds the shards up. Idents are reused
+    once a thread exits, so the thread-per-request servers end up with one
+    shard per concurrently running thread rather than one per request. The
+    only lock is taken the first time a new ident records anything.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._shards = {}    # thread ident -> (counters, histograms)
+        self._lock = threading.Lock()
+        self._meta = {}      # name -> (type, help)
+        self._gauges = {}    # name -> fn() returning a number or {labels: number}
+
+    def _shard(self):
+        ident = threading.get_ident()
+        shard = self._shards.get(ident)
+        if shard is None:
+            with self._lock:
+                shard = self._shards.setdefault(ident, ({}, {}))
+        return shard
+
+    # ---- declaring ----
+    def counter(self, name, help):
+        self._meta[name] = ("counter", help)
+
+    def histogram(self, name, help):
+        self._meta[name] = ("histogram", help)
+
+    def gauge(self, name, help, fn):
+        """`fn` runs at scrape time; it returns a number or {labels: number}."""
+        self._meta[name] = ("gauge", help)
+        self._gauges[name] = fn
+
+    # ---- recording ----
+    def inc(self, name, labels=(), amount=1):
+        """`labels` is a tuple of (label, value) pairs."""
+        counters = self._shard()[0]
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, labels=()):
+        hists = self._shard()[1]
+        key = (name, labels)
+        h = hists.get(key)
+        if h is None:
+            # one slot per bucket, one for +Inf, then the running sum
+            h = hists[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        h[bisect.bisect_left(self.buckets, seconds)] += 1
+        h[-1] += seconds
+
+    def timer(self, name, labels=()):
+        return _Timer(self, name, labels)
+
+    # ---- reading ----
+    def snapshot(self):
+        """Return (counters, histograms) summed over every thread's shard."""
+        counters, hists = {}, {}
+        for c, h in list(self._shards.values()):
+            for key, value in c.copy().items():
+                counters[key] = counters.get(key, 0) + value
+            for key, slots in h.copy().items():
+                slots = list(slots)
+                total = hists.get(key)
+                hists[key] = slots if total is None else [a + b for a, b in zip(total, slots)]
+        return counters, hists
+
+    def render(self):
+        counters, hists = self.snapshot()
+        lines = []
+        for name, (kind, help) in sorted(self._meta.items()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (n, labels), value in sorted(counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{_labels(labels)} {value}")
+            elif kind == "histogram":
+                for (n, labels), slots in sorted(hists.items()):
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for le, count in zip(self.buckets + ("+Inf",), slots):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {slots[-1]}")
+                    lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+            else:
+                value = self._gauges[name]()
+                if isinstance(value, dict):
+                    for labels, v in sorted(value.items()):
+                        lines.append(f"{name}{_labels(labels)} {v}")
+                else:
+                    lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "t0")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics, self.name, self.labels = metrics, name, labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.t0, self.labels)
+
+
+class TimedLock:
+    """threading.Lock that records wait and hold time into `metrics`.
+
+    Uncontended acquires record a zero wait without reading the clock
+    twice. Wrapping a threading.RLock works too: only the outermost acquire
+    and release are recorded, so hold time spans the whole ownership.
+    Stripe and registry locks sit on the bid path, so recording goes
+    straight to this thread's histogram slots rather than through observe().
+    """
+
+    def __init__(self, metrics, name, lock=None):
+        self._lock = lock or threading.Lock()
+        self._metrics = metrics
+        self._wait_key = ("lock_wait_seconds", (("lock", name),))
+        self._hold_key = ("lock_hold_seconds", (("lock", name),))
+        self._held_since = 0.0
+        self._depth = 0          # acquires by the owning thread; >1 only for an RLock
+        metrics.histogram("lock_wait_seconds", "Time spent waiting to acquire a lock.")
+        metrics.histogram("lock_hold_seconds", "Time a lock was held.")
+
+    def _record(self, key, seconds):
+        hists = self._metrics._shard()[1]
+        h = hists.get(key)
+        if h is None:
+            h = hists[key] = [0] * (len(self._metrics.buckets) + 1) + [0.0]
+        if seconds:
+            h[bisect.bisect_left(self._metrics.buckets, seconds)] += 1
+            h[-1] += seconds
+        else:
+            h[0] += 1
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            if self._depth:
+                self._depth += 1
+                return True
+            self._record(self._wait_key, 0.0)
+        elif not blocking:
+            return False
+        else:
+            t0 = time.perf_counter()
+            if not self._lock.acquire(True, timeout):
+                return False
+            self._record(self._wait_key, time.perf_counter() - t0)
+        self._depth = 1
+        self._held_since = time.perf_counter()
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth:
+            self._lock.release()
+            return
+        held = time.perf_counter() - self._held_since
+        self._lock.release()
+        self._record(self._hold_key, held)
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
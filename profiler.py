@@ -0,0 +1,185 @@
+import collections
+import functools
+import inspect
+import os
+import random
+import signal
+import sys
+import threading
+
+
+class SamplingProfiler:
+    """Stack-sampling profiler for a fraction of live requests.
+
+    While enabled, call(route, fn) picks `rate` of requests; the thread
+    serving a picked request is registered under its route, and a sampler
+    thread records that thread's stack every `interval` seconds. Samples
+    are kept as collapsed stacks ("route;frame;frame count" lines), the
+    input format of flamegraph.pl and speedscope. When disabled, call()
+    is one flag check and no sampler thread runs.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.enabled = False
+        self.rate = 0.0
+        self.requests_profiled = 0
+        self._active = {}                     # thread ident -> route of the sampled request
+        self._stacks = collections.Counter()  # (route, frame, ...) -> samples
+        self._lock = threading.Lock()         # _stacks, start/stop
+        self._stop = threading.Event()
+        self._thread = None
+        self._pick = random.Random()          # keeps the global RNG's sequence untouched
+
+    # ---- control ----
+    def start(self, rate=0.1):
+        with self._lock:
+            self.rate = rate
+            if self.enabled:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+            self.enabled = True
+
+    def stop(self):
+        with self._lock:
+            if not self.enabled:
+                return
+            self.enabled = False
+            self._stop.set()
+            thread = self._thread
+        thread.join()
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.requests_profiled = 0
+
+    def status(self):
+        with self._lock:
+            samples = sum(self._stacks.values())
+        return {"enabled": self.enabled, "rate": self.rate,
+                "requests_profiled": self.requests_profiled, "samples": samples}
+
+    # ---- recording ----
+    def _pick_request(self):
+        return self.enabled and self._pick.random() < self.rate
+
+    def call(self, route, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) as one request; sampled with probability `rate`."""
+        if not self._pick_request():
+            return fn(*args, **kwargs)
+        ident = threading.get_ident()
+        self._active[ident] = route
+        self.requests_profiled += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._active.pop(ident, None)
+
+    async def acall(self, route, fn, *args, **kwargs):
+        """Async call(). The event loop thread is sampled, so other coroutines
+        it runs meanwhile are attributed to `route` as well."""
+        if not self._pick_request():
+            return await fn(*args, **kwargs)
+        ident = threading.get_ident()
+        self._active[ident] = route
+        self.requests_profiled += 1
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            self._active.pop(ident, None)
+
+    def wrap(self, fn, route):
+        """Wrap a sync or async endpoint so each call goes through call()/acall()."""
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def profiled_async(*args, **kwargs):
+                return await self.acall(route, fn, *args, **kwargs)
+            return profiled_async
+
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            return self.call(route, fn, *args, **kwargs)
+        return profiled
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Record the current stack of every thread serving a sampled request."""
+        if not self._active:
+            return
+        frames = sys._current_frames()
+        stacks = []
+        for ident, route in list(self._active.items()):
+            frame = frames.get(ident)
+            if frame is not None:
+                stacks.append((route,) + _stack(frame))
+        with self._lock:
+            self._stacks.update(stacks)
+
+    # ---- output ----
+    def collapsed(self):
+        with self._lock:
+            items = sorted(self._stacks.items())
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in items)
+
+    def dump(self, path):
+        """Write the collapsed stacks to `path` (atomically) and return it."""
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        os.replace(tmp, path)
+        return path
+
+
+def _stack(frame):
+    """Frames root-first, starting below the call()/acall() that registered the request."""
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        if code in _ENTRY_CODES:
+            break
+        if code.co_filename == _stack.__code__.co_filename:
+            frame = frame.f_back
+            continue
+        labels.append(f"{os.path.basename(code.co_filename)}:{code.co_name}".replace(";", ":").replace(" ", "_"))
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels)
+
+
+_ENTRY_CODES = (SamplingProfiler.call.__code__, SamplingProfiler.acall.__code__)
+
+
+def default_output():
+    return os.environ.get("PROFILE_OUTPUT") or f"profile-{os.getpid()}.collapsed"
+
+
+def toggle_on_signal(profiler, signum=getattr(signal, "SIGUSR2", None)):
+    """Make `signum` start profiling, or stop it and dump to default_output().
+
+    The rate comes from PROFILE_SAMPLE_RATE (default 0.1). Returns False
+    where the signal does not exist or this is not the main thread.
+    """
+    if signum is None:
+        return False
+
+    def handler(_signum, _frame):
+        if profiler.enabled:
+            # stop() joins the sampler; do it off the signal handler's thread
+            def finish():
+                profiler.stop()
+                profiler.dump(default_output())
+            threading.Thread(target=finish, daemon=True).start()
+        else:
+            profiler.start(float(os.environ.get("PROFILE_SAMPLE_RATE", "0.1")))
+
+    try:
+        signal.signal(signum, handler)
+    except ValueError:
+        return False
+    return True
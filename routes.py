@@ -1,21 +1,64 @@
 # routes.py
-from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, List
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.routing import APIRoute
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, ValidationError
+from typing import Optional, Dict, List, Tuple, Union
 from enum import Enum
+import collections
+import contextlib
+import json
+import os
 import threading
 import time
 
-from app import UserRegistry, TaskQueue, Auction, Auction_State
+from admission import Admission
+from app import (UserRegistry, Task, TaskQueue, Auction, Auction_State, TimerService, etag_matches,
+                 settle_many, admin_allowed)
+from archive import AuctionArchive
+from journal import Journal
+from sqlstore import AuctionExists, SQLiteStore
+import metrics
+import profiler
 
-app = FastAPI(title="Task Auction API", version="1.1.3")
+@contextlib.asynccontextmanager
+async def _lifespan(_app):
+    start_background_work()
+    yield
+
+app = FastAPI(title="Task Auction API", version="1.1.3", lifespan=_lifespan)
 
 # ---- In-memory state ----
-LOCK = threading.Lock()
+# Lock ordering (always acquire left to right, never the reverse):
+#   auction stripe (_auction_lock) -> LOCK -> REGISTRY.lock -> User.lock
+# LOCK only guards the AUCTIONS / AUCTION_PARTICIPANTS tables and QUEUE, and is
+# held for lookups/inserts. Everything that touches one auction's bids or status
+# runs under that auction's stripe, so unrelated auctions proceed in parallel.
+# User.lock is innermost and is never held while acquiring another lock.
+# Code that needs several stripes at once takes them in ascending stripe index.
+# Routes reach all of this through STORE (see "state store" below); with
+# AUCTION_DB set, state lives in a SQLite file shared by worker processes.
+METRICS = metrics.Metrics()
+LOCK = metrics.TimedLock(METRICS, "LOCK")
+# all stripes report under one label: 256 series would bury the signal
+AUCTION_LOCK_STRIPES = [metrics.TimedLock(METRICS, "auction_stripe") for _ in range(256)]
 REGISTRY = UserRegistry(starting_points=10)          # tests assume 10
+REGISTRY.lock = metrics.TimedLock(METRICS, "REGISTRY", REGISTRY.lock)
 QUEUE = TaskQueue()
 AUCTIONS: Dict[str, Auction] = {}                    # auction_id -> Auction
 AUCTION_PARTICIPANTS: Dict[str, List[str]] = {}      # optional allowlist per auction
+TIMERS = TimerService()                              # opens/settles auctions on time
+JOURNAL: Optional[Journal] = None                    # set by recover_state() when persisting
+_LOGGED = threading.local()                           # .seq: last event this thread journaled
+COLUMNAR_BIDS = os.environ.get("AUCTION_COLUMNAR_BIDS") == "1"  # array-backed bid storage
+SNAPSHOT_INTERVAL_SECONDS = 60
+ARCHIVE_AFTER_SECONDS = float(os.environ.get("AUCTION_ARCHIVE_AFTER_SECONDS", "3600"))  # closed this long -> disk
+ARCHIVE_SWEEP_SECONDS = 60
+PROFILER = profiler.SamplingProfiler()               # off until /admin/profile or SIGUSR2
+ADMISSION = Admission.from_env(METRICS)              # bid rate limits and in-flight cap
+_EXPIRED: List[str] = []                             # auctions waiting for the next batch settle
+_EXPIRED_LOCK = threading.Lock()
 
 # ---- Schemas ----
 class NewTaskIn(BaseModel):
@@ -23,6 +66,7 @@ class NewTaskIn(BaseModel):
     task: str = Field(min_length=1)
     duration_seconds: int = Field(ge=1, description="Auction open window in seconds")
     participants: Optional[List[str]] = Field(default=None)
+    start_in_seconds: int = Field(default=0, ge=0, description="Delay before bidding opens")
 
 class BidIn(BaseModel):
     auction_id: str
@@ -44,11 +88,53 @@ class AuctionOut(BaseModel):
     auction_id: str
     task: str
     status: AuctionStatus
+    starts_at_time: float
     ends_at_time: float                               # <<< tests expect ends_at_time
     seconds_remaining: int                            # <<< tests expect seconds_remaining
     bids: List[BidOut]                                # tests treat bids as a list
     assigned_user: Optional[str] = None
     participants: Optional[List[str]] = None
+    bid_count: int = 0
+    lowest_bid: Optional[int] = None
+    next_bids_cursor: Optional[str] = None            # set when bids were truncated
+
+class BidAck(BaseModel):
+    auction_id: str
+    user: str
+    bid_amount: int
+    timestamp_ms: int
+    rank: int                                         # 1-based, lowest bid first
+    bid_count: int
+
+class BatchBidIn(BaseModel):
+    bids: List[BidIn]
+
+class BidStatus(BaseModel):
+    index: int                                        # position in BatchBidIn.bids
+    status: int                                       # HTTP status /bid would have returned
+    error: Optional[str] = None
+
+class BatchBidOut(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[BidStatus]
+
+class TaskIn(BaseModel):
+    id: Optional[int] = None                          # assigned when omitted
+    name: str = Field(min_length=1)
+    description: str = ""
+    deadline: Optional[str] = None
+    priority: int = 0
+
+class ImportIn(BaseModel):
+    users: List[str] = Field(default_factory=list)
+    tasks: List[TaskIn] = Field(default_factory=list)
+    auctions: List[NewTaskIn] = Field(default_factory=list)
+
+class ImportOut(BaseModel):
+    users_created: int
+    tasks_queued: int
+    auctions_created: int
 
 class LeaderboardRow(BaseModel):
     name: str
@@ -57,6 +143,262 @@ class LeaderboardRow(BaseModel):
 
 class LeaderboardOut(BaseModel):
     leaderboard: List[LeaderboardRow]
+    total: int
+    offset: int = 0
+
+class RankOut(BaseModel):
+    name: str
+    rank: int                                         # 1-based
+    points: int
+    tasks_assigned: int
+    total: int
+
+class LostAuction(BaseModel):
+    auction_id: str
+    task: str
+    bid_amount: int
+    assigned_user: str
+    ends_at_time: float
+
+class HistoryOut(BaseModel):
+    name: str
+    points: int
+    points_spent: int                                 # lifetime debits for lost auctions
+    auctions_lost_total: int
+    auctions_lost: List[LostAuction]                  # most recent first, paged
+
+class ProfileIn(BaseModel):
+    enabled: Optional[bool] = None                    # omitted: leave running state alone
+    rate: float = Field(default=0.1, gt=0, le=1)      # fraction of requests sampled
+    reset: bool = False                               # drop stacks collected so far
+
+class ProfileOut(BaseModel):
+    enabled: bool
+    rate: float
+    requests_profiled: int
+    samples: int
+    output: Optional[str] = None                      # file written when profiling stopped
+
+# ---- metrics and profiling ----
+def _auction_counts() -> Dict[tuple, int]:
+    counts = {s: 0 for s in Auction_State}
+    counts.update(STORE.status_counts())
+    return {(("status", s.name),): n for s, n in counts.items()}
+
+METRICS.counter("http_requests_total", "Requests handled, by route and status.")
+METRICS.histogram("http_request_duration_seconds", "Time spent handling a request, by route.")
+METRICS.histogram("response_model_seconds", "Time spent building response models (not encoding them), by model.")
+METRICS.histogram("settle_duration_seconds", "Time spent settling auctions, single or batch.")
+METRICS.counter("closed_results_cache_total", "/results lookups of closed auctions, by cache result.")
+METRICS.counter("archive_cache_total", "Archived auction lookups, by whether the LRU had it.")
+METRICS.counter("auctions_archived_total", "Closed auctions moved to the archive.")
+METRICS.gauge("auctions", "Auctions by status.", _auction_counts)
+METRICS.gauge("bids", "Bids held across all auctions.", lambda: STORE.bid_count())
+METRICS.gauge("users", "Registered users.", lambda: STORE.user_count())
+
+class MetricsMiddleware:
+    """Plain ASGI middleware: counts and times each request by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = scope.get("route")
+            if route is not None:
+                label = f"{scope['method']} {route.path}"
+            elif scope["path"] in AdmissionMiddleware.PATHS:
+                label = f"{scope['method']} {scope['path']}"     # shed before routing
+            else:
+                label = f"{scope['method']} other"
+            METRICS.inc("http_requests_total", (("route", label), ("status", str(status[0]))))
+            METRICS.observe("http_request_duration_seconds", time.perf_counter() - t0, (("route", label),))
+
+class AdmissionMiddleware:
+    """Per-IP rate limit and in-flight cap for the bid routes.
+
+    Runs on the event loop, so a shed bid is answered before it waits for
+    a threadpool thread, a stripe or LOCK. The per-user limit needs the
+    parsed body and is checked in the handlers.
+    """
+
+    PATHS = {"/bid", "/bids/batch"}
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.PATHS:
+            await self.app(scope, receive, send)
+            return
+        route = f"POST {scope['path']}"
+        client = scope.get("client")
+        shed = ADMISSION.check_ip(route, client[0] if client else "")
+        if shed is None:
+            shed = ADMISSION.enter(route)
+        if shed is None:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                ADMISSION.leave()
+            return
+        body = json.dumps({"detail": shed.message}).encode("utf-8")
+        await send({"type": "http.response.start", "status": shed.status, "headers": [
+            (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(shed.retry_after).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+# added last so it is outermost and sheds are counted too
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+class ProfiledRoute(APIRoute):
+    """Runs each endpoint through PROFILER, on the thread that executes it."""
+
+    def __init__(self, path: str, endpoint, *, methods=None, **kwargs):
+        label = f"{','.join(sorted(methods or ()))} {path}"
+        super().__init__(path, PROFILER.wrap(endpoint, label), methods=methods, **kwargs)
+
+app.router.route_class = ProfiledRoute
+profiler.toggle_on_signal(PROFILER)
+
+def _require_admin(token: Optional[str]) -> None:
+    if not admin_allowed(token):
+        raise HTTPException(403, "Admin token required")
+
+# ---- state store ----
+class _LocalView:
+    """What a LocalStore transaction sees: the live objects, or read-only ones from ARCHIVE."""
+
+    registry = property(lambda self: REGISTRY)
+
+    def __init__(self):
+        self._archived: Dict[str, Tuple[Auction, Optional[List[str]]]] = {}
+
+    def auction(self, auction_id: str) -> Optional[Auction]:
+        with LOCK:
+            auc = AUCTIONS.get(auction_id)
+        if auc is None and ARCHIVE is not None:
+            entry = ARCHIVE.get(auction_id)
+            if entry is not None:
+                self._archived[auction_id] = entry
+                auc = entry[0]
+        return auc
+
+    def participants(self, auction_id: str) -> Optional[List[str]]:
+        if auction_id in self._archived:
+            return self._archived[auction_id][1]
+        return AUCTION_PARTICIPANTS.get(auction_id)
+
+class LocalStore:
+    """The default store: AUCTIONS, AUCTION_PARTICIPANTS and REGISTRY in this process.
+
+    read() and write() both hold the auctions' stripe locks, taken in
+    ascending order, and hand out the live Auction objects. SQLiteStore
+    (sqlstore.py) offers the same methods over a database file that several
+    worker processes share.
+    """
+
+    @contextlib.contextmanager
+    def read(self, auction_id: str):
+        with _auction_lock(auction_id):
+            yield _LocalView()
+
+    @contextlib.contextmanager
+    def write(self, auction_ids: List[str]):
+        with _auction_locks(auction_ids):
+            yield _LocalView()
+
+    def create(self, entries: List[Tuple[str, Auction, Optional[List[str]]]]) -> None:
+        ids = [aid for aid, _, _ in entries]
+        if len(set(ids)) != len(ids):
+            raise AuctionExists()
+        # archive_closed() moves an id under its stripe, so holding the stripes
+        # an id is either still in AUCTIONS or already on disk; the disk is
+        # checked before LOCK is taken
+        with _auction_locks(ids):
+            if self._archived(ids):
+                raise AuctionExists()
+            with LOCK:
+                if any(aid in AUCTIONS for aid in ids):
+                    raise AuctionExists()
+                for aid, auc, allow in entries:
+                    AUCTIONS[aid] = auc
+                    if allow is not None:
+                        AUCTION_PARTICIPANTS[aid] = allow
+                    _log({"type": "auction", "auction_id": aid, "task": auc.task,
+                          "starts_at_time": auc.starts_at_time, "ends_at_time": auc.ends_at_time,
+                          "participants": allow})
+
+    def exists(self, auction_ids: List[str]) -> bool:
+        with LOCK:
+            if any(aid in AUCTIONS for aid in auction_ids):
+                return True
+        return self._archived(auction_ids)
+
+    @staticmethod
+    def _archived(auction_ids: List[str]) -> bool:
+        return ARCHIVE is not None and any(aid in ARCHIVE for aid in auction_ids)
+
+    def due(self, now: float) -> List[str]:
+        with LOCK:
+            auctions = list(AUCTIONS.items())
+        return [aid for aid, a in auctions
+                if (a.status == Auction_State.OPEN and a.ends_at_time <= now)
+                or (a.status == Auction_State.SCHEDULED and a.starts_at_time <= now)]
+
+    def ensure_users(self, names: List[str]) -> int:
+        with REGISTRY.lock:
+            created = REGISTRY.create_users(names)
+            _log({"type": "users", "names": list(names)})
+            return created
+
+    def leaderboard_page(self, offset: int = 0, limit: Optional[int] = None):
+        with REGISTRY.lock:
+            board = REGISTRY.leaderboard()
+            return board.page(offset, limit), len(board)
+
+    def leaderboard_rank(self, name: str):
+        with REGISTRY.lock:
+            board = REGISTRY.leaderboard()
+            rank = board.rank(name)
+            if rank is None:
+                return None
+            return rank, board.page(rank - 1, 1)[0], len(board)
+
+    def status_counts(self) -> Dict[Auction_State, int]:
+        with LOCK:
+            auctions = list(AUCTIONS.values())
+        return collections.Counter(a.status for a in auctions)
+
+    def bid_count(self) -> int:
+        with LOCK:
+            auctions = list(AUCTIONS.values())
+        return sum(len(a.bids) for a in auctions)
+
+    def user_count(self) -> int:
+        return len(REGISTRY.users)
+
+ARCHIVE = (AuctionArchive(os.environ["AUCTION_ARCHIVE_DIR"], metrics=METRICS)
+           if os.environ.get("AUCTION_ARCHIVE_DIR") else None)
+SWEEP_INTERVAL_SECONDS = 1.0                         # how often a shared store is checked for due auctions
+if os.environ.get("AUCTION_DB"):
+    STORE = SQLiteStore(os.environ["AUCTION_DB"], REGISTRY.starting_points)
+else:
+    STORE = LocalStore()
 
 # ---- helpers ----
 def _to_status(a: Auction) -> AuctionStatus:
@@ -68,99 +410,630 @@ def _seconds_remaining(a: Auction) -> int:
     except Exception:
         return max(0, int(a.ends_at_time - time.time()))
 
-def _auto_settle_if_ended(a: Auction) -> None:
+def _log(event: dict) -> None:
+    # call while still holding the lock that covered the mutation, so a
+    # checkpoint never sees state and log disagree
+    if JOURNAL is not None:
+        _LOGGED.seq = JOURNAL.append(event)
+
+def _wait_durable() -> None:
+    """Block until every event this thread has journaled is on disk.
+
+    Call after the locks are released and before answering, so a client
+    is never told about a change a crash could still lose; requests
+    waiting at the same time share one fsync (group commit).
+    """
+    seq = getattr(_LOGGED, "seq", 0)
+    if seq and JOURNAL is not None:
+        JOURNAL.wait_durable(seq)
+    _LOGGED.seq = 0
+
+def _transition_due(a: Auction) -> bool:
+    now = time.time()
+    return ((a.status == Auction_State.SCHEDULED and now >= a.starts_at_time)
+            or (a.status == Auction_State.OPEN and now >= a.ends_at_time))
+
+def _auto_settle_if_ended(auction_id: str, a: Auction, registry: UserRegistry) -> None:
+    # TIMERS normally gets there first; this covers reads racing the timer
+    if a.status == Auction_State.SCHEDULED and time.time() >= a.starts_at_time:
+        a.open_now()
     # use logical and, not bitwise &, and only when OPEN
     if a.status == Auction_State.OPEN and time.time() >= a.ends_at_time:
-        a.settle_now(REGISTRY)
+        with METRICS.timer("settle_duration_seconds", (("mode", "single"),)):
+            a.settle_now(registry)
+        _log({"type": "settle", "auction_id": auction_id, "assigned": a.assigned_user})
+
+def _auction_lock(auction_id: str) -> threading.Lock:
+    return AUCTION_LOCK_STRIPES[hash(auction_id) % len(AUCTION_LOCK_STRIPES)]
+
+def _auction_locks(auction_ids: List[str]) -> contextlib.ExitStack:
+    """The stripes of `auction_ids`, taken in ascending order."""
+    stack = contextlib.ExitStack()
+    n = len(AUCTION_LOCK_STRIPES)
+    for i in sorted({hash(aid) % n for aid in auction_ids}):
+        stack.enter_context(AUCTION_LOCK_STRIPES[i])
+    return stack
+
+@contextlib.contextmanager
+def _current(auction_id: str):
+    """(view, auction) for reading, with any due start or settle applied first; 404 if unknown."""
+    with STORE.read(auction_id) as view:
+        auc = view.auction(auction_id)
+        if auc is None:
+            raise HTTPException(404, "Auction not found")
+        if not _transition_due(auc):
+            yield view, auc
+            return
+    with STORE.write([auction_id]) as view:
+        auc = view.auction(auction_id)
+        _auto_settle_if_ended(auction_id, auc, view.registry)
+        yield view, auc
 
-def _auction_to_out(auction_id: str, a: Auction) -> AuctionOut:
-    # sort bids: lowest amount first, then earliest timestamp
-    bids_sorted = sorted(a.bids.values(), key=lambda b: (b.bid_amount, b.timestamp_ms))
+def _on_auction_timer(auction_id: str) -> None:
+    with STORE.write([auction_id]) as view:
+        auc = view.auction(auction_id)
+        if auc:
+            _auto_settle_if_ended(auction_id, auc, view.registry)
+
+def _on_auction_expired(auction_id: str) -> None:
+    # queue for one batch settle per timer pass instead of settling right here
+    with _EXPIRED_LOCK:
+        first = not _EXPIRED
+        _EXPIRED.append(auction_id)
+    if first:
+        TIMERS.schedule(0, _settle_expired_queue)
+
+def _settle_expired_queue() -> None:
+    with _EXPIRED_LOCK:
+        ids = _EXPIRED[:]
+        del _EXPIRED[:]
+    settle_expired(ids)
+
+def settle_expired(auction_ids: List[str]) -> int:
+    """Settle every auction in `auction_ids` whose window is over, as one batch.
+
+    One STORE.write() covers them all (in process, the stripes involved in
+    ascending order), so the outcome is what _on_auction_timer on each id
+    would give. Returns how many were settled.
+    """
+    with STORE.write(auction_ids) as view:
+        now = time.time()
+        due = []
+        for aid in dict.fromkeys(auction_ids):
+            auc = view.auction(aid)
+            if auc is None:
+                continue
+            if auc.status == Auction_State.SCHEDULED and now >= auc.starts_at_time:
+                auc.open_now()
+            if auc.status == Auction_State.OPEN and now >= auc.ends_at_time:
+                due.append((aid, auc))
+        with METRICS.timer("settle_duration_seconds", (("mode", "batch"),)):
+            settle_many([auc for _, auc in due], view.registry)
+        for aid, auc in due:
+            _log({"type": "settle", "auction_id": aid, "assigned": auc.assigned_user})
+    return len(due)
+
+def _sweep_due_auctions() -> None:
+    # a shared store has auctions created by other workers, which this
+    # process's TIMERS never heard of
+    settle_expired(STORE.due(time.time()))
+    TIMERS.schedule(time.time() + SWEEP_INTERVAL_SECONDS, _sweep_due_auctions)
+
+def archive_closed(now: Optional[float] = None) -> int:
+    """Move auctions CLOSED for ARCHIVE_AFTER_SECONDS from AUCTIONS to ARCHIVE.
+
+    Each is written out under its stripe before it leaves AUCTIONS, so a
+    /results racing the move finds it in one place or the other. Returns
+    how many were moved.
+    """
+    cutoff = (time.time() if now is None else now) - ARCHIVE_AFTER_SECONDS
+    with LOCK:
+        old = [aid for aid, a in AUCTIONS.items()
+               if a.status == Auction_State.CLOSED and a.ends_at_time <= cutoff]
+    moved = 0
+    for aid in old:
+        with _auction_lock(aid):
+            with LOCK:
+                auc = AUCTIONS.get(aid)
+            if auc is None:
+                continue
+            ARCHIVE.put(aid, auc, AUCTION_PARTICIPANTS.get(aid))
+            with LOCK:
+                del AUCTIONS[aid]
+                AUCTION_PARTICIPANTS.pop(aid, None)
+                _log({"type": "archive", "auction_id": aid})
+            moved += 1
+    METRICS.inc("auctions_archived_total", amount=moved)
+    return moved
+
+def _archive_periodically() -> None:
+    archive_closed()
+    TIMERS.schedule(time.time() + ARCHIVE_SWEEP_SECONDS, _archive_periodically)
+
+def _bid_cursor(b) -> str:
+    return f"{b.bid_amount}:{b.timestamp_ms}:{b.user}"
+
+def _parse_bid_cursor(cursor: str) -> Tuple[int, int, str]:
+    try:
+        amount, ts, name = cursor.split(":", 2)
+        return int(amount), int(ts), name
+    except ValueError:
+        raise HTTPException(400, "Invalid bids cursor")
+
+def _auction_to_out(auction_id: str, a: Auction, bids_limit: Optional[int] = None,
+                    bids_after: Optional[Tuple[int, int, str]] = None,
+                    participants: Optional[List[str]] = None) -> AuctionOut:
+    with METRICS.timer("response_model_seconds", (("model", "AuctionOut"),)):
+        return _build_auction_out(auction_id, a, bids_limit, bids_after, participants)
+
+def _build_auction_out(auction_id: str, a: Auction, bids_limit: Optional[int],
+                       bids_after: Optional[Tuple[int, int, str]],
+                       participants: Optional[List[str]]) -> AuctionOut:
+    # lowest amount first, then earliest timestamp (kept sorted by Auction)
+    bids_sorted = a.sorted_bids(limit=bids_limit, after=bids_after)
+    lowest = a.sorted_bids(limit=1)
+    next_cursor = None
+    if bids_limit is not None and len(bids_sorted) == bids_limit and bids_sorted:
+        if a.bid_rank(bids_sorted[-1].user) < len(a.bids):
+            next_cursor = _bid_cursor(bids_sorted[-1])
     return AuctionOut(
         auction_id=auction_id,
         task=a.task,
         status=_to_status(a),
+        starts_at_time=a.starts_at_time,
         ends_at_time=a.ends_at_time,                 # <<< correct key
         seconds_remaining=_seconds_remaining(a),     # <<< correct key
         bids=[BidOut(user=b.user, bid_amount=b.bid_amount, timestamp_ms=b.timestamp_ms) for b in bids_sorted],
         assigned_user=a.assigned_user,
-        participants=AUCTION_PARTICIPANTS.get(auction_id),
+        participants=participants,
+        bid_count=len(a.bids),
+        lowest_bid=lowest[0].bid_amount if lowest else None,
+        next_bids_cursor=next_cursor,
     )
 
-def _ensure_auction_open(a: Auction):
-    _auto_settle_if_ended(a)
+def _auction_etag(a: Auction) -> str:
+    # seconds_remaining is part of the body, so it is part of the tag too
+    return f'"{a.version}-{_seconds_remaining(a)}"'
+
+class _ClosedBodies:
+    """Encoded /results bodies of CLOSED auctions, which never change again.
+
+    Keyed by auction id and paging. An entry is only reused for the same
+    Auction object at the same version, so an id that is reused after a
+    reset never gets another auction's bytes. Past `max_entries` the least
+    recently used entry is dropped.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "collections.OrderedDict[tuple, Tuple[Auction, int, bytes]]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, a: Auction) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not a or entry[1] != a.version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, key: tuple, a: Auction, body: bytes):
+        with self._lock:
+            self._entries[key] = (a, a.version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+CLOSED_BODIES = _ClosedBodies()
+
+def _closed_auction_body(auction_id: str, a: Auction, bids_limit: Optional[int],
+                         bids_after: Optional[Tuple[int, int, str]],
+                         participants: Optional[List[str]]) -> bytes:
+    """/results body of a CLOSED auction, encoded on the first request only."""
+    key = (auction_id, bids_limit, bids_after)
+    body = CLOSED_BODIES.get(key, a)
+    if body is not None:
+        METRICS.inc("closed_results_cache_total", (("result", "hit"),))
+        return body
+    METRICS.inc("closed_results_cache_total", (("result", "miss"),))
+    body = _auction_to_out(auction_id, a, bids_limit, bids_after, participants).model_dump_json().encode("utf-8")
+    CLOSED_BODIES.put(key, a, body)
+    return body
+
+def _ensure_auction_open(auction_id: str, a: Auction, registry: UserRegistry):
+    _auto_settle_if_ended(auction_id, a, registry)
     if a.status != Auction_State.OPEN:
         raise HTTPException(status_code=400, detail="Auction is not open.")
 
+def _clean_participants(names: Optional[List[str]]) -> Optional[List[str]]:
+    if names is None:
+        return None
+    return [name.strip() for name in names if name and name.strip()]
+
+def _build_auction(pl: NewTaskIn) -> Auction:
+    starts_at = time.time() + pl.start_in_seconds if pl.start_in_seconds else None
+    return Auction(task=pl.task, duration_seconds=pl.duration_seconds, starts_at_time=starts_at,
+                   columnar=COLUMNAR_BIDS)
+
+def _publish_auctions(entries: List[Tuple[str, Auction, Optional[List[str]]]]) -> None:
+    """Register (auction_id, auction, allowlist) entries all-or-nothing."""
+    try:
+        STORE.create(entries)
+    except AuctionExists:
+        raise HTTPException(status_code=409, detail="Auction already exists")
+    for aid, auc, _ in entries:
+        if auc.status == Auction_State.SCHEDULED:
+            TIMERS.schedule(auc.starts_at_time, _on_auction_timer, aid)
+        TIMERS.schedule(auc.ends_at_time, _on_auction_expired, aid)
+
+def _check_task_ids(tasks: List["TaskIn"], queued: set) -> None:
+    """400 if an explicit task id repeats within the import or is already queued."""
+    seen = set(queued)
+    for t in tasks:
+        if t.id is None:
+            continue
+        if t.id in seen:
+            raise HTTPException(400, f"Duplicate task id {t.id}")
+        seen.add(t.id)
+
+def _number_tasks(tasks: List["TaskIn"], queued: set) -> List[Task]:
+    """Tasks for an import, ids for those without one counting up from the highest in use."""
+    next_id = max([t.id for t in tasks if t.id is not None] + list(queued), default=0) + 1
+    out = []
+    for t in tasks:
+        if t.id is None:
+            tid, next_id = next_id, next_id + 1
+        else:
+            tid = t.id
+        out.append(Task(tid, t.name, t.description, t.deadline, t.priority, None))
+    return out
+
+def import_bundle(bundle: "ImportIn") -> "ImportOut":
+    """Bulk-load users, queued tasks and auctions.
+
+    Everything is checked before anything is written: blank user names and
+    duplicate task ids are a 400, any auction clash a 409. Auctions are then
+    registered all-or-nothing, users created in one registry pass, and tasks
+    join QUEUE with a single heapify.
+    """
+    if any(not (name or "").strip() for name in bundle.users):
+        raise HTTPException(400, "User names must not be blank")
+    auction_ids = [a.auction_id for a in bundle.auctions]
+    if len(set(auction_ids)) != len(auction_ids) or STORE.exists(auction_ids):
+        raise HTTPException(status_code=409, detail="Auction already exists")
+    with LOCK:
+        _check_task_ids(bundle.tasks, {t.id for t in QUEUE.tasks()})
+
+    entries = [(a.auction_id, _build_auction(a), _clean_participants(a.participants)) for a in bundle.auctions]
+    _publish_auctions(entries)
+
+    names = [name.strip() for name in bundle.users]
+    for _, _, allow in entries:
+        names.extend(allow or ())
+    users_created = STORE.ensure_users(names)
+
+    with LOCK:
+        tasks = _number_tasks(bundle.tasks, {t.id for t in QUEUE.tasks()})
+        QUEUE.add_tasks(tasks)
+        _log({"type": "tasks", "tasks": [_task_row(t) for t in tasks]})
+    _wait_durable()
+    return ImportOut(users_created=users_created, tasks_queued=len(tasks), auctions_created=len(entries))
+
+def parse_import_ndjson(text: str) -> "ImportIn":
+    """One JSON object per line, tagged with "type": user | task | auction."""
+    users: List[str] = []
+    tasks: List[TaskIn] = []
+    auctions: List[NewTaskIn] = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            rec = json.loads(line)
+            if not isinstance(rec, dict):
+                raise ValueError(f"expected a JSON object, got {type(rec).__name__}")
+            kind = rec.pop("type")
+            if kind == "user":
+                if not isinstance(rec["name"], str):
+                    raise ValueError("user name must be a string")
+                users.append(rec["name"])
+            elif kind == "task":
+                tasks.append(TaskIn(**rec))
+            elif kind == "auction":
+                auctions.append(NewTaskIn(**rec))
+            else:
+                raise ValueError(f"unknown type {kind!r}")
+        except (ValueError, KeyError, TypeError, ValidationError) as e:
+            raise HTTPException(400, f"line {lineno}: {e}")
+    return ImportIn(users=users, tasks=tasks, auctions=auctions)
+
+# ---- persistence ----
+def _task_row(t: Task) -> list:
+    return [t.id, t.name, t.description, t.deadline, t.priority]
+
+@contextlib.contextmanager
+def _all_locks():
+    """Stop the world in lock order: every stripe, LOCK, then REGISTRY.lock."""
+    with contextlib.ExitStack() as stack:
+        for stripe in AUCTION_LOCK_STRIPES:
+            stack.enter_context(stripe)
+        stack.enter_context(LOCK)
+        stack.enter_context(REGISTRY.lock)
+        yield
+
+def checkpoint() -> None:
+    """Snapshot all state at the current journal position, then prune the log."""
+    with _all_locks():
+        seq = JOURNAL.last_seq
+        snapshot = {
+            "users": REGISTRY.to_snapshot(),
+            "auctions": {aid: a.to_snapshot() for aid, a in AUCTIONS.items()},
+            "participants": dict(AUCTION_PARTICIPANTS),
+            "queue": [_task_row(t) for t in QUEUE.tasks()],
+        }
+    JOURNAL.write_snapshot(seq, snapshot)
+
+def _checkpoint_periodically() -> None:
+    checkpoint()
+    TIMERS.schedule(time.time() + SNAPSHOT_INTERVAL_SECONDS, _checkpoint_periodically)
+
+def _replay(event: dict) -> None:
+    kind = event["type"]
+    if kind == "bid":
+        AUCTIONS[event["auction_id"]].restore_bid(event["user"], event["amount"], event["ts"], REGISTRY)
+    elif kind == "settle":
+        AUCTIONS[event["auction_id"]].apply_settlement(REGISTRY, event["assigned"])
+    elif kind == "auction":
+        auc = Auction(event["task"], 1, starts_at_time=event["starts_at_time"], columnar=COLUMNAR_BIDS)
+        auc.ends_at_time = event["ends_at_time"]
+        AUCTIONS[event["auction_id"]] = auc
+        if event["participants"] is not None:
+            AUCTION_PARTICIPANTS[event["auction_id"]] = event["participants"]
+            REGISTRY.create_users(event["participants"])
+    elif kind == "archive":
+        AUCTIONS.pop(event["auction_id"], None)
+        AUCTION_PARTICIPANTS.pop(event["auction_id"], None)
+    elif kind == "users":
+        REGISTRY.create_users(event["names"])
+    elif kind == "tasks":
+        QUEUE.add_tasks(Task(*row, None) for row in event["tasks"])
+
+def recover_state(journal: Journal) -> int:
+    """Rebuild module state from `journal`'s snapshot and tail, then log to it.
+
+    Returns the number of tail events replayed. Timers are re-armed for every
+    auction still open or scheduled, so ones that expired while the process
+    was down settle right away.
+    """
+    global JOURNAL
+    snapshot, events = journal.recover()
+    replayed = 0
+    with _all_locks():
+        AUCTIONS.clear()
+        AUCTION_PARTICIPANTS.clear()
+        CLOSED_BODIES.clear()
+        QUEUE.clear()
+        REGISTRY.clear()
+        if snapshot:
+            REGISTRY.restore_snapshot(snapshot["users"])
+            AUCTIONS.update((aid, Auction.from_snapshot(a)) for aid, a in snapshot["auctions"].items())
+            AUCTION_PARTICIPANTS.update(snapshot["participants"])
+            QUEUE.add_tasks(Task(*row, None) for row in snapshot["queue"])
+        with REGISTRY.deferred_ranking():
+            for event in events:
+                _replay(event)
+                replayed += 1
+        JOURNAL = journal
+    for aid, auc in AUCTIONS.items():
+        if auc.status == Auction_State.SCHEDULED:
+            TIMERS.schedule(auc.starts_at_time, _on_auction_timer, aid)
+        if auc.status != Auction_State.CLOSED:
+            TIMERS.schedule(auc.ends_at_time, _on_auction_expired, aid)
+    return replayed
+
 # ---- ROUTES ----
 @app.post("/new_task", response_model=AuctionOut, status_code=201)
 def new_task(pl: NewTaskIn):
     """Create an auction round for a task."""
-    with LOCK:
-        if pl.auction_id in AUCTIONS:
-            raise HTTPException(status_code=409, detail="Auction already exists")
-        auc = Auction(task=pl.task, duration_seconds=pl.duration_seconds)
-        AUCTIONS[pl.auction_id] = auc
-
-        # optional allowlist
-        if pl.participants is not None:
-            cleaned = []
-            for name in pl.participants:
-                if not name or not name.strip():
-                    continue
-                n = name.strip()
-                REGISTRY.ensure_user(n)  # create if missing
-                cleaned.append(n)
-            AUCTION_PARTICIPANTS[pl.auction_id] = cleaned
-
-        return _auction_to_out(pl.auction_id, auc)
-
-@app.post("/bid", response_model=AuctionOut)
-def bid(pl: BidIn):
+    if STORE.exists([pl.auction_id]):
+        raise HTTPException(status_code=409, detail="Auction already exists")
+    auc = _build_auction(pl)
+
+    # optional allowlist; its users are created only once the auction is,
+    # so a 409 from a racing create leaves nothing behind
+    cleaned = _clean_participants(pl.participants)
+    _publish_auctions([(pl.auction_id, auc, cleaned)])
+    if cleaned:
+        STORE.ensure_users(cleaned)  # create if missing
+    _wait_durable()
+    return _auction_to_out(pl.auction_id, auc, participants=cleaned)
+
+def _place_bid_locked(view, auction_id: str, auc: Auction, user: str, bid_amount: int) -> str:
+    """Validate and place one bid on an auction from a STORE.write() view."""
+    _ensure_auction_open(auction_id, auc, view.registry)
+
+    user = (user or "").strip()
+    if not user:
+        raise HTTPException(400, "User name is required")
+
+    allow = view.participants(auction_id)
+    if allow is not None and user not in allow:
+        raise HTTPException(403, "User not allowed to bid in this auction.")
+
+    # reject duplicate bids by same user (test expects this)
+    if user in auc.bids:
+        raise HTTPException(400, "User has already bid in this auction.")
+
+    try:
+        auc.place_bid(name=user, bid_amount=bid_amount, registry=view.registry)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    _log({"type": "bid", "auction_id": auction_id, "user": user,
+          "amount": bid_amount, "ts": auc.bids[user].timestamp_ms})
+    return user
+
+@app.post("/import", response_model=ImportOut, status_code=201)
+async def import_data(request: Request):
+    """Bulk import as a JSON ImportIn body or NDJSON (application/x-ndjson)."""
+    raw = await request.body()
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            bundle = parse_import_ndjson(raw.decode("utf-8"))
+        else:
+            bundle = ImportIn.model_validate_json(raw)
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(400, str(e))
+    return await run_in_threadpool(import_bundle, bundle)
+
+@app.post("/bid", response_model=Union[AuctionOut, BidAck])
+def bid(pl: BidIn, compact: bool = Query(False, description="Return only a BidAck")):
     """Submit a bid to an active auction."""
-    with LOCK:
-        auc = AUCTIONS.get(pl.auction_id)
-        if not auc:
+    shed = ADMISSION.check_user("POST /bid", pl.user.strip())
+    if shed is not None:
+        raise HTTPException(shed.status, shed.message, headers=shed.headers)
+    with STORE.write([pl.auction_id]) as view:
+        auc = view.auction(pl.auction_id)
+        if auc is None:
             raise HTTPException(404, "Auction not found")
+        user = _place_bid_locked(view, pl.auction_id, auc, pl.user, pl.bid_amount)
 
-        _ensure_auction_open(auc)
+        if compact:
+            placed = auc.bids[user]
+            out = BidAck(auction_id=pl.auction_id, user=user, bid_amount=placed.bid_amount,
+                         timestamp_ms=placed.timestamp_ms, rank=auc.bid_rank(user),
+                         bid_count=len(auc.bids))
+        else:
+            out = _auction_to_out(pl.auction_id, auc, participants=view.participants(pl.auction_id))
+    _wait_durable()
+    return out
 
-        user = (pl.user or "").strip()
-        if not user:
-            raise HTTPException(400, "User name is required")
+@app.post("/bids/batch", response_model=BatchBidOut)
+def bids_batch(pl: BatchBidIn):
+    """Apply many bids across auctions, taking each auction's lock once.
 
-        allow = AUCTION_PARTICIPANTS.get(pl.auction_id)
-        if allow is not None and user not in allow:
-            raise HTTPException(403, "User not allowed to bid in this auction.")
+    Items are validated exactly like /bid; one failing item does not stop
+    the rest. Statuses come back in request order.
+    """
+    by_auction: Dict[str, List[int]] = {}
+    for i, item in enumerate(pl.bids):
+        by_auction.setdefault(item.auction_id, []).append(i)
 
-        # reject duplicate bids by same user (test expects this)
-        if user in auc.bids:
-            raise HTTPException(400, "User has already bid in this auction.")
-
-        try:
-            auc.place_bid(name=user, bid_amount=pl.bid_amount, registry=REGISTRY)
-        except ValueError as e:
-            raise HTTPException(400, str(e))
+    statuses: List[Optional[BidStatus]] = [None] * len(pl.bids)
+    for i, item in enumerate(pl.bids):
+        shed = ADMISSION.check_user("POST /bids/batch", item.user.strip())
+        if shed is not None:
+            statuses[i] = BidStatus(index=i, status=shed.status, error=shed.message)
+    for auction_id, indexes in by_auction.items():
+        indexes = [i for i in indexes if statuses[i] is None]
+        if not indexes:
+            continue
+        with STORE.write([auction_id]) as view:
+            auc = view.auction(auction_id)
+            if not auc:
+                for i in indexes:
+                    statuses[i] = BidStatus(index=i, status=404, error="Auction not found")
+                continue
+            for i in indexes:
+                item = pl.bids[i]
+                try:
+                    _place_bid_locked(view, auction_id, auc, item.user, item.bid_amount)
+                    statuses[i] = BidStatus(index=i, status=200)
+                except HTTPException as e:
+                    statuses[i] = BidStatus(index=i, status=e.status_code, error=e.detail)
 
-        return _auction_to_out(pl.auction_id, auc)
+    _wait_durable()
+    return BatchBidOut(
+        accepted=sum(1 for st in statuses if st.status == 200),
+        rejected=sum(1 for st in statuses if st.status != 200),
+        results=statuses,
+    )
 
 @app.get("/results", response_model=AuctionOut)
-def results(auction_id: str = Query(..., description="Auction identifier")):
-    """Show current outcome; auto-settle if auction time elapsed."""
-    with LOCK:
-        auc = AUCTIONS.get(auction_id)
-        if not auc:
-            raise HTTPException(404, "Auction not found")
-        _auto_settle_if_ended(auc)
-        return _auction_to_out(auction_id, auc)
+def results(request: Request, response: Response,
+            auction_id: str = Query(..., description="Auction identifier"),
+            bids_limit: Optional[int] = Query(None, ge=0, description="Max bids to return"),
+            bids_after: Optional[str] = Query(None, description="next_bids_cursor of the previous page")):
+    """Show current outcome; auto-settle if auction time elapsed.
+
+    Responds 304 without building the body when If-None-Match matches the ETag.
+    """
+    after = _parse_bid_cursor(bids_after) if bids_after else None
+    with _current(auction_id) as (view, auc):
+        etag = _auction_etag(auc)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        participants = view.participants(auction_id)
+        if auc.status == Auction_State.CLOSED:
+            body = _closed_auction_body(auction_id, auc, bids_limit, after, participants)
+            return Response(body, media_type="application/json", headers=headers)
+        response.headers.update(headers)
+        return _auction_to_out(auction_id, auc, bids_limit=bids_limit, bids_after=after,
+                               participants=participants)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus text exposition of request, lock, settle and state metrics."""
+    return PlainTextResponse(METRICS.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/admin/profile", response_class=PlainTextResponse)
+def profile_stacks(x_admin_token: Optional[str] = Header(None)):
+    """Collapsed stacks sampled so far, one "route;frame;... count" line each."""
+    _require_admin(x_admin_token)
+    return PlainTextResponse(PROFILER.collapsed())
+
+@app.post("/admin/profile", response_model=ProfileOut)
+def profile_toggle(pl: ProfileIn, x_admin_token: Optional[str] = Header(None)):
+    """Start or stop request sampling; stopping writes the stacks to PROFILE_OUTPUT."""
+    _require_admin(x_admin_token)
+    if pl.reset:
+        PROFILER.reset()
+    output = None
+    if pl.enabled:
+        PROFILER.start(pl.rate)
+    elif pl.enabled is False and PROFILER.enabled:
+        PROFILER.stop()
+        output = PROFILER.dump(profiler.default_output())
+    return ProfileOut(**PROFILER.status(), output=output)
 
 @app.get("/leaderboard", response_model=LeaderboardOut)
-def leaderboard():
+def leaderboard(limit: Optional[int] = Query(None, ge=1), offset: int = Query(0, ge=0)):
     """Live scoreboard: users by points desc, then fewer assigned tasks, then name."""
-    with LOCK:
-        users = REGISTRY.list_users()
-        rows = sorted(
-            (LeaderboardRow(name=u.name, points=u.points, tasks_assigned=len(u.assigned_tasks)) for u in users),
-            key=lambda r: (-r.points, r.tasks_assigned, r.name.lower()),
-        )
-        return LeaderboardOut(leaderboard=rows)
+    page, total = STORE.leaderboard_page(offset, limit)
+    with METRICS.timer("response_model_seconds", (("model", "LeaderboardOut"),)):
+        return LeaderboardOut(leaderboard=[LeaderboardRow(**r) for r in page], total=total, offset=offset)
+
+@app.get("/leaderboard/rank", response_model=RankOut)
+def leaderboard_rank(user: str = Query(..., min_length=1)):
+    """Position of a single user on the scoreboard."""
+    found = STORE.leaderboard_rank(user.strip())
+    if found is None:
+        raise HTTPException(404, "User not found")
+    rank, row, total = found
+    return RankOut(rank=rank, total=total, **row)
+
+@app.get("/users/history", response_model=HistoryOut)
+def user_history(user: str = Query(..., min_length=1), limit: Optional[int] = Query(50, ge=1),
+                 offset: int = Query(0, ge=0)):
+    """Lifetime points spent and the auctions a user bid on and lost (needs AUCTION_DB)."""
+    if not isinstance(STORE, SQLiteStore):
+        raise HTTPException(501, "History needs AUCTION_DB")
+    found = STORE.user_history(user.strip(), offset, limit)
+    if found is None:
+        raise HTTPException(404, "User not found")
+    return HistoryOut(**found)
+
+
+def start_background_work() -> None:
+    """Recover from AUCTION_DATA_DIR and arm the periodic sweeps, once the server starts
+    rather than whenever this module is imported."""
+    if isinstance(STORE, SQLiteStore):
+        TIMERS.schedule(time.time() + SWEEP_INTERVAL_SECONDS, _sweep_due_auctions)
+    elif os.environ.get("AUCTION_DATA_DIR") and JOURNAL is None:
+        recover_state(Journal(os.environ["AUCTION_DATA_DIR"]))
+        TIMERS.schedule(time.time() + SNAPSHOT_INTERVAL_SECONDS, _checkpoint_periodically)
+    if ARCHIVE is not None and isinstance(STORE, LocalStore):
+        TIMERS.schedule(time.time() + ARCHIVE_SWEEP_SECONDS, _archive_periodically)
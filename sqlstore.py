@@ -0,0 +1,411 @@
+import collections
+import contextlib
+import itertools
+import json
+import sqlite3
+import threading
+
+from app import Auction, Auction_State, User, UserRegistry
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    name TEXT PRIMARY KEY,
+    name_key TEXT NOT NULL,                 -- name.lower(), the leaderboard's tie-break
+    points INTEGER NOT NULL,
+    tasks TEXT NOT NULL DEFAULT '[]',       -- assigned task names, JSON
+    tasks_count INTEGER NOT NULL DEFAULT 0,
+    spent INTEGER NOT NULL DEFAULT 0        -- lifetime points debited for lost auctions
+);
+CREATE TABLE IF NOT EXISTS auctions (
+    id TEXT PRIMARY KEY,
+    task TEXT NOT NULL,
+    status TEXT NOT NULL,                   -- Auction_State name
+    starts_at REAL NOT NULL,
+    ends_at REAL NOT NULL,
+    assigned_user TEXT,
+    version INTEGER NOT NULL,
+    participants TEXT                       -- JSON list; NULL lets anyone bid
+);
+CREATE TABLE IF NOT EXISTS bids (
+    auction_id TEXT NOT NULL,
+    user TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    PRIMARY KEY (auction_id, user)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS auctions_due ON auctions (status, ends_at);
+CREATE INDEX IF NOT EXISTS bids_book ON bids (auction_id, amount, ts);
+CREATE INDEX IF NOT EXISTS bids_user ON bids (user);
+CREATE INDEX IF NOT EXISTS users_rank ON users (points DESC, tasks_count, name_key, name);
+"""
+
+# Statements are fixed strings with ? parameters: sqlite3 prepares each one
+# once per connection and reuses it from its statement cache.
+_SELECT_AUCTION = ("SELECT task, status, starts_at, ends_at, assigned_user, version, participants"
+                   " FROM auctions WHERE id = ?")
+_SELECT_VERSION = "SELECT version FROM auctions WHERE id = ?"
+_SELECT_BOOK = "SELECT user, amount, ts FROM bids WHERE auction_id = ? ORDER BY amount, ts, user"
+_SELECT_USER = "SELECT points, tasks FROM users WHERE name = ?"
+_INSERT_AUCTION = "INSERT INTO auctions VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+_INSERT_BID = "INSERT INTO bids VALUES (?, ?, ?, ?)"
+_INSERT_USER = "INSERT OR IGNORE INTO users (name, name_key, points) VALUES (?, ?, ?)"
+_UPDATE_AUCTION = "UPDATE auctions SET status = ?, assigned_user = ?, version = ? WHERE id = ?"
+# every loser of one auction in a single statement; points stop at zero and
+# spent counts what was actually taken
+_DEBIT_LOSERS = """
+UPDATE users SET points = MAX(0, users.points - b.amount), spent = users.spent + MIN(users.points, b.amount)
+FROM bids AS b WHERE b.auction_id = ? AND b.user = users.name AND b.user != ?
+"""
+_ASSIGN_TASK = "UPDATE users SET tasks = json_insert(tasks, '$[#]', ?), tasks_count = tasks_count + 1 WHERE name = ?"
+# CROSS JOIN keeps bids (by bids_user) as the outer loop rather than every closed auction
+_SELECT_LOST = """
+SELECT a.id, a.task, b.amount, a.assigned_user, a.ends_at FROM bids AS b CROSS JOIN auctions AS a ON a.id = b.auction_id
+WHERE b.user = ? AND a.status = 'CLOSED' AND a.assigned_user != b.user
+ORDER BY a.ends_at DESC, a.id LIMIT ? OFFSET ?
+"""
+_COUNT_LOST = """
+SELECT COUNT(*) FROM bids AS b CROSS JOIN auctions AS a ON a.id = b.auction_id
+WHERE b.user = ? AND a.status = 'CLOSED' AND a.assigned_user != b.user
+"""
+
+
+class AuctionExists(Exception):
+    """create() was given an auction id that is already taken."""
+
+
+class SQLiteStore:
+    """Auctions, allowlists, bids and users in one SQLite database in WAL mode.
+
+    Every worker process opens the same file, so any of them can serve any
+    auction. write() runs in a BEGIN IMMEDIATE transaction: writers from all
+    processes queue on SQLite's write lock, which makes a bid or a settle
+    atomic across workers the way the stripe locks do within one process.
+    Readers see the last commit and never wait for writers.
+
+    Each process keeps the last auctions it read or wrote in an LRU keyed
+    by version: read() checks the version with one primary-key lookup and
+    reloads the bids only if the auction changed since, and a CLOSED
+    auction, which never changes again, is served without the lookup.
+    write() likewise takes the cached Auction when its version matches the
+    row and changes it in place, so a bid costs a few statements rather
+    than a reload of the whole book. Cached objects are only touched under
+    the auction's stripe lock (per process, like routes.py's), which read()
+    and write() both hold; a write that rolls back evicts what it touched.
+    """
+
+    def __init__(self, path, starting_points=10, cache_size=1024):
+        self.path = path
+        self.starting_points = int(starting_points)
+        self._local = threading.local()
+        self._cache = collections.OrderedDict()     # auction id -> (Auction, participants)
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(64)]
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        if "spent" not in {row[1] for row in conn.execute("PRAGMA table_info(users)")}:
+            conn.execute("ALTER TABLE users ADD COLUMN spent INTEGER NOT NULL DEFAULT 0")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: transactions are begun and ended explicitly below
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self, immediate):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # ---- auctions ----
+    def _locked(self, auction_ids):
+        """The stripes of `auction_ids`, taken in ascending order."""
+        stack = contextlib.ExitStack()
+        n = len(self._stripes)
+        for i in sorted({hash(aid) % n for aid in auction_ids}):
+            stack.enter_context(self._stripes[i])
+        return stack
+
+    @contextlib.contextmanager
+    def read(self, auction_id):
+        """A view of one auction as of the last commit."""
+        with self._locked([auction_id]):
+            cached = self._cached(auction_id)
+            if cached is not None and cached[0].status != Auction_State.CLOSED:
+                row = self._conn().execute(_SELECT_VERSION, (auction_id,)).fetchone()
+                if row is None or row[0] != cached[0].version:
+                    cached = None
+            if cached is not None:
+                yield _View.cached(auction_id, *cached)
+                return
+            with self._transaction(immediate=False) as conn:
+                view = _View(self, conn)
+                auc = view.auction(auction_id)
+            if auc is not None:
+                self._put(auction_id, auc, view.participants(auction_id))
+            yield view
+
+    @contextlib.contextmanager
+    def write(self, auction_ids):
+        """A view whose auctions and users are written back when the block exits.
+
+        As with the in-process store, changes made before an exception (say,
+        a settle before a late bid is rejected) are kept.
+        """
+        with self._locked(auction_ids):
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            view = _View(self, conn)
+            try:
+                yield view
+            finally:
+                try:
+                    view.flush()
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    # the cached objects may now be ahead of the database
+                    self._evict(view.auctions)
+                    raise
+                for aid, auc in view.auctions.items():
+                    if auc is not None:
+                        self._put(aid, auc, view.participants(aid))
+
+    def create(self, entries):
+        """Insert (auction_id, Auction, allowlist) entries all-or-nothing."""
+        rows = [(aid, a.task, a.status.name, a.starts_at_time, a.ends_at_time, a.assigned_user,
+                 a.version, json.dumps(allow) if allow is not None else None)
+                for aid, a, allow in entries]
+        try:
+            with self._transaction(immediate=True) as conn:
+                conn.executemany(_INSERT_AUCTION, rows)
+        except sqlite3.IntegrityError:
+            raise AuctionExists()
+
+    def exists(self, auction_ids):
+        conn = self._conn()
+        return any(conn.execute("SELECT 1 FROM auctions WHERE id = ?", (aid,)).fetchone()
+                   for aid in auction_ids)
+
+    def due(self, now):
+        """Ids of auctions whose start or end time has passed without being applied."""
+        rows = self._conn().execute(
+            "SELECT id FROM auctions WHERE (status = 'OPEN' AND ends_at <= ?)"
+            " OR (status = 'SCHEDULED' AND starts_at <= ?)", (now, now))
+        return [r[0] for r in rows]
+
+    def _cached(self, auction_id):
+        with self._cache_lock:
+            entry = self._cache.get(auction_id)
+            if entry is not None:
+                self._cache.move_to_end(auction_id)
+            return entry
+
+    def _evict(self, auction_ids):
+        with self._cache_lock:
+            for aid in auction_ids:
+                self._cache.pop(aid, None)
+
+    def _put(self, auction_id, auc, participants):
+        with self._cache_lock:
+            held = self._cache.get(auction_id)
+            # a slower reader may finish after a newer write; keep the newer one
+            if held is None or held[0].version <= auc.version:
+                self._cache[auction_id] = (auc, participants)
+            self._cache.move_to_end(auction_id)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    # ---- users ----
+    def ensure_users(self, names):
+        """Create any missing users; returns how many were new."""
+        clean = list(dict.fromkeys(n.strip() for n in names if n and n.strip()))
+        with self._transaction(immediate=True) as conn:
+            before = conn.total_changes
+            conn.executemany(_INSERT_USER, [(n, n.lower(), self.starting_points) for n in clean])
+            return conn.total_changes - before
+
+    def leaderboard_page(self, offset=0, limit=None):
+        """(rows, total): users by points desc, then fewer tasks, then name."""
+        with self._transaction(immediate=False) as conn:
+            rows = conn.execute(
+                "SELECT name, points, tasks_count FROM users"
+                " ORDER BY points DESC, tasks_count, name_key, name LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset)).fetchall()
+            total = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        return [{"name": n, "points": p, "tasks_assigned": t} for n, p, t in rows], total
+
+    def leaderboard_rank(self, name):
+        """(rank, row, total) for `name`, or None if unknown."""
+        with self._transaction(immediate=False) as conn:
+            row = conn.execute("SELECT points, tasks_count, name_key FROM users WHERE name = ?",
+                               (name,)).fetchone()
+            if row is None:
+                return None
+            points, tasks, key = row
+            ahead = conn.execute(
+                "SELECT COUNT(*) FROM users WHERE points > ?"
+                " OR (points = ? AND (tasks_count, name_key, name) < (?, ?, ?))",
+                (points, points, tasks, key, name)).fetchone()[0]
+            total = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        return ahead + 1, {"name": name, "points": points, "tasks_assigned": tasks}, total
+
+    def user_history(self, name, offset=0, limit=None):
+        """A user's lifetime spend and the closed auctions they bid on and lost,
+        most recent first; None if unknown."""
+        with self._transaction(immediate=False) as conn:
+            row = conn.execute("SELECT points, spent FROM users WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return None
+            lost = conn.execute(_SELECT_LOST, (name, -1 if limit is None else limit, offset)).fetchall()
+            total = conn.execute(_COUNT_LOST, (name,)).fetchone()[0]
+        return {
+            "name": name, "points": row[0], "points_spent": row[1], "auctions_lost_total": total,
+            "auctions_lost": [{"auction_id": aid, "task": task, "bid_amount": amount,
+                               "assigned_user": winner, "ends_at_time": ends}
+                              for aid, task, amount, winner, ends in lost],
+        }
+
+    # ---- gauges ----
+    def status_counts(self):
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM auctions GROUP BY status")
+        return {Auction_State[s]: n for s, n in rows}
+
+    def bid_count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM bids").fetchone()[0]
+
+    def user_count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+
+class _View:
+    """The auctions and users one transaction works on, loaded on first use."""
+
+    def __init__(self, store, conn):
+        self.conn = conn
+        self.registry = _TxRegistry(conn, store.starting_points)
+        self.auctions = {}          # auction id -> Auction or None
+        self._participants = {}
+        self._loaded = {}           # auction id -> (version, status, bid count) as read
+        self._store = store
+
+    @classmethod
+    def cached(cls, auction_id, auc, participants):
+        view = cls.__new__(cls)
+        view.conn = None
+        view.registry = None
+        view.auctions = {auction_id: auc}
+        view._participants = {auction_id: participants}
+        view._loaded = {}
+        return view
+
+    def auction(self, auction_id):
+        if auction_id not in self.auctions:
+            self.auctions[auction_id] = self._load(auction_id)
+        return self.auctions[auction_id]
+
+    def participants(self, auction_id):
+        self.auction(auction_id)
+        return self._participants.get(auction_id)
+
+    def _load(self, auction_id):
+        row = self.conn.execute(_SELECT_AUCTION, (auction_id,)).fetchone()
+        if row is None:
+            return None
+        task, status, starts_at, ends_at, assigned, version, participants = row
+        cached = self._store._cached(auction_id)
+        if cached is not None and cached[0].version == version:
+            # the caller holds the stripe, so nothing else is using this object
+            auc = cached[0]
+        else:
+            bids = self.conn.execute(_SELECT_BOOK, (auction_id,)).fetchall()
+            auc = Auction.from_snapshot({
+                "task": task, "status": status, "starts_at_time": starts_at, "ends_at_time": ends_at,
+                "bids": bids, "assigned_user": assigned, "version": version,
+            })
+        self._participants[auction_id] = json.loads(participants) if participants is not None else None
+        self._loaded[auction_id] = (version, auc.status, len(auc.bids))
+        return auc
+
+    def flush(self):
+        """Write back every loaded auction that changed, in one batch per statement.
+
+        New users go in first, so the debits of an auction settled here see
+        bidders created in the same transaction.
+        """
+        self.registry.flush()
+        changed, bids, settled = [], [], []
+        for aid, (version, status, count) in self._loaded.items():
+            auc = self.auctions[aid]
+            if auc.version == version:
+                continue
+            changed.append((auc.status.name, auc.assigned_user, auc.version, aid))
+            # bids are never replaced here (routes reject a second bid), so the
+            # new ones are the last entries of the insertion-ordered BidBook
+            bids.extend((aid, b.user, b.bid_amount, b.timestamp_ms)
+                        for b in itertools.islice(reversed(auc.bids.values()), len(auc.bids) - count))
+            if status != Auction_State.CLOSED and auc.status == Auction_State.CLOSED and auc.assigned_user is not None:
+                settled.append((aid, auc.assigned_user, auc.task))
+            self._loaded[aid] = (auc.version, auc.status, len(auc.bids))
+        self.conn.executemany(_UPDATE_AUCTION, changed)
+        self.conn.executemany(_INSERT_BID, bids)
+        self.conn.executemany(_DEBIT_LOSERS, [(aid, winner) for aid, winner, _ in settled])
+        self.conn.executemany(_ASSIGN_TASK, [(task, winner) for _, winner, task in settled])
+
+
+class _TxRegistry(UserRegistry):
+    """UserRegistry over the users one transaction touches, read on first use.
+
+    Points and tasks only change when an auction settles, and _View.flush()
+    applies those in SQL, so settle() loads no users and flush() here just
+    inserts users that are new. Ranking is done by the database, so
+    user_changed() has nothing to do.
+    """
+
+    def __init__(self, conn, starting_points):
+        super().__init__(starting_points)
+        self._conn = conn
+        self._new = set()           # names created in this transaction
+
+    def create_user(self, name):
+        clean = (name or "").strip()
+        user = self.users.get(clean)
+        if user is None:
+            row = self._conn.execute(_SELECT_USER, (clean,)).fetchone()
+            user = self.users[clean] = User(clean, row[0] if row else self.starting_points)
+            if row is None:
+                self._new.add(clean)
+            else:
+                user.assigned_tasks = json.loads(row[1])
+        return user
+
+    def create_users(self, names):
+        before = len(self._new)
+        for name in names:
+            self.create_user(name)
+        return len(self._new) - before
+
+    def settle(self, auctions):
+        # the winner's task still counts towards later tie-breaks in this
+        # transaction if the winner was already read
+        for a in auctions:
+            user = self.users.get(a.assigned_user)
+            if user is not None:
+                user.assigned_tasks.append(a.task)
+
+    def user_changed(self, user):
+        pass
+
+    def flush(self):
+        self._conn.executemany(_INSERT_USER, [(n, n.lower(), self.starting_points) for n in self._new])
+        self._new.clear()
@@ -1,5 +1,7 @@
 # test_api_routes.py
 import importlib
+import sqlite3
+import threading
 import time
 import pytest
 from fastapi.testclient import TestClient
@@ -10,17 +12,19 @@ MODULE_NAME = "routes"  # e.g., "main", "routes", "api"
 @pytest.fixture()
 def app_mod(monkeypatch):
     m = importlib.import_module(MODULE_NAME)
+    # timers only fire when a test calls run_due(), never on the service thread
+    monkeypatch.setattr(m, "TIMERS", m.TimerService(autostart=False))
     # Fresh state before each test
     m.AUCTIONS.clear()
     if hasattr(m, "AUCTION_PARTICIPANTS"):
         m.AUCTION_PARTICIPANTS.clear()
-    m.REGISTRY.users.clear()
+    m.REGISTRY.clear()
     yield m
     # Cleanup (optional)
     m.AUCTIONS.clear()
     if hasattr(m, "AUCTION_PARTICIPANTS"):
         m.AUCTION_PARTICIPANTS.clear()
-    m.REGISTRY.users.clear()
+    m.REGISTRY.clear()
 
 @pytest.fixture()
 def client(app_mod):
@@ -137,3 +141,498 @@ def test_bid_after_close_returns_400(client, app_mod, monkeypatch):
     r = client.post("/bid", json={"auction_id": "A5", "user": "Bob", "bid_amount": 1})
     assert r.status_code == 400
     assert "not open" in r.json()["detail"].lower()
+
+def test_results_etag_304_until_auction_changes(client, app_mod, monkeypatch):
+    start = 1_700_000_000
+    monkeypatch.setattr(time, "time", lambda: start)
+    client.post("/new_task", json={"auction_id": "E1", "task": "Mop", "duration_seconds": 30})
+
+    r = client.get("/results", params={"auction_id": "E1"})
+    etag = r.headers["etag"]
+    r2 = client.get("/results", params={"auction_id": "E1"}, headers={"If-None-Match": etag})
+    assert r2.status_code == 304
+    assert r2.content == b""
+
+    client.post("/bid", json={"auction_id": "E1", "user": "Alice", "bid_amount": 1})
+    r3 = client.get("/results", params={"auction_id": "E1"}, headers={"If-None-Match": etag})
+    assert r3.status_code == 200
+    assert r3.headers["etag"] != etag
+    assert r3.json()["bids"][0]["user"] == "Alice"
+
+def test_closed_auction_results_are_encoded_once(client, app_mod, monkeypatch):
+    start = 1_700_000_000
+    monkeypatch.setattr(time, "time", lambda: start)
+    client.post("/new_task", json={"auction_id": "C1", "task": "Dust", "duration_seconds": 5})
+    client.post("/bid", json={"auction_id": "C1", "user": "Alice", "bid_amount": 2})
+    monkeypatch.setattr(time, "time", lambda: start + 10)
+
+    first = client.get("/results", params={"auction_id": "C1"})
+    assert first.status_code == 200 and first.json()["assigned_user"] == "Alice"
+    calls = []
+    real = app_mod._auction_to_out
+    monkeypatch.setattr(app_mod, "_auction_to_out", lambda *a, **kw: (calls.append(a), real(*a, **kw))[1])
+    again = client.get("/results", params={"auction_id": "C1"})
+    assert again.content == first.content and again.headers["etag"] == first.headers["etag"]
+    assert calls == []
+    assert client.get("/results", params={"auction_id": "C1", "bids_limit": 1}).json()["bids"][0]["user"] == "Alice"
+    assert len(calls) == 1   # other paging is its own entry
+
+    # a new auction under the same id never sees the old one's bytes
+    app_mod.AUCTIONS.clear()
+    client.post("/new_task", json={"auction_id": "C1", "task": "Sweep", "duration_seconds": 5})
+    monkeypatch.setattr(time, "time", lambda: start + 20)
+    assert client.get("/results", params={"auction_id": "C1"}).json()["task"] == "Sweep"
+
+def test_leaderboard_paging_and_rank(client, app_mod):
+    for n in ["Alice", "Bob", "Cara"]:
+        app_mod.REGISTRY.create_user(n)
+    app_mod.REGISTRY.get_user("Bob").points = 3
+    app_mod.REGISTRY.user_changed(app_mod.REGISTRY.get_user("Bob"))
+
+    page = client.get("/leaderboard", params={"limit": 1, "offset": 1}).json()
+    assert page["total"] == 3
+    assert [r["name"] for r in page["leaderboard"]] == ["Cara"]
+
+    r = client.get("/leaderboard/rank", params={"user": "Bob"})
+    assert r.status_code == 200
+    assert r.json() == {"name": "Bob", "rank": 3, "points": 3, "tasks_assigned": 0, "total": 3}
+    assert client.get("/leaderboard/rank", params={"user": "Zed"}).status_code == 404
+
+def test_scheduled_auction_opens_and_settles_on_timer(client, app_mod, monkeypatch):
+    now = [1_700_000_000]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    r = client.post("/new_task", json={
+        "auction_id": "S1", "task": "Gutters", "duration_seconds": 5, "start_in_seconds": 60,
+    })
+    assert r.status_code == 201
+    assert r.json()["status"] == "SCHEDULED"
+    assert r.json()["starts_at_time"] == now[0] + 60
+    r = client.post("/bid", json={"auction_id": "S1", "user": "Alice", "bid_amount": 1})
+    assert r.status_code == 400
+
+    now[0] += 60
+    app_mod.TIMERS.run_due()
+    assert app_mod.AUCTIONS["S1"].status == app_mod.Auction_State.OPEN
+    client.post("/bid", json={"auction_id": "S1", "user": "Alice", "bid_amount": 1})
+    client.post("/bid", json={"auction_id": "S1", "user": "Bob", "bid_amount": 3})
+
+    now[0] += 5
+    app_mod.TIMERS.run_due()
+    auc = app_mod.AUCTIONS["S1"]
+    assert auc.status == app_mod.Auction_State.CLOSED
+    assert auc.assigned_user == "Alice"
+    assert app_mod.REGISTRY.get_user("Bob").points == 7
+
+def test_expired_auctions_settle_as_one_batch(app_mod, monkeypatch):
+    now = [1_700_000_000]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    for a in range(30):
+        app_mod.new_task(app_mod.NewTaskIn(auction_id=f"E{a}", task=f"t{a}", duration_seconds=5))
+        app_mod.bid(app_mod.BidIn(auction_id=f"E{a}", user="Alice", bid_amount=0))
+        app_mod.bid(app_mod.BidIn(auction_id=f"E{a}", user=f"b{a}", bid_amount=1))
+    calls = []
+    real = app_mod.settle_many
+    monkeypatch.setattr(app_mod, "settle_many", lambda auctions, reg: calls.append(len(auctions)) or real(auctions, reg))
+
+    now[0] += 5
+    app_mod.TIMERS.run_due()
+    assert calls == [30]
+    assert all(app_mod.AUCTIONS[f"E{a}"].assigned_user == "Alice" for a in range(30))
+    assert len(app_mod.REGISTRY.get_user("Alice").assigned_tasks) == 30
+    assert app_mod.REGISTRY.get_user("b3").points == 9
+    assert app_mod.settle_expired(["E0", "missing"]) == 0
+
+def test_metrics_endpoint_reports_routes_locks_and_state(client, app_mod):
+    client.post("/new_task", json={"auction_id": "M1", "task": "Mop", "duration_seconds": 60})
+    client.post("/bid", json={"auction_id": "M1", "user": "Alice", "bid_amount": 1})
+    client.get("/results", params={"auction_id": "missing"})
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    body = r.text
+    assert 'http_requests_total{route="POST /bid",status="200"}' in body
+    assert 'http_requests_total{route="GET /results",status="404"}' in body
+    assert 'lock_wait_seconds_count{lock="LOCK"}' in body
+    assert 'lock_hold_seconds_count{lock="LOCK"}' in body
+    assert 'lock_hold_seconds_count{lock="auction_stripe"}' in body
+    assert 'lock_hold_seconds_count{lock="REGISTRY"}' in body
+    assert 'response_model_seconds_count{model="AuctionOut"}' in body
+    assert 'auctions{status="OPEN"} 1' in body
+    assert "\nbids 1\n" in body
+
+def test_admin_profile_samples_routes_and_dumps(client, app_mod, monkeypatch, tmp_path):
+    out = tmp_path / "stacks.collapsed"
+    monkeypatch.setenv("PROFILE_OUTPUT", str(out))
+    assert client.post("/admin/profile", json={"enabled": True}).status_code == 403
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    admin = {"X-Admin-Token": "s3cret"}
+    assert client.post("/admin/profile", json={"enabled": True}, headers={"X-Admin-Token": "nope"}).status_code == 403
+
+    r = client.post("/admin/profile", json={"enabled": True, "rate": 1.0, "reset": True}, headers=admin)
+    assert r.status_code == 200 and r.json()["enabled"] is True
+    client.post("/new_task", json={"auction_id": "P1", "task": "Mop", "duration_seconds": 60})
+    real = app_mod._build_auction_out
+    def slow(*args):
+        app_mod.PROFILER.sample()
+        return real(*args)
+    monkeypatch.setattr(app_mod, "_build_auction_out", slow)
+    client.get("/results", params={"auction_id": "P1"})
+
+    stacks = client.get("/admin/profile", headers=admin).text
+    assert any(line.startswith("GET /results;routes.py:results;") for line in stacks.splitlines()), stacks
+    r = client.post("/admin/profile", json={"enabled": False}, headers=admin)
+    assert r.json()["enabled"] is False and r.json()["output"] == str(out)
+    assert "GET /results;" in out.read_text()
+    assert client.post("/admin/profile", json={"rate": 2}, headers=admin).status_code == 422
+
+def test_concurrent_bids_across_auctions_keep_point_invariants(app_mod, monkeypatch):
+    now = [1_700_000_000]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    users = [f"u{i}" for i in range(8)]
+    for a in range(20):
+        app_mod.new_task(app_mod.NewTaskIn(auction_id=f"C{a}", task=f"t{a}", duration_seconds=5))
+
+    def bidder(name):
+        for a in range(20):
+            app_mod.bid(app_mod.BidIn(auction_id=f"C{a}", user=name, bid_amount=(a + len(name)) % 3))
+
+    threads = [threading.Thread(target=bidder, args=(u,)) for u in users]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    now[0] += 10
+    settlers = [threading.Thread(target=app_mod._on_auction_timer, args=(f"C{a}",)) for a in range(20)]
+    for t in settlers:
+        t.start()
+    for t in settlers:
+        t.join()
+
+    spent = {u: 0 for u in users}
+    for auc in app_mod.AUCTIONS.values():
+        assert auc.status == app_mod.Auction_State.CLOSED
+        assert len(auc.bids) == len(users)
+        for b in auc.bids.values():
+            if b.user != auc.assigned_user:
+                spent[b.user] += b.bid_amount
+    for u in users:
+        assert app_mod.REGISTRY.get_user(u).points == max(0, 10 - spent[u])
+
+def test_results_bid_paging_and_compact_bid_ack(client, app_mod, monkeypatch):
+    now = [1_700_000_000]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    client.post("/new_task", json={"auction_id": "P1", "task": "Windows", "duration_seconds": 60})
+    for name, amount in [("Ann", 4), ("Bo", 1), ("Cy", 3), ("Di", 1)]:
+        now[0] += 1
+        r = client.post("/bid", params={"compact": "true"},
+                        json={"auction_id": "P1", "user": name, "bid_amount": amount})
+        assert r.status_code == 200
+    assert r.json() == {"auction_id": "P1", "user": "Di", "bid_amount": 1,
+                        "timestamp_ms": now[0] * 1000, "rank": 2, "bid_count": 4}
+
+    page = client.get("/results", params={"auction_id": "P1", "bids_limit": 2}).json()
+    assert [b["user"] for b in page["bids"]] == ["Bo", "Di"]
+    assert page["bid_count"] == 4 and page["lowest_bid"] == 1
+    page2 = client.get("/results", params={"auction_id": "P1", "bids_limit": 2,
+                                           "bids_after": page["next_bids_cursor"]}).json()
+    assert [b["user"] for b in page2["bids"]] == ["Cy", "Ann"]
+    assert page2["next_bids_cursor"] is None
+
+    bad = client.get("/results", params={"auction_id": "P1", "bids_after": "nope"})
+    assert bad.status_code == 400
+
+def test_batch_bids_apply_per_item_rules(client, app_mod):
+    client.post("/new_task", json={"auction_id": "B1", "task": "Oven", "duration_seconds": 60,
+                                   "participants": ["Alice", "Bob"]})
+    client.post("/new_task", json={"auction_id": "B2", "task": "Car", "duration_seconds": 60})
+    r = client.post("/bids/batch", json={"bids": [
+        {"auction_id": "B1", "user": "Alice", "bid_amount": 2},
+        {"auction_id": "B2", "user": "Alice", "bid_amount": 3},
+        {"auction_id": "B1", "user": "Eve", "bid_amount": 1},
+        {"auction_id": "B1", "user": "Alice", "bid_amount": 1},
+        {"auction_id": "B2", "user": "Bob", "bid_amount": 11},
+        {"auction_id": "NOPE", "user": "Bob", "bid_amount": 1},
+    ]})
+    assert r.status_code == 200, r.text
+    data = r.json()
+    assert [st["status"] for st in data["results"]] == [200, 200, 403, 400, 400, 404]
+    assert [st["index"] for st in data["results"]] == list(range(6))
+    assert data["accepted"] == 2 and data["rejected"] == 4
+    assert "already" in data["results"][3]["error"].lower()
+    assert app_mod.AUCTIONS["B2"].bids["Alice"].bid_amount == 3
+
+def test_bulk_import_json_and_ndjson(client, app_mod):
+    r = client.post("/import", json={
+        "users": ["Ann", "Bo"],
+        "tasks": [{"name": "Low", "priority": 1}, {"name": "High", "priority": 9}],
+        "auctions": [
+            {"auction_id": "I1", "task": "Bins", "duration_seconds": 30, "participants": ["Ann", "Cy"]},
+            {"auction_id": "I2", "task": "Bath", "duration_seconds": 30},
+        ],
+    })
+    assert r.status_code == 201, r.text
+    assert r.json() == {"users_created": 3, "tasks_queued": 2, "auctions_created": 2}
+    assert app_mod.QUEUE.peek_next_task().name == "High"
+    assert app_mod.AUCTION_PARTICIPANTS["I1"] == ["Ann", "Cy"]
+
+    # one clashing id rejects the whole batch of auctions
+    ndjson = "\n".join([
+        '{"type": "auction", "auction_id": "I3", "task": "Hall", "duration_seconds": 30}',
+        '{"type": "auction", "auction_id": "I1", "task": "Dup", "duration_seconds": 30}',
+    ])
+    r = client.post("/import", content=ndjson, headers={"Content-Type": "application/x-ndjson"})
+    assert r.status_code == 409
+    assert "I3" not in app_mod.AUCTIONS
+
+    r = client.post("/import", content='{"type": "user", "name": "Di"}\n{"type": "nope"}',
+                    headers={"Content-Type": "application/x-ndjson"})
+    assert r.status_code == 400 and "line 2" in r.json()["detail"]
+    for bad in ('"hello"', '[1, 2]', '{"type": "user", "name": 5}'):
+        r = client.post("/import", content='{"type": "user", "name": "Di"}\n' + bad,
+                        headers={"Content-Type": "application/x-ndjson"})
+        assert r.status_code == 400 and "line 2" in r.json()["detail"]
+
+def test_import_numbers_tasks_around_explicit_ids_and_writes_nothing_on_rejection(client, app_mod, monkeypatch):
+    monkeypatch.setattr(app_mod, "QUEUE", app_mod.TaskQueue())
+    r = client.post("/import", json={"tasks": [{"name": "a", "priority": 1}, {"id": 1, "name": "b", "priority": 1}]})
+    assert r.status_code == 201, r.text
+    assert sorted(t.id for t in app_mod.QUEUE.tasks()) == [1, 2]
+    assert [app_mod.QUEUE.get_next_task().name for _ in range(2)] == ["b", "a"]
+
+    r = client.post("/import", json={"tasks": [{"id": 7, "name": "c"}, {"id": 7, "name": "d"}]})
+    assert r.status_code == 400 and "7" in r.json()["detail"]
+    assert len(app_mod.QUEUE) == 0
+
+    assert client.post("/import", json={"users": ["  "]}).status_code == 400
+    client.post("/new_task", json={"auction_id": "I9", "task": "Taken", "duration_seconds": 30})
+    r = client.post("/import", json={"users": ["Eve"], "auctions": [
+        {"auction_id": "I9", "task": "Dup", "duration_seconds": 30, "participants": ["Fay"]}]})
+    assert r.status_code == 409
+    assert not {"", "Eve", "Fay"} & set(app_mod.REGISTRY.users)
+
+    # a create that loses the race after the early exists() check adds no users either
+    monkeypatch.setattr(app_mod.STORE, "exists", lambda ids: False)
+    r = client.post("/new_task", json={"auction_id": "I9", "task": "Dup", "duration_seconds": 30,
+                                       "participants": ["Gus"]})
+    assert r.status_code == 409 and "Gus" not in app_mod.REGISTRY.users
+
+
+@pytest.fixture()
+def sqlite_store(app_mod, monkeypatch, tmp_path):
+    store = app_mod.SQLiteStore(str(tmp_path / "auctions.db"), starting_points=10)
+    monkeypatch.setattr(app_mod, "STORE", store)
+    app_mod.CLOSED_BODIES.clear()
+    yield store
+    app_mod.CLOSED_BODIES.clear()
+
+def test_sqlite_store_serves_the_same_api(client, app_mod, sqlite_store, monkeypatch):
+    start = 1_700_000_000
+    monkeypatch.setattr(time, "time", lambda: start)
+    r = client.post("/new_task", json={"auction_id": "S1", "task": "Mop", "duration_seconds": 5,
+                                       "participants": ["Alice", "Bob"]})
+    assert r.status_code == 201, r.text
+    assert client.post("/new_task", json={"auction_id": "S1", "task": "Mop", "duration_seconds": 5}).status_code == 409
+    assert client.post("/bid", json={"auction_id": "S1", "user": "Alice", "bid_amount": 1}).status_code == 200
+    assert client.post("/bid", json={"auction_id": "S1", "user": "Bob", "bid_amount": 4}).status_code == 200
+    assert client.post("/bid", json={"auction_id": "S1", "user": "Alice", "bid_amount": 2}).status_code == 400
+    assert client.post("/bid", json={"auction_id": "S1", "user": "Cy", "bid_amount": 2}).status_code == 403
+    assert not app_mod.AUCTIONS and not app_mod.REGISTRY.users
+
+    # another worker on the same file sees the bids and settles the auction
+    other = app_mod.SQLiteStore(sqlite_store.path, starting_points=10)
+    monkeypatch.setattr(app_mod, "STORE", other)
+    monkeypatch.setattr(time, "time", lambda: start + 10)
+    data = client.get("/results", params={"auction_id": "S1"}).json()
+    assert data["status"] == "CLOSED" and data["assigned_user"] == "Alice"
+
+    monkeypatch.setattr(app_mod, "STORE", sqlite_store)
+    lb = client.get("/leaderboard").json()
+    assert [(row["name"], row["points"]) for row in lb["leaderboard"]] == [("Alice", 10), ("Bob", 6)]
+    assert client.get("/leaderboard/rank", params={"user": "Bob"}).json()["rank"] == 2
+    assert client.get("/results", params={"auction_id": "S1"}).json()["status"] == "CLOSED"
+
+def test_sqlite_workers_keep_point_invariants(app_mod, sqlite_store, monkeypatch):
+    now = [1_700_000_000]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    users = [f"u{i}" for i in range(6)]
+    for a in range(10):
+        app_mod.new_task(app_mod.NewTaskIn(auction_id=f"W{a}", task=f"t{a}", duration_seconds=5))
+    workers = [sqlite_store, app_mod.SQLiteStore(sqlite_store.path, starting_points=10)]
+
+    def run_as(store, fn, *args):
+        # each thread stands in for a worker process with its own store and connection
+        with monkeypatch.context() as m:
+            m.setattr(app_mod, "STORE", store)
+            fn(*args)
+
+    def bidder(i, name):
+        for a in range(10):
+            run_as(workers[i % 2], app_mod.bid,
+                   app_mod.BidIn(auction_id=f"W{a}", user=name, bid_amount=(a + i) % 3))
+
+    threads = [threading.Thread(target=bidder, args=(i, u)) for i, u in enumerate(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    now[0] += 10
+    app_mod.settle_expired(sqlite_store.due(now[0]))
+    with sqlite_store._transaction(immediate=False) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM bids").fetchone()[0] == 10 * len(users)
+        assert conn.execute("SELECT COUNT(*) FROM auctions WHERE status = 'CLOSED'").fetchone()[0] == 10
+        spent = dict(conn.execute(
+            "SELECT b.user, SUM(b.amount) FROM bids b JOIN auctions a ON a.id = b.auction_id"
+            " WHERE b.user != a.assigned_user GROUP BY b.user"))
+        points = dict(conn.execute("SELECT name, points FROM users"))
+    for u in users:
+        assert points[u] == max(0, 10 - spent.get(u, 0))
+
+def test_sqlite_user_history_lists_lost_auctions_and_spend(client, app_mod, sqlite_store, monkeypatch):
+    now = [1_700_000_000]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    for i, aid in enumerate(("H1", "H2", "H3")):
+        client.post("/new_task", json={"auction_id": aid, "task": f"t{aid}", "duration_seconds": 5 + i})
+        client.post("/bid", json={"auction_id": aid, "user": "Ann", "bid_amount": 1})
+    for aid in ("H1", "H2"):
+        assert client.post("/bid", json={"auction_id": aid, "user": "Bob", "bid_amount": 8}).status_code == 200
+    client.post("/bid", json={"auction_id": "H3", "user": "Bob", "bid_amount": 0})
+    now[0] += 10
+    app_mod.settle_expired(sqlite_store.due(now[0]))
+
+    # 8 + 8 from 10 points: the second debit stops at zero
+    data = client.get("/users/history", params={"user": "Bob"}).json()
+    assert (data["points"], data["points_spent"], data["auctions_lost_total"]) == (0, 10, 2)
+    assert [a["auction_id"] for a in data["auctions_lost"]] == ["H2", "H1"]
+    assert data["auctions_lost"][0] == {"auction_id": "H2", "task": "tH2", "bid_amount": 8,
+                                        "assigned_user": "Ann", "ends_at_time": 1_700_000_006}
+    ann = client.get("/users/history", params={"user": "Ann", "limit": 1}).json()
+    assert (ann["points"], ann["points_spent"], ann["auctions_lost_total"]) == (9, 1, 1)
+    assert client.get("/leaderboard/rank", params={"user": "Ann"}).json()["tasks_assigned"] == 2
+    assert client.get("/users/history", params={"user": "Zed"}).status_code == 404
+
+    monkeypatch.setattr(app_mod, "STORE", app_mod.LocalStore())
+    assert client.get("/users/history", params={"user": "Bob"}).status_code == 501
+
+def test_sqlite_settle_runs_the_same_statements_however_many_bidders(client, app_mod, sqlite_store, monkeypatch):
+    now = [1_700_000_000]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    statements = {}
+    for aid, bidders in (("S1", 3), ("S2", 40)):
+        client.post("/new_task", json={"auction_id": aid, "task": f"t{aid}", "duration_seconds": 5})
+        for i in range(bidders):
+            client.post("/bid", json={"auction_id": aid, "user": f"{aid}u{i}", "bid_amount": i and 1 + i % 4})
+        now[0] += 10
+        traced = []
+        sqlite_store._conn().set_trace_callback(traced.append)
+        assert app_mod.settle_expired([aid]) == 1
+        sqlite_store._conn().set_trace_callback(None)
+        statements[aid] = traced
+        assert not [q for q in traced if "FROM users WHERE" in q]
+    assert len(statements["S1"]) == len(statements["S2"])
+    assert client.get("/leaderboard/rank", params={"user": "S2u1"}).json()["points"] == 8
+    assert client.get("/leaderboard/rank", params={"user": "S2u0"}).json()["tasks_assigned"] == 1
+
+def test_sqlite_bid_reuses_the_cached_auction(client, app_mod, sqlite_store, monkeypatch):
+    import sqlstore
+    monkeypatch.setattr(time, "time", lambda: 1_700_000_000)
+    client.post("/new_task", json={"auction_id": "C1", "task": "t", "duration_seconds": 5})
+    for i in range(5):
+        client.post("/bid", json={"auction_id": "C1", "user": f"u{i}", "bid_amount": 1 + i})
+    traced = []
+    sqlite_store._conn().set_trace_callback(traced.append)
+    assert client.post("/bid", json={"auction_id": "C1", "user": "late", "bid_amount": 0}).status_code == 200
+    sqlite_store._conn().set_trace_callback(None)
+    assert not [q for q in traced if "FROM bids" in q]
+
+    # a write that fails to commit must not leave its changes in the cache
+    def fail(view):
+        raise sqlite3.OperationalError("disk I/O error")
+    with monkeypatch.context() as m:
+        m.setattr(sqlstore._View, "flush", fail)
+        with pytest.raises(sqlite3.OperationalError):
+            with sqlite_store.write(["C1"]) as view:
+                view.auction("C1").place_bid("ghost", 0, view.registry)
+    with sqlite_store.read("C1") as view:
+        assert "ghost" not in view.auction("C1").bids
+    assert client.get("/results", params={"auction_id": "C1"}).json()["bids"][0]["user"] == "late"
+
+    other = app_mod.SQLiteStore(sqlite_store.path, starting_points=10)
+    with other.read("C1") as view:
+        assert set(view.auction("C1").bids) == {"u0", "u1", "u2", "u3", "u4", "late"}
+
+def test_old_closed_auctions_move_to_the_archive(client, app_mod, monkeypatch, tmp_path):
+    from journal import Journal
+    now = [1_700_000_000]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    monkeypatch.setattr(app_mod, "ARCHIVE", app_mod.AuctionArchive(str(tmp_path / "archive"), cache_size=1,
+                                                                   metrics=app_mod.METRICS))
+    monkeypatch.setattr(app_mod, "ARCHIVE_AFTER_SECONDS", 60)
+    monkeypatch.setattr(app_mod, "JOURNAL", None)
+    app_mod.recover_state(Journal(str(tmp_path / "journal")))
+    for aid in ("R1", "R2", "R3"):
+        client.post("/new_task", json={"auction_id": aid, "task": f"t{aid}", "duration_seconds": 5,
+                                       "participants": ["Ann", "Bob"] if aid == "R1" else None})
+    client.post("/bid", json={"auction_id": "R1", "user": "Ann", "bid_amount": 1})
+    client.post("/bid", json={"auction_id": "R1", "user": "Bob", "bid_amount": 3})
+    now[0] += 10
+    before = client.get("/results", params={"auction_id": "R1"}).json()
+    assert before["status"] == "CLOSED"
+    app_mod.settle_expired(["R2"])
+
+    assert app_mod.archive_closed() == 0           # not old enough yet
+    now[0] += 60
+    assert app_mod.archive_closed() == 2           # R3 is still OPEN: nobody settled it
+    assert set(app_mod.AUCTIONS) == {"R3"} and not app_mod.AUCTION_PARTICIPANTS
+
+    assert client.get("/results", params={"auction_id": "R1"}).json() == before
+    r = client.get("/results", params={"auction_id": "R1", "bids_limit": 1}).json()
+    assert [b["user"] for b in r["bids"]] == ["Ann"] and r["next_bids_cursor"]
+    assert client.get("/results", params={"auction_id": "R2"}).json()["assigned_user"] is None
+    assert client.post("/new_task", json={"auction_id": "R1", "task": "again",
+                                          "duration_seconds": 5}).status_code == 409
+    assert client.post("/bid", json={"auction_id": "R1", "user": "Ann", "bid_amount": 1}).status_code == 400
+    assert len(app_mod.ARCHIVE._cache) == 1
+    assert 'archive_cache_total{result="hit"}' in client.get("/metrics").text
+
+    # replaying the log leaves archived auctions on disk only; a restarted
+    # archive finds the ids it holds on disk, with nothing loaded
+    app_mod.JOURNAL.close()
+    monkeypatch.setattr(app_mod, "ARCHIVE", app_mod.AuctionArchive(str(tmp_path / "archive"), metrics=app_mod.METRICS))
+    assert app_mod.STORE.exists(["R1"]) and not app_mod.ARCHIVE._cache
+    assert "R1" in app_mod.ARCHIVE and "R2" in app_mod.ARCHIVE and "R3" not in app_mod.ARCHIVE
+    app_mod.recover_state(Journal(str(tmp_path / "journal")))
+    assert set(app_mod.AUCTIONS) == {"R3"}
+    assert client.get("/results", params={"auction_id": "R1"}).json() == before
+    app_mod.JOURNAL.close()
+
+def test_bids_are_shed_before_reaching_the_store(client, app_mod, monkeypatch):
+    from admission import Admission
+    client.post("/new_task", json={"auction_id": "L1", "task": "Mop", "duration_seconds": 30})
+    monkeypatch.setattr(app_mod, "ADMISSION", Admission(app_mod.METRICS, user_rate=0.01, user_burst=2,
+                                                        ip_rate=0.01, ip_burst=5, max_inflight=1))
+    assert client.post("/bid", json={"auction_id": "L1", "user": "Ann", "bid_amount": 1}).status_code == 200
+    assert client.post("/bid", json={"auction_id": "L1", "user": "Ann", "bid_amount": 1}).status_code == 400
+
+    class NoStore:
+        def write(self, auction_ids):
+            raise AssertionError("a shed bid reached the store")
+    monkeypatch.setattr(app_mod, "STORE", NoStore())
+    r = client.post("/bid", json={"auction_id": "L1", "user": "Ann", "bid_amount": 1})
+    assert r.status_code == 429 and int(r.headers["Retry-After"]) >= 1
+    r = client.post("/bids/batch", json={"bids": [{"auction_id": "L1", "user": "Ann", "bid_amount": 1}]})
+    assert r.json()["results"] == [{"index": 0, "status": 429, "error": "Too many bids from this user."}]
+
+    app_mod.ADMISSION.inflight.try_enter()          # the one slot is taken
+    r = client.post("/bid", json={"auction_id": "L1", "user": "Bob", "bid_amount": 1})
+    assert r.status_code == 503 and r.headers["Retry-After"] == "1"
+    app_mod.ADMISSION.leave()
+    r = client.post("/bid", json={"auction_id": "L1", "user": "Bob", "bid_amount": 1})
+    assert r.status_code == 429 and r.json()["detail"] == "Too many bids from this address."
+
+    monkeypatch.setattr(app_mod, "STORE", app_mod.LocalStore())
+    text = client.get("/metrics").text
+    for reason, n in (("user_rate", 1), ("overload", 1), ("ip_rate", 1)):
+        assert f'requests_shed_total{{route="POST /bid",reason="{reason}"}} {n}' in text
+    assert 'requests_shed_total{route="POST /bids/batch",reason="user_rate"} 1' in text
+    assert 'http_requests_total{route="POST /bid",status="503"} 1' in text
@@ -1,6 +1,9 @@
 # test_app.py
+import json
 import re
 import time
+import threading
+import http.client
 import random
 import pytest
 import app
@@ -9,7 +12,8 @@ import app
 from app import (
     User, UserRegistry, Bid,
     Auction, Auction_State,
-    Task, Task_State, TaskQueue
+    Task, Task_State, TaskQueue,
+    TurnController
 )
 
 # ---------- Helpers ----------
@@ -53,6 +57,33 @@ def test_user_registry_create_and_get():
     assert len(users) == 1 and users[0].name == "Bob"
 
 
+def test_registry_leaderboard_tracks_settlement():
+    reg = UserRegistry(10)
+    for n in ["bob", "Alice", "Cara"]:
+        reg.create_user(n)
+    assert [r["name"] for r in reg.leaderboard().page()] == ["Alice", "bob", "Cara"]
+
+    a = Auction("T1", duration_seconds=10)
+    a.place_bid("Alice", 4, reg)
+    a.place_bid("Cara", 1, reg)
+    a.settle_now(reg)
+
+    board = reg.leaderboard()
+    assert [r["name"] for r in board.page()] == ["bob", "Cara", "Alice"]
+    assert board.rank("Alice") == 3
+    assert board.rank("Cara") == 2
+    assert board.rank("nobody") is None
+    assert board.page(1, 1) == [{"name": "Cara", "points": 10, "tasks_assigned": 1}]
+
+
+def test_registry_clear_empties_the_leaderboard():
+    reg = UserRegistry(10)
+    reg.create_user("Alice")
+    reg.clear()
+    reg.create_user("Bob")
+    assert [r["name"] for r in reg.leaderboard().page()] == ["Bob"]
+
+
 # ---------- Bid ----------
 
 def test_bid_fields_and_timestamp(fixed_time):
@@ -186,6 +217,116 @@ def test_settle_fair_tie_breaker_by_fewest_tasks_then_random():
             assert u.points == 7  # 10 - 3
 
 
+def test_auction_scheduled_in_future_opens_on_demand(fixed_time):
+    reg = UserRegistry(10)
+    a = Auction("Later", duration_seconds=10, starts_at_time=fixed_time + 60)
+    assert a.status == Auction_State.SCHEDULED
+    assert a.ends_at_time == fixed_time + 70
+    with pytest.raises(ValueError, match="not open"):
+        a.place_bid("Alice", 1, reg)
+    assert a.open_now() is True
+    assert a.status == Auction_State.OPEN
+    assert a.open_now() is False
+
+
+def test_timer_service_runs_due_callbacks_in_time_order():
+    timers = app.TimerService(autostart=False)
+    fired = []
+    timers.schedule(30, fired.append, "c")
+    timers.schedule(10, fired.append, "a")
+    timers.schedule(20, fired.append, "b")
+    assert timers.run_due(now=20) == 2
+    assert fired == ["a", "b"]
+    assert len(timers) == 1
+
+
+def test_auction_order_book_stays_sorted_across_rebids(monkeypatch):
+    t = [1_700_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: t[0])
+    reg = UserRegistry(10)
+    a = Auction("T1", duration_seconds=100)
+    for name, amount in [("Ava", 5), ("Ben", 2), ("Cam", 2), ("Dee", 7)]:
+        t[0] += 1
+        a.place_bid(name, amount, reg)
+    t[0] += 1
+    a.place_bid("Dee", 1, reg)   # re-bid replaces, moves to the front
+    t[0] += 1
+    a.place_bid("Ben", 6, reg)   # re-bid leaves the tie group
+
+    assert [(b.user, b.bid_amount) for b in a.sorted_bids()] == [
+        ("Dee", 1), ("Cam", 2), ("Ava", 5), ("Ben", 6)]
+    assert [b.user for b in a.sorted_bids(1, 2)] == ["Cam", "Ava"]
+    assert [b.user for b in a.lowest_bids()] == ["Dee"]
+    assert len(a.bids) == 4
+
+
+def test_columnar_bid_book_matches_default(monkeypatch):
+    t = [1_700_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: t[0])
+    monkeypatch.setattr(app.random, "choice", lambda seq: seq[0])
+    books = []
+    for columnar in (False, True):
+        reg = UserRegistry(10)
+        reg.create_user("Ava").assigned_tasks.append("old")
+        a = Auction("T", duration_seconds=100, columnar=columnar)
+        t[0] = 1_700_000_000.0
+        for name, amount in [("Ava", 2), ("Ben", 5), ("Cam", 2), ("Ben", 1), ("Dee", 2), ("Ben", 2)]:
+            t[0] += 1
+            a.place_bid(name, amount, reg)
+        a.settle_now(reg)
+        books.append((a, reg))
+
+    (d, dreg), (c, creg) = books
+    assert isinstance(c.bids, app.ColumnarBidBook)
+    rows = lambda a: [(b.user, b.bid_amount, b.timestamp_ms) for b in a.sorted_bids()]
+    assert rows(c) == rows(d)
+    assert [b.user for b in c.lowest_bids()] == [b.user for b in d.lowest_bids()]
+    assert [c.bid_rank(n) for n in "Ava Ben Cam Dee".split()] == [d.bid_rank(n) for n in "Ava Ben Cam Dee".split()]
+    first_user, first_amount, first_ts = rows(c)[0]
+    cursor = (first_amount, first_ts, first_user)
+    assert rows(c)[1:] == [(b.user, b.bid_amount, b.timestamp_ms) for b in c.sorted_bids(after=cursor)]
+    assert c.assigned_user == d.assigned_user == "Cam"
+    assert c.bids["Ben"].bid_amount == 2 and "Zed" not in c.bids and len(c.bids) == 4
+    assert [(u.name, u.points) for u in creg.list_users()] == [(u.name, u.points) for u in dreg.list_users()]
+    assert Auction.from_snapshot(c.to_snapshot()).sorted_bids()[0].user == rows(c)[0][0]
+
+
+def test_settle_many_matches_settling_one_by_one(monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 1_700_000_000.0)
+    names = ["Ava", "Ben", "Cam", "Dee", "Eli"]
+
+    def build():
+        gen = random.Random(7)
+        reg = UserRegistry(10)
+        reg.create_users(names)
+        auctions = []
+        for i in range(60):
+            a = Auction(f"T{i}", duration_seconds=100, columnar=i % 2 == 1)
+            for name in gen.sample(names, gen.randint(0, 5)):
+                a.bids.record(name, gen.randint(0, 2), 1_700_000_000_000 + gen.randint(0, 9))
+            auctions.append(a)
+        return reg, auctions
+
+    sreg, scalar = build()
+    random.seed(11)
+    for a in scalar:
+        a.settle_now(sreg)
+    breg, batch = build()
+    assignees = app.settle_many(batch, breg, rng=random.Random(11))
+
+    assert assignees == [a.assigned_user for a in scalar]
+    assert all(a.status == Auction_State.CLOSED for a in batch)
+    state = lambda reg: [(u.name, u.points, u.assigned_tasks) for u in reg.list_users()]
+    assert state(breg) == state(sreg)
+    assert breg.leaderboard().page(0, 5) == sreg.leaderboard().page(0, 5)
+    assert app.settle_many(batch, breg) == assignees  # already closed: no-op
+
+
+def test_bid_and_user_are_slotted():
+    assert not hasattr(Bid("a", 1), "__dict__")
+    assert not hasattr(User("a", 1), "__dict__")
+
+
 # ---------- Task & TaskQueue ----------
 
 def test_task_defaults_and_repr():
@@ -218,9 +359,557 @@ def test_task_queue_priority_then_id_ordering():
     assert q.get_next_task() is None
 
 
+def test_task_queue_bulk_add_matches_individual_pushes():
+    tasks = [Task(i, f"T{i}", "", "", (i * 7) % 5, None) for i in range(50)]
+    one_by_one = TaskQueue()
+    for t in tasks:
+        one_by_one.add_task(t)
+    bulk = TaskQueue()
+    bulk.add_task(tasks[0])
+    bulk.add_tasks(tasks[1:])
+    assert len(bulk) == 50
+    assert [bulk.get_next_task() for _ in range(50)] == [one_by_one.get_next_task() for _ in range(50)]
+
+
+def test_registry_create_users_bulk():
+    reg = UserRegistry(5)
+    reg.create_user("Ann").points = 1
+    assert reg.create_users(["Ann", " Bo ", "Cy", "Bo"]) == 2
+    assert reg.get_user("Ann").points == 1
+    assert [r["name"] for r in reg.leaderboard().page()] == ["Bo", "Cy", "Ann"]
+
+
 # @pytest.mark.xfail(reason="TaskQueue.peek_next_task indexes as if items are tuples")
 def test_task_queue_peek_returns_task_not_tuple():
     q = TaskQueue()
     t = Task(10, "Top", "", "", 5, None)
     q.add_task(t)
     assert q.peek_next_task() is t
+
+
+# ---------- TurnController: versioned state ----------
+
+def test_turn_version_bumps_on_round_bid_and_phase_change(monkeypatch):
+    t = [1_700_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: t[0])
+    turn = TurnController(UserRegistry(10))
+    v0 = turn.state()["version"]
+
+    turn.start_round("Dishes", ["Ann", "Bo"])
+    v1 = turn.state()["version"]
+    assert v1 > v0
+    assert turn.state()["version"] == v1  # reads do not bump
+
+    t[0] += turn.handover_seconds
+    s = turn.state()
+    assert s["phase"] == "bid" and s["version"] > v1
+    assert s["phase_ends_at"] == t[0] + turn.bid_window_seconds
+
+    turn.bid_active(3)
+    s2 = turn.state()
+    assert s2["version"] > s["version"]
+    assert s2["active_user"] == "Bo" and s2["phase"] == "handover"
+
+
+def test_turn_wait_for_change_wakes_on_bid_and_times_out():
+    turn = TurnController(UserRegistry(10))
+    seen = turn.version
+    assert turn.wait_for_change(seen, 0.01) == seen
+
+    threading.Timer(0.05, turn.start_round, args=("Trash", ["Ann"])).start()
+    assert turn.wait_for_change(seen, 5) != seen
+
+
+def test_turn_wait_for_change_applies_phase_deadline():
+    turn = TurnController(UserRegistry(10))
+    turn.handover_seconds = 0.05
+    turn.start_round("Trash", ["Ann"])
+    seen = turn.version
+    assert turn.wait_for_change(seen, 5) != seen
+    assert turn.phase == "bid"
+
+
+def test_auction_version_bumps_on_bid_and_settle():
+    reg = UserRegistry(10)
+    a = Auction("T1", duration_seconds=10)
+    v0 = a.version
+    a.place_bid("Alice", 2, reg)
+    assert a.version == v0 + 1
+    a.settle_now(reg)
+    assert a.version == v0 + 2
+    a.settle_now(reg)  # idempotent, no bump
+    assert a.version == v0 + 2
+
+
+def test_api_state_etag_returns_304_when_unchanged(monkeypatch):
+    srv = app.ThreadedHTTPServer(("127.0.0.1", 0), app.Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        conn = http.client.HTTPConnection(*srv.server_address, timeout=5)
+        conn.request("GET", "/api/state")
+        r = conn.getresponse()
+        r.read()
+        etag = r.getheader("ETag")
+        assert r.status == 200 and etag
+
+        monkeypatch.setattr(app, "send_json", lambda *a, **k: pytest.fail("serialized"))
+        conn = http.client.HTTPConnection(*srv.server_address, timeout=5)
+        conn.request("GET", "/api/state", headers={"If-None-Match": etag})
+        r = conn.getresponse()
+        assert r.status == 304
+        assert r.read() == b""
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_metrics_endpoint_counts_requests_by_route():
+    srv = app.ThreadedHTTPServer(("127.0.0.1", 0), app.Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        for path in ("/api/state", "/nope"):
+            conn = http.client.HTTPConnection(*srv.server_address, timeout=5)
+            conn.request("GET", path)
+            conn.getresponse().read()
+        # a request is counted after its response is sent, so the last one
+        # may land a moment after the client has read it
+        deadline = time.monotonic() + 5
+        while True:
+            conn = http.client.HTTPConnection(*srv.server_address, timeout=5)
+            conn.request("GET", "/metrics")
+            r = conn.getresponse()
+            body = r.read().decode()
+            if 'status="404"' in body or time.monotonic() > deadline:
+                break
+            time.sleep(0.01)
+        assert r.status == 200 and r.getheader("Content-Type").startswith("text/plain")
+        assert re.search(r'http_requests_total\{route="GET /api/state",status="200"\} [1-9]', body)
+        assert re.search(r'http_requests_total\{route="GET other",status="404"\} [1-9]', body)
+        assert 'http_request_duration_seconds_bucket{route="GET /api/state",le="+Inf"}' in body
+        assert 'serialize_seconds_count{route="GET /api/state"}' in body
+        assert "# TYPE auctions_open gauge" in body
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_admin_profile_requires_token_and_toggles(monkeypatch, tmp_path):
+    monkeypatch.setenv("PROFILE_OUTPUT", str(tmp_path / "app.collapsed"))
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    srv = app.ThreadedHTTPServer(("127.0.0.1", 0), app.Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    def call(method, path, body=None, token=None):
+        conn = http.client.HTTPConnection(*srv.server_address, timeout=5)
+        headers = {"X-Admin-Token": token} if token else {}
+        conn.request(method, path, body=body, headers=headers)
+        r = conn.getresponse()
+        return r.status, r.read().decode()
+
+    try:
+        assert call("POST", "/api/admin/profile", '{"enabled": true}')[0] == 403
+        assert call("POST", "/api/admin/profile", '{"enabled": true, "rate": 5}', "s3cret")[0] == 400
+        status, body = call("POST", "/api/admin/profile", '{"enabled": true, "rate": 1}', "s3cret")
+        assert status == 200 and json.loads(body)["profile"]["enabled"] is True
+
+        real_state = app.TURN.encoded_state
+        monkeypatch.setattr(app.TURN, "encoded_state", lambda: (app.PROFILER.sample(), real_state())[1])
+        assert call("GET", "/api/state")[0] == 200
+        status, stacks = call("GET", "/api/admin/profile", token="s3cret")
+        assert status == 200 and "GET /api/state;app.py:do_GET;" in stacks
+
+        status, body = call("POST", "/api/admin/profile", '{"enabled": false}', "s3cret")
+        assert status == 200 and json.loads(body)["profile"]["enabled"] is False
+        assert "GET /api/state;" in (tmp_path / "app.collapsed").read_text()
+    finally:
+        app.PROFILER.stop()
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_encoded_state_is_shared_per_version_with_a_fresh_clock(monkeypatch):
+    import gzip
+    reg = UserRegistry(100)
+    reg.create_users(f"player{i}" for i in range(50))
+    turn = TurnController(reg)
+    turn.start_round("Dishes", ["player0", "player1"])
+    entry = turn.encoded_state()
+    assert turn.encoded_state() is entry
+
+    ends = turn.phase_ends_at
+    body = json.loads(entry.body(ends - 2.5))
+    assert body["ok"] is True
+    assert body["state"]["server_time"] == ends - 2.5 and body["state"]["seconds_left"] == 2
+    expected = turn.static_state()
+    assert {k: v for k, v in body["state"].items() if k in expected} == expected
+    assert json.loads(entry.state_bytes(ends + 1))["seconds_left"] == 0
+    assert gzip.decompress(entry.body_gzip(ends - 1)) == entry.body(ends - 1)
+
+    turn.manual_transition = False
+    turn.phase_ends_at = time.time() - 1    # handover over: the next read moves to bid
+    assert turn.encoded_state() is not entry
+    assert turn.encoded_state().version == entry.version + 1
+
+
+def _to_bid_phase(turn):
+    turn.manual_transition = False
+    turn.phase_ends_at = time.time() - 1
+    turn.encoded_state()
+
+
+def test_state_delta_sends_added_bids_and_changed_users_only():
+    reg = UserRegistry(100)
+    reg.create_users(f"player{i}" for i in range(20))
+    turn = TurnController(reg)
+    turn.start_round("Dishes", ["player0", "player1", "player2"])
+    for amount in (30, 10):
+        _to_bid_phase(turn)
+        turn.bid_active(amount)
+    old = turn.encoded_state().state
+    _to_bid_phase(turn)
+    turn.bid_active(20)                     # the last bid settles the round
+    new = turn.encoded_state().state
+
+    delta = app.state_delta(old, new)
+    assert delta["bids_added"] == [{"name": "player2", "amount": 20}]
+    assert delta["phase"] == "results" and delta["assigned"] == "player1"
+    assert sorted(u["name"] for u in delta["users_changed"]) == ["player0", "player1", "player2"]
+    assert "bids" not in delta and "users" not in delta and "task" not in delta
+    assert app.merge_state_delta(old, delta) == new
+
+    # a new round replaces the bids outright
+    turn.start_round("Laundry", ["player5"])
+    newer = turn.encoded_state().state
+    delta = app.state_delta(new, newer)
+    assert delta["bids"] == [] and delta["task"] == "Laundry"
+    assert app.merge_state_delta(new, delta) == newer
+
+
+def test_state_since_returns_delta_or_full_snapshot(monkeypatch):
+    reg = UserRegistry(100)
+    reg.create_users(["Alice", "Bob"])
+    turn = TurnController(reg)
+    turn.start_round("Dishes", ["Alice", "Bob"])
+    monkeypatch.setattr(app, "TURN", turn)
+    srv = app.ThreadedHTTPServer(("127.0.0.1", 0), app.Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    def get(path):
+        conn = http.client.HTTPConnection(*srv.server_address, timeout=5)
+        conn.request("GET", path)
+        r = conn.getresponse()
+        return r.status, json.loads(r.read())
+
+    try:
+        _, first = get("/api/state")
+        seen = first["state"]["version"]
+        _to_bid_phase(turn)
+        turn.bid_active(3)
+        _, res = get(f"/api/state?since={seen}")
+        delta = res["delta"]
+        assert delta["since"] == seen and delta["version"] == turn.version
+        assert delta["bids_added"] == [{"name": "Alice", "amount": 3}]
+        assert "server_time" in delta and "seconds_left" in delta
+        assert "order" not in delta and "users" not in delta
+
+        _, res = get("/api/state?since=-5")    # never served: full snapshot
+        assert res["state"]["version"] == turn.version and "delta" not in res
+        assert get("/api/state?since=abc")[0] == 400
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_rooms_are_isolated_and_hibernate_to_disk(tmp_path):
+    rooms = app.RoomManager(str(tmp_path), idle_seconds=60)
+    with rooms.use("kitchen") as turn:
+        turn.start_round("Dishes", ["Alice", "Bob"])
+        _to_bid_phase(turn)
+        turn.bid_active(4)
+        before = turn.static_state()
+    with rooms.use("garage") as other:
+        assert other.static_state()["users"] == [] and other is not turn
+
+    with rooms.use("garage"):
+        # in use: never hibernated, however old
+        assert rooms.hibernate_idle(now=time.monotonic() + 3600) == 1
+    assert len(rooms) == 1 and (tmp_path / "room-kitchen.json").exists()
+
+    with rooms.use("kitchen") as loaded:
+        assert loaded is not turn
+        assert loaded.static_state() == before
+        assert loaded.auction.bids["Alice"].bid_amount == 4
+    # the snapshot stays until the room is written out again
+    assert (tmp_path / "room-kitchen.json").exists()
+    with rooms.use("attic", create=False) as blank:
+        assert blank.static_state()["users"] == []
+    assert len(rooms) == 2
+    mtime = (tmp_path / "room-kitchen.json").stat().st_mtime_ns
+    assert rooms.hibernate_all() == 2
+    # unchanged and never-started rooms are not written
+    assert (tmp_path / "room-kitchen.json").stat().st_mtime_ns == mtime
+    assert not (tmp_path / "room-garage.json").exists()
+    with rooms.use("kitchen", create=False) as loaded:
+        assert loaded.static_state() == before
+    with pytest.raises(ValueError):
+        with rooms.use("../etc"):
+            pass
+
+
+def test_room_routes_serve_separate_games(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "ROOMS", app.RoomManager(str(tmp_path)))
+    srv = app.ThreadedHTTPServer(("127.0.0.1", 0), app.Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    def call(method, path, body=None):
+        conn = http.client.HTTPConnection(*srv.server_address, timeout=5)
+        conn.request(method, path, body=json.dumps(body) if body is not None else None)
+        r = conn.getresponse()
+        body = r.read()
+        return r.status, json.loads(body) if r.getheader("Content-Type") == "application/json" else body
+
+    try:
+        status, res = call("POST", "/api/rooms/flat-1/start_round", {"task": "Bins", "order": ["Ann", "Ben"]})
+        assert status == 200 and res["state"]["active_user"] == "Ann"
+        assert call("POST", "/api/rooms/flat-1/bid", {"amount": 2})[0] == 400   # still handing over
+        assert call("GET", "/api/rooms/flat-2/state")[1]["state"]["phase"] == "idle"
+        assert len(app.ROOMS) == 1                # reading a room does not create it
+        assert call("GET", "/api/rooms/flat-1/state")[1]["state"]["task"] == "Bins"
+        assert [u["name"] for u in call("GET", "/api/rooms/flat-1/state")[1]["state"]["users"]] == ["Ann", "Ben"]
+        assert call("GET", "/api/rooms/bad.id/state")[0] == 404
+        assert app._route_label("GET", "/api/rooms/flat-1/state?since=3") == "GET /api/rooms/{id}/state"
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_admission_is_off_unless_configured(monkeypatch):
+    from admission import Admission
+    for var in ("BID_RATE_PER_USER", "BID_RATE_PER_IP", "MAX_INFLIGHT_BIDS"):
+        monkeypatch.delenv(var, raising=False)
+    adm = Admission.from_env(app.metrics.Metrics())
+    assert [adm.enter("POST /api/bid") for _ in range(100)] == [None] * 100
+    assert adm.check_ip("POST /api/bid", "127.0.0.1") is None
+
+
+def test_bids_are_shed_per_ip_and_when_too_many_are_in_flight(monkeypatch):
+    from admission import Admission
+    monkeypatch.setattr(app, "ADMISSION", Admission(app.METRICS, ip_rate=0.01, ip_burst=3, max_inflight=1))
+    srv = app.ThreadedHTTPServer(("127.0.0.1", 0), app.Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    def bid():
+        conn = http.client.HTTPConnection(*srv.server_address, timeout=5)
+        conn.request("POST", "/api/bid", body=json.dumps({"amount": 1}))
+        r = conn.getresponse()
+        return r.status, r.getheader("Retry-After"), json.loads(r.read())
+
+    try:
+        assert bid()[0] == 400                     # admitted; no round is running
+        deadline = time.time() + 2                 # the slot is released just after the response
+        while app.ADMISSION.inflight.inflight and time.time() < deadline:
+            time.sleep(0.01)
+        assert app.ADMISSION.inflight.inflight == 0
+        app.ADMISSION.inflight.try_enter()         # the one slot is taken
+        status, retry_after, body = bid()
+        assert (status, retry_after, body["ok"]) == (503, "1", False)   # spent an address token too
+        app.ADMISSION.leave()
+        assert bid()[0] == 400
+        status, retry_after, body = bid()
+        assert status == 429 and int(retry_after) >= 1 and "address" in body["error"]
+        assert 'requests_shed_total{route="POST /api/bid",reason="ip_rate"} 1' in app.METRICS.render()
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_threaded_server_keeps_connections_alive_and_gzips_large_state(monkeypatch):
+    import gzip
+    import json
+    reg = UserRegistry(100)
+    reg.create_users(f"player{i}" for i in range(200))
+    turn = TurnController(reg)
+    turn.start_round("Dishes", ["player0", "player1"])
+    monkeypatch.setattr(app, "TURN", turn)
+    srv = app.ThreadedHTTPServer(("127.0.0.1", 0), app.Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        conn = http.client.HTTPConnection(*srv.server_address, timeout=5)
+        conn.request("GET", "/api/state")
+        r = conn.getresponse()
+        plain = r.read()
+        assert r.version == 11 and r.getheader("Content-Encoding") is None
+        assert r.getheader("Vary") == "Accept-Encoding"
+        sock = conn.sock
+
+        conn.request("GET", "/api/state", headers={"Accept-Encoding": "br, gzip;q=0.8"})
+        r = conn.getresponse()
+        body = r.read()
+        assert r.getheader("Content-Encoding") == "gzip"
+        assert int(r.getheader("Content-Length")) == len(body) < len(plain) / 4
+        assert json.loads(gzip.decompress(body))["state"]["users"] == json.loads(plain)["state"]["users"]
+        etag = r.getheader("ETag")
+        assert etag.startswith("W/")
+
+        conn.request("GET", "/api/state", headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+        r = conn.getresponse()
+        assert r.status == 304 and r.read() == b""
+        conn.request("POST", "/api/bid", body='{"amount": 1}', headers={"Accept-Encoding": "gzip;q=0"})
+        r = conn.getresponse()
+        assert r.status == 400 and r.getheader("Content-Encoding") is None
+        assert b"Not in bid phase" in r.read()
+        assert conn.sock is sock
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_threaded_server_answers_kept_alive_requests_without_nagle_delay(monkeypatch):
+    monkeypatch.setattr(app.Handler, "log_message", lambda *a: None)
+    srv = app.ThreadedHTTPServer(("127.0.0.1", 0), app.Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        conn = http.client.HTTPConnection(*srv.server_address, timeout=5)
+        conn.request("GET", "/api/state")
+        conn.getresponse().read()
+        t0 = time.perf_counter()
+        for _ in range(10):
+            conn.request("GET", "/api/state")
+            conn.getresponse().read()
+            conn.request("POST", "/api/bid", body='{"amount": 1}')
+            conn.getresponse().read()
+        # a delayed ACK costs ~40 ms per request; 20 of them would take ~0.8 s
+        assert time.perf_counter() - t0 < 0.4
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_threaded_server_closes_idle_keep_alive_connections(monkeypatch):
+    monkeypatch.setattr(app.Handler, "timeout", 0.2)
+    srv = app.ThreadedHTTPServer(("127.0.0.1", 0), app.Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        conn = http.client.HTTPConnection(*srv.server_address, timeout=5)
+        conn.request("GET", "/api/state")
+        conn.getresponse().read()
+        time.sleep(0.5)
+        assert conn.sock.recv(1) == b""  # server hung up
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_accepts_gzip_parsing():
+    assert app.accepts_gzip("gzip, deflate, br")
+    assert app.accepts_gzip("GZIP;q=0.5")
+    assert app.accepts_gzip("*")
+    assert not app.accepts_gzip("gzip;q=0")
+    assert not app.accepts_gzip("br")
+    assert not app.accepts_gzip(None)
+
+
+def test_events_stream_pushes_state():
+    srv = app.ThreadedHTTPServer(("127.0.0.1", 0), app.Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        conn = http.client.HTTPConnection(*srv.server_address, timeout=5)
+        conn.request("GET", "/api/events")
+        r = conn.getresponse()
+        assert r.status == 200
+        assert r.getheader("Content-Type") == "text/event-stream"
+        lines = [r.fp.readline() for _ in range(3)]
+        assert lines[0].startswith(b"id: ")
+        assert lines[1] == b"event: state\n"
+        assert lines[2].startswith(b"data: {")
+        conn.close()
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+# ---------- asyncio server ----------
+
+@pytest.fixture
+def async_server():
+    import asyncio
+    import aioserver
+    loop = asyncio.new_event_loop()
+    server = aioserver.AsyncHTTPServer(app.Handler, app.TURN, keepalive_seconds=1)
+    ready, holder = threading.Event(), {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        srv = loop.run_until_complete(server.start("127.0.0.1", 0))
+        holder["addr"] = srv.sockets[0].getsockname()[:2]
+        ready.set()
+        loop.run_forever()
+        srv.close()
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.close()
+
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    assert ready.wait(5)
+    yield holder["addr"]
+    loop.call_soon_threadsafe(loop.stop)
+    t.join(5)
+    server.close()
+
+
+def test_async_server_serves_handler_routes_over_keep_alive(async_server):
+    conn = http.client.HTTPConnection(*async_server, timeout=5)
+    conn.request("POST", "/api/start_round", body='{"task": "Dishes", "order": ["Ann", "Bo"]}')
+    r = conn.getresponse()
+    body = r.read()
+    assert r.status == 200 and r.version == 11
+    assert json_state_keys(body) == {"version", "server_time", "task", "phase", "phase_ends_at",
+                                     "active_user", "seconds_left", "bids", "assigned", "users",
+                                     "order", "index"}
+    sock = conn.sock
+
+    conn.request("GET", "/api/state")
+    r = conn.getresponse()
+    r.read()
+    etag = r.getheader("ETag")
+    assert r.status == 200 and etag
+    conn.request("GET", "/api/state", headers={"If-None-Match": etag})
+    r = conn.getresponse()
+    assert r.status == 304 and r.read() == b""
+    conn.request("POST", "/api/bid", body='{"amount": "x"}')
+    r = conn.getresponse()
+    assert r.status == 400 and b"amount must be integer" in r.read()
+    assert conn.sock is sock  # every request above reused one connection
+
+    conn.request("GET", "/nope")
+    r = conn.getresponse()
+    r.read()
+    assert r.status == 404 and r.getheader("Connection") == "close"  # send_error always closes
+    conn.close()
+
+
+def test_async_server_streams_events_on_change(async_server):
+    conn = http.client.HTTPConnection(*async_server, timeout=5)
+    conn.request("GET", "/api/events")
+    r = conn.getresponse()
+    assert r.status == 200 and r.getheader("Content-Type") == "text/event-stream"
+    first = int(r.fp.readline().split(b".")[1])
+    r.fp.readline(), r.fp.readline(), r.fp.readline()
+
+    other = http.client.HTTPConnection(*async_server, timeout=5)
+    other.request("POST", "/api/start_round", body='{"task": "Mop", "order": ["Ann"]}')
+    other.getresponse().read()
+    line = r.fp.readline()
+    while line.startswith(b":") or line == b"\n":   # keepalive comments
+        line = r.fp.readline()
+    assert line.startswith(b"id: ") and int(line.split(b".")[1]) > first
+    conn.close()
+
+
+def json_state_keys(body):
+    import json
+    return set(json.loads(body)["state"])
+
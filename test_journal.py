@@ -0,0 +1,161 @@
+# test_journal.py
+import importlib
+import os
+import time
+import pytest
+
+import app
+from journal import Journal
+
+
+@pytest.fixture()
+def routes_mod(monkeypatch):
+    m = importlib.import_module("routes")
+    monkeypatch.setattr(m, "TIMERS", app.TimerService(autostart=False))
+    m.AUCTIONS.clear()
+    m.AUCTION_PARTICIPANTS.clear()
+    m.REGISTRY.clear()
+    yield m
+    if m.JOURNAL is not None:
+        m.JOURNAL.close()
+    m.JOURNAL = None
+    m.AUCTIONS.clear()
+    m.AUCTION_PARTICIPANTS.clear()
+    m.REGISTRY.clear()
+
+
+def test_append_is_durable_and_recovered_in_order(tmp_path):
+    j = Journal(str(tmp_path))
+    seqs = [j.append({"type": "x", "n": i}) for i in range(5)]
+    assert seqs == [1, 2, 3, 4, 5]
+    assert j.wait_durable(5, timeout=5)
+    j.close()
+
+    j2 = Journal(str(tmp_path))
+    state, events = j2.recover()
+    assert state is None
+    assert [e["n"] for e in events] == [0, 1, 2, 3, 4]
+    assert j2.append({"type": "x"}) == 6
+    j2.close()
+
+
+def test_snapshot_prunes_covered_segments_and_replays_only_tail(tmp_path):
+    j = Journal(str(tmp_path))
+    for i in range(3):
+        j.append({"n": i})
+    j.flush()
+    j.write_snapshot(3, {"total": 3})
+    j.append({"n": 3})
+    j.close()
+
+    assert not any(n.startswith("log-000000000001") for n in os.listdir(tmp_path))
+    state, events = Journal(str(tmp_path)).recover()
+    assert state == {"total": 3}
+    assert [e["n"] for e in events] == [3]
+
+
+def test_torn_final_line_is_ignored(tmp_path):
+    j = Journal(str(tmp_path))
+    j.append({"n": 0})
+    j.close()
+    seg = sorted(n for n in os.listdir(tmp_path) if n.startswith("log-"))[0]
+    with open(tmp_path / seg, "ab") as f:
+        f.write(b'{"seq": 2, "n"')
+    _, events = Journal(str(tmp_path)).recover()
+    assert [e["n"] for e in events] == [0]
+
+
+def test_routes_state_survives_restart(tmp_path, routes_mod, monkeypatch):
+    m = routes_mod
+    now = [1_700_000_000]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    m.recover_state(Journal(str(tmp_path)))
+
+    m.new_task(m.NewTaskIn(auction_id="W1", task="Dust", duration_seconds=5, participants=["Ann", "Bo"]))
+    m.bid(m.BidIn(auction_id="W1", user="Ann", bid_amount=2))
+    m.bid(m.BidIn(auction_id="W1", user="Bo", bid_amount=4))
+    m.checkpoint()
+    m.new_task(m.NewTaskIn(auction_id="W2", task="Sweep", duration_seconds=50))
+    m.bid(m.BidIn(auction_id="W2", user="Cy", bid_amount=1))
+    now[0] += 10
+    m._on_auction_timer("W1")
+    m.JOURNAL.close()
+
+    m.AUCTIONS.clear()
+    m.REGISTRY.clear()
+    replayed = m.recover_state(Journal(str(tmp_path)))
+    assert replayed == 3  # W2 auction, Cy's bid, W1 settle
+    assert m.AUCTIONS["W1"].assigned_user == "Ann"
+    assert m.REGISTRY.get_user("Bo").points == 6
+    assert m.AUCTIONS["W2"].bids["Cy"].bid_amount == 1
+    assert m.AUCTION_PARTICIPANTS["W1"] == ["Ann", "Bo"]
+    assert [r["name"] for r in m.REGISTRY.leaderboard().page()] == ["Cy", "Ann", "Bo"]
+
+
+def test_routes_answer_only_once_their_events_are_durable(tmp_path, routes_mod):
+    m = routes_mod
+    # without the wait, nothing would reach the disk for a minute
+    m.recover_state(Journal(str(tmp_path), flush_interval=60))
+    m.new_task(m.NewTaskIn(auction_id="D1", task="Dust", duration_seconds=50, participants=["Ann"]))
+    assert m.JOURNAL.durable_seq == m.JOURNAL.last_seq == 2     # users, then the auction
+    m.bid(m.BidIn(auction_id="D1", user="Ann", bid_amount=2), compact=True)
+    m.bids_batch(m.BatchBidIn(bids=[m.BidIn(auction_id="D1", user="Bo", bid_amount=1)]))
+    m.import_bundle(m.ImportIn(tasks=[m.TaskIn(name="Mop")]))
+    assert m.JOURNAL.durable_seq == m.JOURNAL.last_seq > 2
+
+
+def test_routes_recover_at_startup_into_the_same_queue(tmp_path, routes_mod, monkeypatch):
+    from fastapi.testclient import TestClient
+    m = routes_mod
+    m.recover_state(Journal(str(tmp_path)))
+    m.import_bundle(m.ImportIn(tasks=[m.TaskIn(name="Mop", priority=3)]))
+    m.JOURNAL.close()
+    m.JOURNAL = None
+    queue = m.QUEUE
+    queue.clear()
+
+    monkeypatch.setenv("AUCTION_DATA_DIR", str(tmp_path))
+    with TestClient(m.app):
+        assert m.JOURNAL is not None
+    assert m.QUEUE is queue and queue.peek_next_task().name == "Mop"
+    queue.clear()
+
+
+def test_turn_controller_resumes_round_after_restart(tmp_path, monkeypatch):
+    t = [1_700_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: t[0])
+    turn = app.TurnController(app.UserRegistry(10))
+    turn.recover(Journal(str(tmp_path)))
+    turn.start_round("Dishes", ["Ann", "Bo", "Cy"])
+    t[0] += turn.handover_seconds
+    turn.bid_active(3)
+    turn.journal.close()
+
+    restored = app.TurnController(app.UserRegistry(10))
+    restored.recover(Journal(str(tmp_path)))
+    s = restored.state()
+    assert s["task"] == "Dishes"
+    assert s["phase"] == "handover" and s["active_user"] == "Bo"
+    assert s["bids"] == [{"name": "Ann", "amount": 3}]
+    restored.journal.close()
+
+
+def test_turn_controller_version_never_goes_back_across_restarts(tmp_path):
+    turn = app.TurnController(app.UserRegistry(10))
+    turn.recover(Journal(str(tmp_path)))
+    turn.start_round("Dishes", ["Ann", "Bo"])
+    turn.checkpoint()
+    turn.start_round("Bins", ["Ann"])
+    before = turn.version
+    turn.journal.close()
+
+    restored = app.TurnController(app.UserRegistry(10))
+    restored.recover(Journal(str(tmp_path)))
+    assert restored.version >= before and restored.static_state()["task"] == "Bins"
+    restored.journal.close()
+
+    # without a journal versions restart, but the epoch keeps old tags from matching
+    other = app.Handler.state_etag(1).replace(app.EPOCH, "0" * len(app.EPOCH))
+    assert not app.etag_matches(other, app.Handler.state_etag(1))
+    assert app.Handler.event_version("00000000.7") == -1
+    assert app.Handler.event_version(app.Handler.event_id(7).decode()) == 7
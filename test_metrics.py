@@ -0,0 +1,74 @@
+# test_metrics.py
+import threading
+
+from metrics import Metrics, TimedLock
+
+
+def test_counters_and_histograms_sum_across_threads():
+    m = Metrics(buckets=(0.1, 1.0))
+    m.counter("hits_total", "Hits.")
+    m.histogram("work_seconds", "Work.")
+
+    def worker():
+        for i in range(1000):
+            m.inc("hits_total", (("route", "/x"),))
+            m.observe("work_seconds", 0.5 if i % 2 else 0.05)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    counters, hists = m.snapshot()
+    assert counters[("hits_total", (("route", "/x"),))] == 8000
+    assert hists[("work_seconds", ())][:3] == [4000, 4000, 0]
+
+    text = m.render()
+    assert '# TYPE hits_total counter' in text
+    assert 'hits_total{route="/x"} 8000' in text
+    assert 'work_seconds_bucket{le="0.1"} 4000' in text
+    assert 'work_seconds_bucket{le="1.0"} 8000' in text
+    assert 'work_seconds_bucket{le="+Inf"} 8000' in text
+    assert 'work_seconds_count 8000' in text
+
+
+def test_gauges_are_read_at_scrape_time():
+    m = Metrics()
+    value = [1]
+    m.gauge("queue_depth", "Depth.", lambda: value[0])
+    m.gauge("by_state", "By state.", lambda: {(("state", "open"),): 2, (("state", "closed"),): 3})
+    assert "queue_depth 1" in m.render()
+    value[0] = 7
+    text = m.render()
+    assert "queue_depth 7" in text
+    assert 'by_state{state="closed"} 3' in text and 'by_state{state="open"} 2' in text
+
+
+def test_timed_lock_records_wait_and_hold():
+    m = Metrics(buckets=(0.01, 1.0))
+    lock = TimedLock(m, "L")
+    with lock:
+        assert lock.locked()
+        assert lock.acquire(blocking=False) is False
+    assert lock.acquire(blocking=False) is True
+    lock.release()
+    _, hists = m.snapshot()
+    assert sum(hists[("lock_wait_seconds", (("lock", "L"),))][:-1]) == 2
+    assert sum(hists[("lock_hold_seconds", (("lock", "L"),))][:-1]) == 2
+    assert 'lock_hold_seconds_count{lock="L"} 2' in m.render()
+
+
+def test_timed_lock_over_an_rlock_records_only_the_outer_acquire():
+    m = Metrics(buckets=(0.01, 1.0))
+    lock = TimedLock(m, "R", threading.RLock())
+    with lock:
+        with lock:
+            pass
+        assert lock.acquire(blocking=False) is True
+        lock.release()
+    with lock:
+        pass
+    _, hists = m.snapshot()
+    assert sum(hists[("lock_wait_seconds", (("lock", "R"),))][:-1]) == 2
+    assert sum(hists[("lock_hold_seconds", (("lock", "R"),))][:-1]) == 2
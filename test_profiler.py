@@ -0,0 +1,47 @@
+# test_profiler.py
+import threading
+
+from profiler import SamplingProfiler
+
+
+def _busy(entered, release):
+    entered.set()
+    release.wait(5)
+    return "done"
+
+
+def test_samples_only_picked_requests_and_tags_by_route():
+    p = SamplingProfiler()
+    assert p.call("GET /x", lambda: 1) == 1          # disabled: runs untouched
+    assert p.status()["requests_profiled"] == 0
+
+    p.start(rate=1.0)
+    entered, release = threading.Event(), threading.Event()
+    t = threading.Thread(target=p.call, args=("GET /slow", _busy, entered, release))
+    t.start()
+    entered.wait(5)
+    p.sample()
+    p.sample()
+    release.set()
+    t.join()
+    p.stop()
+
+    lines = [l for l in p.collapsed().splitlines() if l.startswith("GET /slow;")]
+    assert lines, p.collapsed()
+    stack, count = lines[0].rsplit(" ", 1)
+    frames = stack.split(";")
+    # root is the route tag, profiler frames are trimmed, leaf side reaches _busy
+    assert frames[1] == "test_profiler.py:_busy"
+    assert int(count) >= 2
+    assert p.status()["enabled"] is False and p.status()["requests_profiled"] == 1
+
+
+def test_rate_zero_never_profiles_and_dump_writes_file(tmp_path):
+    p = SamplingProfiler()
+    p.start(rate=0.0)
+    for _ in range(100):
+        p.call("GET /x", lambda: None)
+    p.stop()
+    assert p.status()["requests_profiled"] == 0
+    path = p.dump(str(tmp_path / "out.collapsed"))
+    assert open(path).read() == ""